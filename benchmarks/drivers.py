@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Measures the throughput of every driver: each sensor is driven through
+measure() many times on a mock bus without any waits, hence the time per
+sample is the cost of the bus calls, decoding and compensation.
+
+The bus data is recorded once from the simulated bus: the reads of the
+driver initialization and of a number of samples, which are then served
+cyclically by a MockBus. Reported per sample are the time, the bus calls,
+the peak of the allocated memory and the memory blocks which are still
+allocated after the run.
+
+With --check the results are compared with the stored baselines and the
+script exits with status 1 on a regression. --update stores the results
+as new baselines.
+
+Usage: python benchmarks/drivers.py [--samples N] [--repeat N] [--only NAME]
+                                    [--check | --update] [--output FILE]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from senlib.core.i2c import MockBus
+from senlib.core.sim import SimulatedBus, Environment, create_model
+from senlib.i2c import get_sensor_driver, driver_names
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+        'baselines', 'drivers.json')
+
+# Number of samples recorded from the simulated bus, drivers which change
+# their bus calls between samples repeat within this period.
+RECORDED_SAMPLES = 8
+
+# Allowed relative increase before --check reports a regression. The time
+# depends on the machine, hence its tolerance is large.
+TOLERANCES = {
+    'time_per_sample': 1.0,
+    'bus_calls_per_sample': 0.0,
+    'alloc_peak_bytes': 0.25,
+}
+
+
+class ReadRecorder(object):
+    """ Records the data returned by the read calls of a bus object. """
+
+    def __init__(self, bus):
+        self._bus = bus
+        self.reads = []
+
+    def __getattr__(self, name):
+        return getattr(self._bus, name)
+
+    def _read(self, method, *args):
+        r = getattr(self._bus, method)(*args)
+        self.reads.append(r)
+        return r
+
+    def read_byte(self, addr):
+        return self._read('read_byte', addr)
+
+    def read_byte_data(self, addr, cmd):
+        return self._read('read_byte_data', addr, cmd)
+
+    def read_word_data(self, addr, cmd):
+        return self._read('read_word_data', addr, cmd)
+
+    def read_i2c_block_data(self, addr, cmd, nbytes):
+        return self._read('read_i2c_block_data', addr, cmd, nbytes)
+
+    def read_i2c_block_data_into(self, addr, cmd, buf):
+        data = self.read_i2c_block_data(addr, cmd, len(buf))
+        memoryview(buf)[:len(data)] = bytes(data)
+        return len(data)
+
+    def read_bytes_into(self, addr, buf):
+        nbytes = self._bus.read_bytes_into(addr, buf)
+        self.reads.append(list(memoryview(buf)[:nbytes]))
+        return nbytes
+
+    def read_registers(self, addr, regs):
+        return [self.read_i2c_block_data(addr, cmd, nbytes) for cmd, nbytes in regs]
+
+
+class BenchmarkBus(MockBus):
+    """ A MockBus which serves recorded data without conversion waits. """
+
+    conversion_delays = False
+
+
+def record(name):
+    """ Returns the reads of the initialization and of the recorded samples. """
+    driver_class = get_sensor_driver(name)
+    addr = driver_class.default_addr()
+    env = Environment(temperature=21.0, humidity=45.0, pressure=96000.0,
+            illuminance=300.0)
+    bus = ReadRecorder(SimulatedBus(devices={addr: create_model(name, env=env)},
+        latency=0.0, realtime=False))
+    sensor = create_sensor(driver_class, bus, addr)
+    init = list(bus.reads)
+    del bus.reads[:]
+    for _ in range(RECORDED_SAMPLES):
+        sensor.measure()
+    return init, list(bus.reads)
+
+
+def create_sensor(driver_class, bus, addr):
+    sensor = driver_class(bus, addr)
+    # the AM2315 driver returns cached data within its minimal sampling period
+    if hasattr(sensor, 'MIN_SAMPLING_PERIOD'):
+        sensor.MIN_SAMPLING_PERIOD = 0
+    return sensor
+
+
+def prepare(name, recorded, samples):
+    init, reads = recorded
+    cycles = -(-samples // RECORDED_SAMPLES)
+    driver_class = get_sensor_driver(name)
+    bus = BenchmarkBus(read_data=init + reads * cycles)
+    sensor = create_sensor(driver_class, bus, driver_class.default_addr())
+    return sensor, bus
+
+
+def run(name, recorded, samples, repeat):
+    elapsed = None
+    for _ in range(repeat):
+        sensor, bus = prepare(name, recorded, samples)
+        transactions = bus.transactions
+        start = time.perf_counter()
+        for _ in range(samples):
+            sensor.measure()
+        t = time.perf_counter() - start
+        elapsed = t if elapsed is None else min(elapsed, t)
+        bus_calls = bus.transactions - transactions
+
+    # memory is measured in a separate run as tracemalloc slows down
+    sensor, bus = prepare(name, recorded, samples)
+    tracemalloc.start()
+    blocks = sys.getallocatedblocks()
+    peak = 0
+    for _ in range(samples):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        sensor.measure()
+        peak += tracemalloc.get_traced_memory()[1] - current
+    retained = sys.getallocatedblocks() - blocks
+    tracemalloc.stop()
+
+    return {
+        'time_per_sample': elapsed / samples,
+        'bus_calls_per_sample': bus_calls / float(samples),
+        'alloc_peak_bytes': peak // samples,
+        'blocks_retained_per_sample': max(retained, 0) / float(samples),
+    }
+
+
+def check(results, baselines):
+    regressions = []
+    for name, result in sorted(results.items()):
+        baseline = baselines.get(name)
+        if baseline is None:
+            continue
+        for key, tolerance in TOLERANCES.items():
+            old, new = baseline[key], result[key]
+            if new > old * (1 + tolerance) + 1e-12:
+                regressions.append('{} {}: {:.6g} -> {:.6g}'.format(name, key, old, new))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+            formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--samples', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5, 
+            help='Number of timing runs, the fastest one counts.')
+    parser.add_argument('--only', help='Comma-separated list of drivers.')
+    parser.add_argument('--check', action='store_true', help='Compare with the baselines.')
+    parser.add_argument('--update', action='store_true', help='Store as baselines.')
+    parser.add_argument('--output', help='Write the results as JSON to a file.')
+    args = parser.parse_args()
+
+    names = args.only.split(',') if args.only else driver_names()
+    # the conversions of the simulated sensors take real time
+    recorded = {name: record(name) for name in names}
+    time.sleep = lambda seconds: None
+
+    results = {}
+    print('{:<10} {:>12} {:>10} {:>12} {:>10}'.format('driver', 'time [us]',
+        'bus calls', 'peak [bytes]', 'retained'))
+    for name in names:
+        result = results[name] = run(name, recorded[name], args.samples, args.repeat)
+        print('{:<10} {:>12.1f} {:>10.2f} {:>12} {:>10.3f}'.format(name,
+            result['time_per_sample'] * 1e6, result['bus_calls_per_sample'],
+            result['alloc_peak_bytes'], result['blocks_retained_per_sample']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.update:
+        baselines = {}
+        if os.path.exists(BASELINES):
+            with open(BASELINES) as f:
+                baselines = json.load(f)
+        baselines.update(results)
+        os.makedirs(os.path.dirname(BASELINES), exist_ok=True)
+        with open(BASELINES, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+    if args.check:
+        with open(BASELINES) as f:
+            regressions = check(results, json.load(f))
+        for regression in regressions:
+            print('regression: ' + regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compares sequential and pipelined sampling cycles of a node with a BMP180,
+a SI7021 and a SHT31 sensor on a mock bus with a fixed transaction latency.
+
+Usage: python benchmarks/pipeline.py [--cycles N] [--latency SECONDS]
+"""
+
+import argparse
+import time
+from senlib.core.i2c import MockBus, trigger_pipelined
+from senlib.i2c.sensors.bmpx import BMP180
+from senlib.i2c.sensors.six import SI7021
+from senlib.i2c.sensors.shtx import SHT31
+
+BMP180_INIT = [
+    85,
+    [27, 103, 251, 151, 199, 52, 127, 144, 97, 164, 65, 238, 25, 115, 0, 42, 
+        128, 0, 209, 246, 11, 6]
+]
+BMP180_SAMPLE = [[100, 11], [145, 157, 128]]
+SI7021_SAMPLE = [124, 124, 97, 97]
+SHT31_SAMPLE = [[98, 60, 181, 109, 223, 190]]
+
+
+def create_sensors(cycles, latency):
+    bmp180 = BMP180(MockBus(read_data=BMP180_INIT + BMP180_SAMPLE * cycles, 
+        latency=latency))
+    si7021 = SI7021(MockBus(read_data=SI7021_SAMPLE * cycles, latency=latency))
+    sht31 = SHT31(MockBus(read_data=SHT31_SAMPLE * cycles, latency=latency))
+    return [bmp180, si7021, sht31]
+
+
+def run_sequential(sensors, cycles):
+    start = time.monotonic()
+    for _ in range(cycles):
+        for sensor in sensors:
+            sensor.measure()
+    return (time.monotonic() - start) / cycles
+
+
+def run_pipelined(sensors, cycles):
+    start = time.monotonic()
+    for _ in range(cycles):
+        trigger_pipelined(sensors).wait()
+    return (time.monotonic() - start) / cycles
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cycles', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.0005, 
+            help='Time in seconds per bus transaction.')
+    args = parser.parse_args()
+
+    sequential = run_sequential(create_sensors(args.cycles, args.latency), args.cycles)
+    pipelined = run_pipelined(create_sensors(args.cycles, args.latency), args.cycles)
+    print('sequential: {:.1f} ms/cycle'.format(sequential * 1000))
+    print('pipelined:  {:.1f} ms/cycle'.format(pipelined * 1000))
+    print('speedup:    {:.2f}x'.format(sequential / pipelined))
+
+
+if __name__ == '__main__':
+    main()
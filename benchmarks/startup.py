@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Measures the startup cost of senlib: the import time of each module, the
+cold start of the senlib and sennode commands and the time to the first
+measurement of each driver on a simulated bus. Every measurement runs in a
+fresh interpreter and is repeated, the minimum and the median are reported.
+
+The results are written as JSON, a previous result can be given with
+--compare to print the relative changes.
+
+Usage: python benchmarks/startup.py [--repeat N] [--output FILE]
+                                    [--compare FILE] [--only PREFIX]
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = [
+    'senlib.core.i2c',
+    'senlib.core.sim',
+    'senlib.i2c',
+    'senlib.app',
+    'senlib.cli',
+    'senlib.web',
+    'senlib.mqtt',
+]
+
+COMMANDS = {
+    'senlib --help': "from senlib.cli import senlib; senlib(['--help'])",
+    'sennode --help': "from senlib.cli import sennode; sennode(['--help'])",
+    'senlib --mock': "from senlib.cli import senlib; "
+        "senlib(['mock', '--mock', '--interval', '0'])",
+}
+
+# Runs in the child interpreter: measures the time from before the first
+# senlib import up to the first measurement of a driver.
+FIRST_MEASUREMENT = """
+import time
+start = time.perf_counter()
+from senlib.i2c import get_sensor_driver
+from senlib.core.sim import SimulatedBus, create_model
+driver_class = get_sensor_driver({name!r})
+addr = driver_class.default_addr()
+sensor = driver_class(SimulatedBus(devices={{addr: create_model({name!r})}}), addr)
+sensor.measure()
+print(time.perf_counter() - start)
+"""
+
+IMPORT = """
+import time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+"""
+
+
+def driver_modules():
+    from senlib.i2c import _SENSORS
+    return sorted(set(path.split(':')[0] for path in _SENSORS.values()))
+
+
+def driver_names():
+    from senlib.i2c import _SENSORS
+    return sorted(_SENSORS)
+
+
+def run_child(code):
+    """ Runs code in a new interpreter, returns its output and the wall time. """
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env,
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    elapsed = time.perf_counter() - start
+    if out.returncode != 0:
+        raise RuntimeError('exit code {}'.format(out.returncode))
+    return out.stdout.decode(), elapsed
+
+
+def measure(code, repeat, in_process=True):
+    """
+    Returns min and median of the time printed by the child or of the wall
+    time of the child if in_process is False.
+    """
+    samples = []
+    for _ in range(repeat):
+        out, elapsed = run_child(code)
+        samples.append(float(out.strip().splitlines()[-1]) if in_process else elapsed)
+    return {
+        'min': min(samples),
+        'median': statistics.median(samples),
+        'samples': len(samples)
+    }
+
+
+def benchmarks():
+    """ Returns a list of (name, code, in_process) tuples. """
+    tasks = []
+    for module in MODULES + driver_modules():
+        tasks.append(('import:' + module, IMPORT.format(module=module), True))
+    for name, code in COMMANDS.items():
+        tasks.append(('command:' + name, code, False))
+    for name in driver_names():
+        tasks.append(('first-measurement:' + name, FIRST_MEASUREMENT.format(name=name), True))
+    return tasks
+
+
+def git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        return out.stdout.decode().strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline):
+    print('{:<40} {:>12} {:>12} {:>8}'.format('benchmark', 'baseline [ms]',
+        'current [ms]', 'change'))
+    for name, result in results.items():
+        if name not in baseline or 'min' not in result or 'min' not in baseline[name]:
+            continue
+        old, new = baseline[name]['min'], result['min']
+        print('{:<40} {:>12.1f} {:>12.1f} {:>+7.1f}%'.format(name, old * 1e3,
+            new * 1e3, (new - old) / old * 100))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+            formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='Write the results as JSON to a file.')
+    parser.add_argument('--compare', help='JSON file with previous results.')
+    parser.add_argument('--only', default='', help='Run only benchmarks with this prefix.')
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    results = {}
+    for name, code, in_process in benchmarks():
+        if not name.startswith(args.only):
+            continue
+        try:
+            results[name] = measure(code, args.repeat, in_process)
+            print('{:<40} {:>8.1f} ms'.format(name, results[name]['min'] * 1e3),
+                    file=sys.stderr)
+        except (RuntimeError, ValueError, IndexError) as e:
+            results[name] = {'error': str(e)}
+            print('{:<40} failed: {}'.format(name, e), file=sys.stderr)
+
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'repeat': args.repeat,
+        'results': results
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        print()
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f)['results'])
+
+
+if __name__ == '__main__':
+    main()
@@ -8,8 +8,6 @@ import sys
 import logging
 import platform
 import json
-from xml.dom.minidom import parseString
-from dicttoxml import dicttoxml
 from datetime import datetime
 
 from collections import namedtuple
@@ -19,9 +17,9 @@ from senlib import logger
 from senlib.mock import Sensor as MockSensor
 from senlib.i2c import DriverNotFound
 from senlib.i2c import get_sensor_driver
-from senlib.core.i2c import SMBus, AddressParser
-from senlib.web import WebServer
-from senlib.mqtt import Publisher
+from senlib.core.i2c import AddressParser, trigger_pipelined
+from senlib.core.registry import BusRegistry, default_registry
+from senlib.core.scheduler import BusScheduler
 
 __all__ = ('AsyncioApp', 'SenlibApp', 'SennodeApp')
 
@@ -33,11 +31,24 @@ class AsyncioApp:
         self._loop = loop or asyncio.get_event_loop()
         self._config = self.create_config(config)
         self._sensor = None
+        self._sensors = []
+        self._buses = []
+        self._scheduler = None
+        self._bus_stats = None
 
         if self._config.debug:
             logging.basicConfig(level=logging.DEBUG)
+
+        if getattr(self._config, 'bus_stats', False):
+            from senlib.core.instrument import BusStats
+            self._bus_stats = BusStats()
+
+        self._registry = self.create_registry()
   
-        self._sensor = self.create_sensor()
+        self._sensors = self.create_sensors()
+        self._sensor = self._sensors[0]
+        self._capture = self.create_capture()
+        self._captured = [[] for _ in self._sensors]
 
         self._after_init()
     
@@ -47,18 +58,167 @@ class AsyncioApp:
         Config = namedtuple('Config', list(config_dict.keys()))
         return Config(**config_dict)
 
-    def create_sensor(self):
-        """ Creates a sensor object. """
-        sensor = None
-        if self._config.mock:
-            sensor = MockSensor()
+    def create_registry(self):
+        """ 
+        Creates the registry of the bus handles. The trace file names may 
+        contain the placeholder {bus} for the bus number.
+        """
+        record = getattr(self._config, 'record', None)
+        replay = getattr(self._config, 'replay', None)
+        if replay:
+            from senlib.core.trace import ReplayBus
+            return BusRegistry(lambda bus: ReplayBus(replay.format(bus=bus), loop=True))
+        if record:
+            from senlib.core.trace import RecordingBus
+            return BusRegistry(lambda bus: RecordingBus(default_registry().acquire(bus),
+                record.format(bus=bus)))
+        return default_registry()
+
+    def create_bus(self, bus):
+        """ 
+        Creates a bus object for the given bus number. Each sensor gets its
+        own reference to the handle of the bus, closing the sensor releases
+        only its reference. The bus objects are called directly from the 
+        event loop. Only the pipeline mode runs the transactions on the worker
+        threads of a BusScheduler, which blocks the loop while it waits for 
+        them as well.
+        """
+        if not getattr(self._config, 'pipeline', False):
+            i2c_ctrl = self._registry.acquire(bus)
         else:
-            i2c_bus, i2c_addr = AddressParser().parse(self._config.address)
-            i2c_ctrl = SMBus(bus=i2c_bus)
-            driver_class = get_sensor_driver(name=self._config.sensor)
-            sensor = driver_class(i2c_ctrl, i2c_addr or driver_class.default_addr())
+            if self._scheduler is None:
+                self._scheduler = BusScheduler(bus_factory=self._registry.acquire)
+            i2c_ctrl = self._scheduler.bus(bus)
+        instruments = self.create_instruments()
+        if instruments:
+            from senlib.core.instrument import instrument
+            i2c_ctrl = instrument(i2c_ctrl, *instruments)
+        self._buses.append(i2c_ctrl)
+        return i2c_ctrl
+
+    def create_instruments(self):
+        """ Creates the instruments attached to each bus. """
+        instruments = []
+        if self._config.debug:
+            from senlib.core.instrument import BusLogger
+            instruments.append(BusLogger())
+        if self._bus_stats is not None:
+            instruments.append(self._bus_stats)
+        return instruments
+
+    def close_buses(self):
+        for i2c_ctrl in self._buses:
+            i2c_ctrl.close()
+        self._buses = []
+        if self._scheduler is not None:
+            self._scheduler.close()
+
+    def create_sensor(self, name, address):
+        """ Creates a sensor object. """
+        i2c_bus, i2c_addr = 1, None
+        if address:
+            i2c_bus, i2c_addr = AddressParser().parse(address)
+        i2c_ctrl = self.create_bus(i2c_bus)
+        driver_class = get_sensor_driver(name=name)
+        sensor = driver_class(i2c_ctrl, i2c_addr or driver_class.default_addr())
         return sensor
 
+    def create_sensors(self):
+        """ 
+        Creates the sensor objects. The sensor names and addresses are given 
+        as comma-separated lists.
+        """
+        if self._config.mock:
+            return [MockSensor()]
+
+        if self._config.sensor.lower() == 'auto':
+            return self.detect_sensors()
+
+        names = self._config.sensor.split(',')
+        addresses = (self._config.address or '').split(',')
+        addresses += [None] * (len(names) - len(addresses))
+        return [self.create_sensor(name, address) 
+                for name, address in zip(names, addresses)]
+
+    def detect_sensors(self):
+        """ 
+        Creates the sensor objects of the sensors found on the buses given 
+        as comma-separated list of bus numbers by the address option. The 
+        rescan option ignores the cached scan result.
+        """
+        from senlib.i2c.scan import detect
+        buses = [int(bus) for bus in (self._config.address or '1').split(',')]
+        refresh = getattr(self._config, 'rescan', False)
+        sensors = [self.create_sensor(name, 'i2c://{}/{:#04x}'.format(bus, addr))
+                for name, bus, addr in detect(buses, refresh=refresh)]
+        if not sensors:
+            raise DriverNotFound('No sensors found!')
+        return sensors
+
+    def create_capture(self):
+        """ Creates the writer of the capture file if capture mode is enabled. """
+        path = getattr(self._config, 'capture', None)
+        if not path:
+            return None
+
+        for sensor in self._sensors:
+            if not getattr(sensor, 'RAW_FIELDS', ()):
+                raise ValueError('{} does not support raw samples'.format(
+                    sensor.DRIVER_NAME))
+        from senlib.core.capture import CaptureWriter
+        capture = CaptureWriter(path)
+        self._capture_indices = [capture.add(sensor) for sensor in self._sensors]
+        return capture
+
+    async def _capture_samples(self, count=None):
+        """ 
+        Measures raw samples of all sensors back to back, i.e. at maximum rate,
+        and writes them to the capture file. The samples are kept until they
+        are compensated. Stops after count samples per sensor or runs forever
+        if count is None.
+        """
+        num = 0
+        while count is None or num < count:
+            for index, sensor in zip(self._capture_indices, self._sensors):
+                sample = await sensor.measure_raw_async()
+                timestamp = time.time()
+                self._capture.write(index, timestamp, sample.values)
+                self._captured[index].append((timestamp, sample.values))
+            num += 1
+
+    def _take_captured(self):
+        """ Returns the samples captured so far and starts new lists. """
+        captured, self._captured = self._captured, [[] for _ in self._sensors]
+        return captured
+
+    def _compensate_captured(self, captured):
+        """
+        Compensates the captured samples of each sensor in one batch. Returns
+        for each sensor a list of (timestamp, data) tuples.
+        """
+        results = []
+        for sensor, samples in zip(self._sensors, captured):
+            if not samples:
+                results.append([])
+                continue
+            timestamps, values = zip(*samples)
+            data = type(sensor).compensate_raw(sensor.calibration_data, values)
+            keys = list(data.keys())
+            rows = zip(*[data[key] for key in keys])
+            results.append([(timestamp, dict(zip(keys, row)))
+                for timestamp, row in zip(timestamps, rows)])
+        return results
+
+    async def _measure(self):
+        """ Measures all sensors and returns a list with the data of each sensor. """
+        if len(self._sensors) == 1:
+            return [await self._sensor.measure_async()]
+
+        if getattr(self._config, 'pipeline', False):
+            return await trigger_pipelined(self._sensors).wait_async()
+
+        return [await sensor.measure_async() for sensor in self._sensors]
+
     def _after_init(self): 
         """ Internal template method. """
         pass
@@ -89,15 +249,26 @@ class AsyncioApp:
             pass
         finally:
             self._after_stop()
+            if self._capture is not None:
+                self._capture.close()
+            self.close_buses()
+            if self._bus_stats is not None:
+                print(self._bus_stats.format(), file=sys.stderr)
 
 
 class SenlibApp(AsyncioApp):
     """ SenlibApp is an Asyncio-based application. """
 
-    def _generate_output(self, sensor, sensor_data):
+    def _generate_output(self, sensor, sensor_data, timestamp=None):
         data = OrderedDict()
-        data['name'] = self._config.sensor.lower()
-        data['timestamp'] = str(datetime.now())
+        if len(self._sensors) == 1 and self._config.sensor.lower() != 'auto':
+            data['name'] = self._config.sensor.lower()
+        else:
+            data['name'] = sensor.DRIVER_NAME
+        if timestamp is None:
+            data['timestamp'] = str(datetime.now())
+        else:
+            data['timestamp'] = str(datetime.fromtimestamp(timestamp))
         data['measurements'] = {}
         for key, value in sorted(sensor_data.items()):
            data['measurements'][key] = value
@@ -120,8 +291,10 @@ class SenlibApp(AsyncioApp):
 
     def _generate_xml(self, data):
         """ Generates XML output. """
+        from dicttoxml import dicttoxml
         xml = dicttoxml(data, attr_type=False, custom_root='sensor')
         if self._config.pretty_print:
+            from xml.dom.minidom import parseString
             dom = parseString(xml)
             return dom.toprettyxml()
         else:
@@ -135,17 +308,40 @@ class SenlibApp(AsyncioApp):
         return out
 
     def _start(self):
-        def callback(num):
-            sensor_data = self._sensor.measure()
-            print(self._generate_output(self._sensor, sensor_data))
+        if self._capture is not None:
+            self._start_capture()
+            return
+
+        async def measure(num):
+            for sensor, sensor_data in zip(self._sensors, await self._measure()):
+                print(self._generate_output(sensor, sensor_data))
 
             if num != self._config.poll:
                 self._loop.call_later(self._config.interval, callback, num+1)
             else:
                 self._loop.stop()
+
+        def callback(num):
+            self._loop.create_task(measure(num))
                     
         self._loop.call_soon(callback, 1)
 
+    def _start_capture(self):
+        """ 
+        Captures the number of samples given by poll at maximum rate and
+        prints them once the capture is done.
+        """
+        async def capture():
+            await self._capture_samples(self._config.poll)
+            self._capture.flush()
+            captured = self._compensate_captured(self._take_captured())
+            for sensor, samples in zip(self._sensors, captured):
+                for timestamp, sensor_data in samples:
+                    print(self._generate_output(sensor, sensor_data, timestamp))
+            self._loop.stop()
+
+        self._loop.create_task(capture())
+
 
 class SennodeApp(AsyncioApp):
     """ SennodeCLI is an Asyncio-based sensor node application. """
@@ -153,18 +349,24 @@ class SennodeApp(AsyncioApp):
     def _after_init(self):
         self._webserver = None
         self._publisher = None
+        self._measuring = False
 
         if self._config.http:
-            self._webserver = WebServer(self._config.interval, self._loop, self._sensor)
+            from senlib.web import WebServer
+            self._webserver = WebServer(self._config.interval, self._loop, self._sensor,
+                    stats=self._bus_stats)
 
         if self._config.mqtt_broker_url:
+            from senlib.mqtt import Publisher
             self.mqtt_topic = self._config.mqtt_topic
             if not self.mqtt_topic:
                 self.mqtt_topic = 'sensor/{}'.format(self._sensor.DRIVER_NAME)
 
             self._publisher = Publisher(self._config.mqtt_broker_url, self.mqtt_topic)
 
-    def _publish_data(self, data):
+    def _publish_data(self, data, sensor=None):
+        if sensor is not None:
+            data['sensor'] = sensor.DRIVER_NAME
         data['timestamp'] = time.time()
         data['node'] = self._config.node or platform.node()
         if self._webserver:
@@ -195,14 +397,54 @@ class SennodeApp(AsyncioApp):
 
             asyncio.ensure_future(connect())
 
+        if self._capture is not None:
+            self._start_capture()
+            return
+
+        async def measure():
+            try:
+                data = await self._measure()
+            finally:
+                self._measuring = False
+            if len(self._sensors) == 1:
+                self._publish_data(data[0])
+            else:
+                for sensor, sensor_data in zip(self._sensors, data):
+                    self._publish_data(sensor_data, sensor)
+
         def callback():
             logger.debug('callback')
-            sensor_data = self._sensor.measure()
-            self._publish_data(sensor_data)
+            # the measurements of a driver must not overlap, hence a tick is
+            # skipped while the last measurement is still running
+            if self._measuring:
+                logger.debug('skip tick, measurement in progress')
+            else:
+                self._measuring = True
+                self._loop.create_task(measure())
             self._loop.call_later(self._config.interval, callback)
                         
         self._loop.call_soon(callback)
 
+    def _start_capture(self):
+        """
+        Captures samples at maximum rate. Every interval the samples captured
+        since are compensated in a worker thread and the last sample of each
+        sensor is published.
+        """
+        async def publish():
+            captured = await self._loop.run_in_executor(None,
+                    self._compensate_captured, self._take_captured())
+            for sensor, samples in zip(self._sensors, captured):
+                if samples:
+                    _, data = samples[-1]
+                    self._publish_data(data, sensor if len(self._sensors) > 1 else None)
+
+        def callback():
+            self._loop.create_task(publish())
+            self._loop.call_later(self._config.interval, callback)
+
+        self._loop.create_task(self._capture_samples())
+        self._loop.call_later(self._config.interval, callback)
 
     def _after_stop(self):
         if self._publisher:
@@ -17,11 +17,17 @@ def print_version(ctx, param, value):
 
 @click.command()
 @click.argument('sensor')
-@click.option('--address', help='I2C address of the sensor.')
+@click.option('--address', help='I2C address of the sensor(s).')
+@click.option('--rescan', is_flag=True, help='Ignore the cached scan of sensor auto.')
 @click.option('--poll', '-p', default=1, help='Polls the sensor.')
 @click.option('--interval','-i', default=2.0, help='Sampling interval.')
 @click.option('--output', type=click.File('w'), help='Save output to a file.')
 @click.option('--format','-f', help='Output format to use.')
+@click.option('--pipeline', is_flag=True, help='Trigger all sensors at once.')
+@click.option('--record', help='Record bus transactions to a trace file.')
+@click.option('--replay', help='Replay bus transactions from a trace file.')
+@click.option('--bus-stats', is_flag=True, help='Collect bus statistics.')
+@click.option('--capture', help='Capture raw samples at maximum rate to a file.')
 @click.option('--mock','--fake','--simulate', is_flag=True, help='Mock sensor.')
 @click.option('--debug', '-d', is_flag=True, help='Debug mode.')
 @click.option('--pretty-print', '--pp', is_flag=True, help='Pretty printing.')
@@ -34,7 +40,8 @@ def senlib(**kwargs):
 
 @click.command()
 @click.argument('sensor')
-@click.option('--address', help='I2C address of the sensor.')
+@click.option('--address', help='I2C address of the sensor(s).')
+@click.option('--rescan', is_flag=True, help='Ignore the cached scan of sensor auto.')
 @click.option('--node', default=None, help='Node name.')
 @click.option('--http', is_flag=True, help='Start Web API.')
 @click.option('--http-host', default='0.0.0.0', help='HTTP host to use.')
@@ -42,6 +49,11 @@ def senlib(**kwargs):
 @click.option('--mqtt-topic', '-t', default=None, help='MQTT topic to use.')
 @click.option('--mqtt-broker-url','-L', help='MQTT broker to publish data.')
 @click.option('--interval', '-i', default=2.0, help='Sampling interval.')
+@click.option('--pipeline', is_flag=True, help='Trigger all sensors at once.')
+@click.option('--record', help='Record bus transactions to a trace file.')
+@click.option('--replay', help='Replay bus transactions from a trace file.')
+@click.option('--bus-stats', is_flag=True, help='Collect bus statistics.')
+@click.option('--capture', help='Capture raw samples at maximum rate to a file.')
 @click.option('--mock','--fake','--simulate', is_flag=True, help='Mock sensor.')
 @click.option('--debug', '-d', is_flag=True, help='Debug mode.')
 @click.option('--version', '-V', is_flag=True, callback=print_version, 
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+__author__ = 'Alexander Rüedlinger'
+__all__ = ('cache_dir', 'load', 'store', 'fingerprint')
+
+# json and hashlib are imported on first use, this module is imported by
+# every driver
+import os
+import logging
+logger = logging.getLogger('cache')
+
+
+def cache_dir():
+    """
+    Returns the cache directory of senlib, i.e. $XDG_CACHE_HOME/senlib or
+    ~/.cache/senlib. The environment variable SENLIB_CACHE_DIR overrides it.
+    """
+    path = os.environ.get('SENLIB_CACHE_DIR')
+    if path:
+        return path
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+            os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'senlib')
+
+
+def load(name, default=None):
+    """ Returns the JSON data of the cache file name or default. """
+    import json
+    path = os.path.join(cache_dir(), name)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.debug('cannot load cache file %s: %s', path, e)
+        return default
+
+
+def store(name, data):
+    """
+    Writes data as JSON to the cache file name. The file is replaced
+    atomically, hence concurrent readers never see a partial file. Returns
+    False if the cache is not writable.
+    """
+    import json
+    directory = cache_dir()
+    path = os.path.join(directory, name)
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, sort_keys=True)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.debug('cannot store cache file %s: %s', path, e)
+        return False
+    return True
+
+
+def fingerprint(data):
+    """ Returns a short hex string which identifies the JSON data. """
+    import hashlib
+    import json
+    text = json.dumps(data, sort_keys=True)
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
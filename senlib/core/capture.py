@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+__author__ = 'Alexander Rüedlinger'
+__all__ = ('CaptureWriter', 'CaptureReader', 'CaptureError', 'compensate')
+
+import io
+import json
+import struct
+import logging
+logger = logging.getLogger('capture')
+
+# A capture file starts with a header followed by the records. A calibration
+# record describes a sensor: its driver, the names of its raw values and its
+# calibration data as JSON payload. It is written once per sensor before its
+# first frame. A frame record stores the raw values of one sample of a
+# sensor, which is referenced by the index of its calibration record.
+HEADER = struct.Struct('<8sH') # magic, version
+CALIBRATION = struct.Struct('<BH') # type, payload length
+FRAME = struct.Struct('<BdH') # type, timestamp, calibration index
+VALUE = 'q'
+MAGIC = b'SENCAPTR'
+VERSION = 1
+
+REC_CALIBRATION = 0x01
+REC_FRAME = 0x02
+
+
+class CaptureError(Exception):
+    pass
+
+
+class CaptureWriter(object):
+    """
+    Writes raw samples as returned by Sensor.measure_raw() to a binary
+    capture file. The samples are compensated later, see compensate().
+    """
+
+    def __init__(self, path):
+        self._file = io.open(path, 'wb')
+        self._file.write(HEADER.pack(MAGIC, VERSION))
+        self._frames = []
+        self.frames = 0
+        logger.debug('capture raw samples to %s', path)
+
+    def add(self, sensor):
+        """ Writes the calibration record of a sensor and returns its index. """
+        payload = json.dumps({
+            'driver': sensor.driver_name(),
+            'id': sensor.calibration_id,
+            'fields': list(sensor.RAW_FIELDS),
+            'calibration': sensor.calibration_data
+        }, sort_keys=True).encode()
+        self._file.write(CALIBRATION.pack(REC_CALIBRATION, len(payload)))
+        self._file.write(payload)
+        self._frames.append(struct.Struct(FRAME.format + VALUE * len(sensor.RAW_FIELDS)))
+        return len(self._frames) - 1
+
+    def write(self, index, timestamp, values):
+        """ Writes the raw values of a sample of the sensor with the given index. """
+        self._file.write(self._frames[index].pack(REC_FRAME, timestamp, index, *values))
+        self.frames += 1
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __enter__(self):
+        return self
+
+
+class CaptureReader(object):
+    """
+    Reads a capture file. A truncated last record, e.g. of an interrupted
+    capture, is ignored.
+    """
+
+    def __init__(self, path):
+        with io.open(path, 'rb') as f:
+            self._data = f.read()
+        if len(self._data) < HEADER.size:
+            raise CaptureError('{} is not a capture file'.format(path))
+        magic, version = HEADER.unpack_from(self._data)
+        if magic != MAGIC:
+            raise CaptureError('{} is not a capture file'.format(path))
+        if version != VERSION:
+            raise CaptureError('unsupported capture version {}'.format(version))
+        self.records = []
+        self.timestamps = []
+        self.samples = []
+        self._frames = []
+        self._parse()
+
+    def _parse(self):
+        data, offset = self._data, HEADER.size
+        while offset < len(data):
+            rec_type = data[offset]
+            if rec_type == REC_CALIBRATION:
+                if offset + CALIBRATION.size > len(data):
+                    break
+                _, length = CALIBRATION.unpack_from(data, offset)
+                offset += CALIBRATION.size
+                if offset + length > len(data):
+                    break
+                record = json.loads(data[offset:offset + length].decode())
+                offset += length
+                self.records.append(record)
+                self.timestamps.append([])
+                self.samples.append([])
+                self._frames.append(struct.Struct(FRAME.format + VALUE * len(record['fields'])))
+            elif rec_type == REC_FRAME:
+                if offset + FRAME.size > len(data):
+                    break
+                _, _, index = FRAME.unpack_from(data, offset)
+                if index >= len(self._frames):
+                    raise CaptureError('frame of unknown sensor {} at offset {}'.format(
+                        index, offset))
+                frame = self._frames[index]
+                if offset + frame.size > len(data):
+                    break
+                values = frame.unpack_from(data, offset)
+                self.timestamps[index].append(values[1])
+                self.samples[index].append(values[3:])
+                offset += frame.size
+            else:
+                raise CaptureError('unknown record type {:#04x} at offset {}'.format(
+                    rec_type, offset))
+
+
+def compensate(records, samples):
+    """
+    Compensates the raw samples of each sensor in one batch with its driver,
+    see Sensor.compensate_raw(). The arguments are lists as given by the
+    records and samples attributes of a CaptureReader. Returns a list with
+    the compensated data of each sensor.
+    """
+    from ..i2c import get_sensor_driver
+    data = []
+    for record, raw in zip(records, samples):
+        driver_class = get_sensor_driver(record['driver'])
+        data.append(driver_class.compensate_raw(record['calibration'], raw))
+    return data
@@ -1,23 +1,87 @@
 # -*- coding: utf-8 -*-
 
 __author__ = 'Alexander Rüedlinger'
-__all__ = ('SMBus', 'AddressParser')
+__all__ = ('SMBus', 'I2CBus', 'Measurement', 'RawSample', 'trigger_pipelined', 
+        'AddressParser')
 
-import struct
 import fcntl
 import io
-from collections import deque
+import ctypes
+import errno
+import time
+from collections import deque, namedtuple
 from urllib.parse import urlparse
 import re
+from . import cache
 import logging
 logger = logging.getLogger('i2c')
 
+# ioctl requests and constants from linux/i2c-dev.h and linux/i2c.h
+I2C_SLAVE = 0x0703
+I2C_FUNCS = 0x0705
+I2C_RDWR = 0x0707
+I2C_SMBUS = 0x0720
+
+I2C_M_RD = 0x0001
+
+I2C_SMBUS_WRITE = 0
+I2C_SMBUS_READ = 1
+
+I2C_SMBUS_QUICK = 0
+I2C_SMBUS_BYTE = 1
+I2C_SMBUS_BYTE_DATA = 2
+I2C_SMBUS_WORD_DATA = 3
+
+I2C_SMBUS_BLOCK_MAX = 32
+I2C_RDWR_IOCTL_MAX_MSGS = 42
+
+
+class i2c_msg(ctypes.Structure):
+    _fields_ = [
+        ('addr', ctypes.c_uint16),
+        ('flags', ctypes.c_uint16),
+        ('len', ctypes.c_uint16),
+        ('buf', ctypes.POINTER(ctypes.c_uint8))
+    ]
+
+
+class i2c_rdwr_ioctl_data(ctypes.Structure):
+    _fields_ = [
+        ('msgs', ctypes.POINTER(i2c_msg)),
+        ('nmsgs', ctypes.c_uint32)
+    ]
+
+
+class i2c_smbus_data(ctypes.Union):
+    _fields_ = [
+        ('byte', ctypes.c_uint8),
+        ('word', ctypes.c_uint16),
+        ('block', ctypes.c_uint8 * (I2C_SMBUS_BLOCK_MAX + 2))
+    ]
+
+
+class i2c_smbus_ioctl_data(ctypes.Structure):
+    _fields_ = [
+        ('read_write', ctypes.c_uint8),
+        ('command', ctypes.c_uint8),
+        ('size', ctypes.c_uint32),
+        ('data', ctypes.POINTER(i2c_smbus_data))
+    ]
+
 
 class SMBusInterface(object):
     """
     A helper class for using the Linux SMBus interface.
     """
 
+    # Buses which serve recorded data set this to False, drivers then do not
+    # wait for conversions.
+    conversion_delays = True
+
+    # Buses of real devices let the drivers take the calibration data of a
+    # sensor from the on-disk cache, see Sensor._load_calibration_data().
+    calibration_cache = True
+
     @property
     def name(self):
         raise NotImplementedError
@@ -31,6 +95,10 @@ class SMBusInterface(object):
     def __enter__(self):
         return self
 
+    def write_quick(self, addr):
+        """ Sends only the address, i.e. checks if a device acknowledges. """
+        raise NotImplementedError
+
     def read_byte(self, addr):
         raise NotImplementedError
 
@@ -55,6 +123,37 @@ class SMBusInterface(object):
     def write_i2c_block_data(self, addr, cmd, vals):
         raise NotImplementedError
 
+    def read_i2c_block_data_into(self, addr, cmd, buf):
+        """
+        Reads len(buf) bytes starting at register cmd into buf, a writable
+        bytes-like object such as a bytearray or memoryview. Returns the 
+        number of bytes read.
+        """
+        data = self.read_i2c_block_data(addr, cmd, len(buf))
+        nbytes = len(data)
+        memoryview(buf)[:nbytes] = bytes(data)
+        return nbytes
+
+    def read_bytes_into(self, addr, buf):
+        """
+        Reads len(buf) bytes into buf in a single read without writing a
+        register pointer first, e.g. the result of a conversion which was
+        started by a write. Returns the number of bytes read. SMBus has no
+        such read, byte reads would restart the result at its first byte, 
+        hence buses without plain I2C reads raise EOPNOTSUPP.
+        """
+        raise OSError(errno.EOPNOTSUPP, '{} does not support plain I2C reads'.format(
+            self.name))
+
+    def read_registers(self, addr, regs):
+        """
+        Reads several register blocks given as a list of (cmd, nbytes) tuples
+        and returns a list with the data of each block. Buses which support 
+        combined transactions read all blocks at once, otherwise the blocks 
+        are read one after another.
+        """
+        return [self.read_i2c_block_data(addr, cmd, nbytes) for cmd, nbytes in regs]
+
     def __str__(self):
         return '<{}(name={})>'.format(self.__class__.__name__, self.name)
 
@@ -66,6 +165,9 @@ class I2CInterface(object):
     A helper class for using the Linux I2C interface.
     """
 
+    conversion_delays = True
+    calibration_cache = True
+
     @property
     def name(self):
         raise NotImplementedError
@@ -103,6 +205,26 @@ class I2CInterface(object):
     def write_i2c_block_data(self, addr, cmd, vals):
         raise NotImplementedError
 
+    def read_i2c_block_data_into(self, addr, cmd, buf):
+        """
+        Reads len(buf) bytes starting at register cmd into buf, a writable
+        bytes-like object such as a bytearray or memoryview. Returns the 
+        number of bytes read.
+        """
+        data = self.read_i2c_block_data(addr, cmd, len(buf))
+        nbytes = len(data)
+        memoryview(buf)[:nbytes] = bytes(data)
+        return nbytes
+
+    def read_registers(self, addr, regs):
+        """
+        Reads several register blocks given as a list of (cmd, nbytes) tuples
+        and returns a list with the data of each block. Buses which support 
+        combined transactions read all blocks at once, otherwise the blocks 
+        are read one after another.
+        """
+        return [self.read_i2c_block_data(addr, cmd, nbytes) for cmd, nbytes in regs]
+
     def __str__(self):
         return '<{}(name={})>'.format(self.__class__.__name__, self.name)
 
@@ -123,8 +245,7 @@ class SMBus(SMBusInterface):
             import smbus
             self._smbus = smbus.SMBus(bus)
 
-        msg = 'create SMBus(bus={}) object'.format(bus)
-        logger.debug(msg)
+        logger.debug('create SMBus(bus=%s) object', bus)
 
     @property
     def name(self):
@@ -143,60 +264,369 @@ class SMBus(SMBusInterface):
     def __enter__(self):
         return self
 
+    def write_quick(self, addr):
+        self._smbus.write_quick(addr)
+
     def read_byte(self, addr):
-        r = self._smbus.read_byte(addr)
-        msg = 'call SMBus.read_byte(addr={})={}'.format(addr, r)
-        logger.debug(msg)
-        return r
+        return self._smbus.read_byte(addr)
 
     def write_byte(self, addr, val):
-        msg = 'call SMBus.write_byte(addr={}, val={})'.format(addr, val)
-        logger.debug(msg)
         self._smbus.write_byte(addr, val)
 
     def read_byte_data(self, addr, cmd):
-        r = self._smbus.read_byte_data(addr, cmd)
-        msg = 'call SMBus.read_byte_data(addr={}, cmd={})={}'.format(addr, cmd, r)
-        logger.debug(msg)
-        return r
+        return self._smbus.read_byte_data(addr, cmd)
 
     def write_byte_data(self, addr, cmd, val):
-        msg = 'call SMBus.write_byte_data(addr={}, cmd={}, val={})'.format(addr, cmd, val)
-        logger.debug(msg)
         self._smbus.write_byte_data(addr, cmd, val)
 
     def read_word_data(self, addr, cmd):
-        r = self._smbus.read_word_data(addr, cmd)
-        msg = 'call SMBus.read_word_data(addr={}, cmd={})={}'.format(addr, cmd, r)
-        logger.debug(msg)
-        return r
+        return self._smbus.read_word_data(addr, cmd)
 
     def write_word_data(self, addr, cmd, val):
-        msg = 'call SMBus.write_word_data(addr={}, cmd={}, val={})'.format(addr, 
-                cmd, val)
-        logger.debug(msg)
         self._smbus.write_word_data(addr, cmd, val)
 
     def read_i2c_block_data(self, addr, cmd, nbytes):
-        r = self._smbus.read_i2c_block_data(addr, cmd, nbytes)
-        msg = 'call SMBus.read_i2c_block_data(addr={}, cmd={}, nbytes={})={}'.format(addr, cmd, nbytes, r)
-        logger.debug(msg)
-        return r
+        return self._smbus.read_i2c_block_data(addr, cmd, nbytes)
 
     def write_i2c_block_data(self, addr, cmd, vals):
-        msg = 'call SMBus.write_i2c_block_data(addr={}, cmd={}, vals={})'.format(addr, cmd, vals)
-        logger.debug(msg)
         self._smbus.write_i2c_block_data(addr, cmd, vals)
 
 
+class I2CBus(SMBusInterface, I2CInterface):
+    """
+    A pure Python implementation of the Linux I2C/SMBus interface.
+
+    The bus talks to the i2c-dev character device directly by issuing
+    I2C_SMBUS and I2C_RDWR ioctls. Register block reads are done as a combined
+    write+read transaction with a repeated start, i.e. a single syscall.
+
+    The arguments dev and ioctl allow to replace the device file and the ioctl
+    function, e.g. with a FakeI2CDev object.
+    """
+
+    def __init__(self, bus=1, dev=None, ioctl=None):
+        self._bus = bus
+        self._dev = dev or io.open('/dev/i2c-{}'.format(bus), 'r+b', buffering=0)
+        self._fd = self._dev.fileno()
+        self._ioctl = ioctl or fcntl.ioctl
+        self._addr = None
+
+        # preallocated ioctl arguments and buffers which are reused on every call
+        self._data = i2c_smbus_data()
+        self._args = i2c_smbus_ioctl_data(data=ctypes.pointer(self._data))
+        self._wbuf = (ctypes.c_uint8 * (I2C_SMBUS_BLOCK_MAX + 1))()
+        self._rbuf = (ctypes.c_uint8 * 256)()
+        self._msgs = (i2c_msg * 2)()
+        self._rdwr = i2c_rdwr_ioctl_data(msgs=self._msgs, nmsgs=2)
+        logger.debug('create I2CBus(bus=%s) object', bus)
+
+    @property
+    def name(self):
+        return 'i2c-{}'.format(self._bus)
+
+    @property
+    def bus(self):
+        return self._bus
+
+    def close(self):
+        self._dev.close()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def _set_addr(self, addr):
+        if self._addr != addr:
+            self._ioctl(self._fd, I2C_SLAVE, addr)
+            self._addr = addr
+
+    def _smbus_access(self, addr, read_write, cmd, size):
+        self._set_addr(addr)
+        args = self._args
+        args.read_write = read_write
+        args.command = cmd
+        args.size = size
+        self._ioctl(self._fd, I2C_SMBUS, args)
+
+    def _read_buffer(self, nbytes):
+        if nbytes > len(self._rbuf):
+            self._rbuf = (ctypes.c_uint8 * nbytes)()
+        return self._rbuf
+
+    def write_quick(self, addr):
+        self._smbus_access(addr, I2C_SMBUS_WRITE, 0, I2C_SMBUS_QUICK)
+
+    def read_byte(self, addr):
+        self._smbus_access(addr, I2C_SMBUS_READ, 0, I2C_SMBUS_BYTE)
+        return self._data.byte
+
+    def write_byte(self, addr, val):
+        # the value is sent in the command field, no data is needed
+        self._set_addr(addr)
+        args = self._args
+        args.read_write = I2C_SMBUS_WRITE
+        args.command = val
+        args.size = I2C_SMBUS_BYTE
+        self._ioctl(self._fd, I2C_SMBUS, args)
+
+    def read_byte_data(self, addr, cmd):
+        self._smbus_access(addr, I2C_SMBUS_READ, cmd, I2C_SMBUS_BYTE_DATA)
+        return self._data.byte
+
+    def write_byte_data(self, addr, cmd, val):
+        self._data.byte = val
+        self._smbus_access(addr, I2C_SMBUS_WRITE, cmd, I2C_SMBUS_BYTE_DATA)
+
+    def read_word_data(self, addr, cmd):
+        self._smbus_access(addr, I2C_SMBUS_READ, cmd, I2C_SMBUS_WORD_DATA)
+        return self._data.word
+
+    def write_word_data(self, addr, cmd, val):
+        self._data.word = val
+        self._smbus_access(addr, I2C_SMBUS_WRITE, cmd, I2C_SMBUS_WORD_DATA)
+
+    def write_read(self, addr, vals, nbytes):
+        """
+        Writes vals and reads nbytes back in a single combined transaction
+        (repeated start). Returns the read bytes as a list.
+        """
+        wbuf = self._wbuf
+        nvals = len(vals)
+        if nvals > len(wbuf):
+            wbuf = (ctypes.c_uint8 * nvals)()
+        wbuf[:nvals] = vals
+        rbuf = self._read_buffer(nbytes)
+
+        msgs = self._msgs
+        msgs[0].addr = addr
+        msgs[0].flags = 0
+        msgs[0].len = nvals
+        msgs[0].buf = wbuf
+        msgs[1].addr = addr
+        msgs[1].flags = I2C_M_RD
+        msgs[1].len = nbytes
+        msgs[1].buf = rbuf
+        self._rdwr.nmsgs = 2
+        self._ioctl(self._fd, I2C_RDWR, self._rdwr)
+        return rbuf[:nbytes]
+
+    def read_i2c_block_data(self, addr, cmd, nbytes):
+        return self.write_read(addr, (cmd,), nbytes)
+
+    def read_bytes_into(self, addr, buf):
+        """ Reads len(buf) bytes into buf in a single I2C read transaction. """
+        nbytes = len(buf)
+        rbuf = (ctypes.c_uint8 * nbytes).from_buffer(buf)
+        msgs = self._msgs
+        msgs[0].addr = addr
+        msgs[0].flags = I2C_M_RD
+        msgs[0].len = nbytes
+        msgs[0].buf = rbuf
+        self._rdwr.nmsgs = 1
+        try:
+            self._ioctl(self._fd, I2C_RDWR, self._rdwr)
+        finally:
+            # do not keep the caller's buffer exported
+            msgs[0].buf = self._wbuf
+        return nbytes
+
+    def read_i2c_block_data_into(self, addr, cmd, buf):
+        """
+        Reads len(buf) bytes starting at register cmd directly into buf 
+        without intermediate copies. Returns the number of bytes read.
+        """
+        nbytes = len(buf)
+        rbuf = (ctypes.c_uint8 * nbytes).from_buffer(buf)
+        wbuf = self._wbuf
+        wbuf[0] = cmd
+
+        msgs = self._msgs
+        msgs[0].addr = addr
+        msgs[0].flags = 0
+        msgs[0].len = 1
+        msgs[0].buf = wbuf
+        msgs[1].addr = addr
+        msgs[1].flags = I2C_M_RD
+        msgs[1].len = nbytes
+        msgs[1].buf = rbuf
+        self._rdwr.nmsgs = 2
+        try:
+            self._ioctl(self._fd, I2C_RDWR, self._rdwr)
+        finally:
+            # do not keep the caller's buffer exported
+            msgs[1].buf = self._rbuf
+        return nbytes
+
+    def read_registers(self, addr, regs):
+        """
+        Reads several register blocks given as a list of (cmd, nbytes) tuples 
+        in a single I2C_RDWR transaction. Returns a list with the data of each 
+        block.
+        """
+        data = []
+        max_regs = I2C_RDWR_IOCTL_MAX_MSGS // 2
+        for i in range(0, len(regs), max_regs):
+            data.extend(self._read_registers(addr, regs[i:i + max_regs]))
+        return data
+
+    def _read_registers(self, addr, regs):
+        nregs = len(regs)
+        cmds = (ctypes.c_uint8 * nregs)(*[cmd for cmd, _ in regs])
+        rbuf = self._read_buffer(sum(nbytes for _, nbytes in regs))
+        msgs = (i2c_msg * (2 * nregs))()
+
+        offset = 0
+        for i, (_, nbytes) in enumerate(regs):
+            wmsg, rmsg = msgs[2 * i], msgs[2 * i + 1]
+            wmsg.addr = addr
+            wmsg.len = 1
+            wmsg.buf = ctypes.pointer(ctypes.c_uint8.from_buffer(cmds, i))
+            rmsg.addr = addr
+            rmsg.flags = I2C_M_RD
+            rmsg.len = nbytes
+            rmsg.buf = ctypes.pointer(ctypes.c_uint8.from_buffer(rbuf, offset))
+            offset += nbytes
+
+        self._ioctl(self._fd, I2C_RDWR, i2c_rdwr_ioctl_data(msgs=msgs, nmsgs=2 * nregs))
+
+        data = []
+        offset = 0
+        for _, nbytes in regs:
+            data.append(rbuf[offset:offset + nbytes])
+            offset += nbytes
+        return data
+
+    def write_i2c_block_data(self, addr, cmd, vals):
+        wbuf = self._wbuf
+        nvals = len(vals) + 1
+        if nvals > len(wbuf):
+            wbuf = (ctypes.c_uint8 * nvals)()
+        wbuf[0] = cmd
+        wbuf[1:nvals] = vals
+
+        msg = self._msgs[0]
+        msg.addr = addr
+        msg.flags = 0
+        msg.len = nvals
+        msg.buf = wbuf
+        self._rdwr.nmsgs = 1
+        self._ioctl(self._fd, I2C_RDWR, self._rdwr)
+
+
+class FakeI2CDev(object):
+    """
+    A stand-in for an i2c-dev device file which serves the ioctl calls of an
+    I2CBus object from in-memory register maps. Useful for testing and
+    benchmarking I2CBus without hardware.
+
+    Each device is a 256 byte register map with an auto-incrementing register
+    pointer. Accesses to addresses without a device fail with ENXIO.
+    """
+
+    def __init__(self, devices=None):
+        self.devices = {addr: bytearray(regs) + bytearray(256 - len(regs)) 
+                for addr, regs in (devices or {}).items()}
+        self.ioctl_calls = 0
+        self.closed = False
+        self._addr = None
+        self._pointers = {}
+
+    def fileno(self):
+        return -1
+
+    def close(self):
+        self.closed = True
+
+    def _device(self, addr):
+        if addr not in self.devices:
+            raise OSError(errno.ENXIO, 'No such device or address')
+        return self.devices[addr]
+
+    def _read(self, addr, nbytes):
+        regs = self._device(addr)
+        ptr = self._pointers.get(addr, 0)
+        data = [regs[(ptr + i) & 0xFF] for i in range(nbytes)]
+        self._pointers[addr] = (ptr + nbytes) & 0xFF
+        return data
+
+    def _write(self, addr, data):
+        regs = self._device(addr)
+        if not data:
+            return
+        ptr = data[0]
+        for val in data[1:]:
+            regs[ptr] = val
+            ptr = (ptr + 1) & 0xFF
+        self._pointers[addr] = data[0] if len(data) == 1 else ptr
+
+    def ioctl(self, fd, request, arg, mutate_flag=True):
+        self.ioctl_calls += 1
+        if request == I2C_SLAVE:
+            self._addr = arg
+        elif request == I2C_RDWR:
+            for i in range(arg.nmsgs):
+                msg = arg.msgs[i]
+                if msg.flags & I2C_M_RD:
+                    for j, val in enumerate(self._read(msg.addr, msg.len)):
+                        msg.buf[j] = val
+                else:
+                    self._write(msg.addr, msg.buf[:msg.len])
+        elif request == I2C_SMBUS:
+            self._smbus(arg)
+        else:
+            raise OSError(errno.ENOTTY, 'Inappropriate ioctl for device')
+        return 0
+
+    def _smbus(self, arg):
+        data = arg.data.contents
+        addr = self._addr
+        if arg.size == I2C_SMBUS_QUICK:
+            self._write(addr, [])
+        elif arg.size == I2C_SMBUS_BYTE:
+            if arg.read_write == I2C_SMBUS_READ:
+                data.byte = self._read(addr, 1)[0]
+            else:
+                self._write(addr, [arg.command])
+        elif arg.size == I2C_SMBUS_BYTE_DATA:
+            if arg.read_write == I2C_SMBUS_READ:
+                self._write(addr, [arg.command])
+                data.byte = self._read(addr, 1)[0]
+            else:
+                self._write(addr, [arg.command, data.byte])
+        elif arg.size == I2C_SMBUS_WORD_DATA:
+            if arg.read_write == I2C_SMBUS_READ:
+                self._write(addr, [arg.command])
+                lsb, msb = self._read(addr, 2)
+                data.word = (msb << 8) | lsb
+            else:
+                self._write(addr, [arg.command, data.word & 0xFF, data.word >> 8])
+        else:
+            raise OSError(errno.EINVAL, 'Invalid argument')
+
+
 class MockBus(SMBusInterface, I2CInterface):
     """
     A helper class for mocking the Linux I2C/SMBus interface.
+
+    Every call counts as one bus transaction. The counter is available by
+    the attribute transactions. The argument latency sets the time in seconds 
+    a transaction takes.
     """
 
-    def __init__(self, bus=1, SMBus=None, read_data=None):
+    calibration_cache = False
+
+    def __init__(self, bus=1, SMBus=None, read_data=None, latency=0.0):
         self._bus = bus
         self._read_data = deque(read_data or [])
+        self._latency = latency
+        self.transactions = 0
+
+    def _transaction(self):
+        self.transactions += 1
+        if self._latency:
+            time.sleep(self._latency)
 
     @property
     def name(self):
@@ -215,29 +645,46 @@ class MockBus(SMBusInterface, I2CInterface):
     def __enter__(self):
         return self
 
+    def write_quick(self, addr):
+        self._transaction()
+
     def read_byte(self, addr):
+        self._transaction()
         return self._read_data.popleft()
 
     def write_byte(self, addr, val):
-        pass
+        self._transaction()
 
     def read_byte_data(self, addr, cmd):
+        self._transaction()
         return self._read_data.popleft()
 
     def write_byte_data(self, addr, cmd, val):
-        pass
+        self._transaction()
 
     def read_word_data(self, addr, cmd):
+        self._transaction()
         return self._read_data.popleft()
 
     def write_word_data(self, addr, cmd, val):
-        pass
+        self._transaction()
 
     def read_i2c_block_data(self, addr, cmd, nbytes):
+        self._transaction()
         return self._read_data.popleft()
 
+    def read_bytes_into(self, addr, buf):
+        self._transaction()
+        data = self._read_data.popleft()
+        memoryview(buf)[:len(data)] = bytes(data)
+        return len(data)
+
     def write_i2c_block_data(self, addr, cmd, vals):
-        pass
+        self._transaction()
+
+    def read_registers(self, addr, regs):
+        self._transaction()
+        return [self._read_data.popleft() for _ in regs]
 
 
 class Device(object):
@@ -287,17 +734,262 @@ class Device(object):
     __repr__ = __str__
 
 
+class Measurement(object):
+    """
+    A measurement in progress.
+
+    A measurement is driven by a generator which does the bus transactions of
+    a sensor, yields the time in seconds to wait for a conversion and finally
+    returns the measurement data. Creating a measurement runs the generator up
+    to the first wait, i.e. it triggers the conversion. Once ready_at is
+    reached, fetch() continues the generator until the next wait or the end.
+    If delays is False, the waits are skipped.
+    """
+
+    def __init__(self, steps, delays=True):
+        self._steps = steps
+        self._delays = delays
+        self.ready_at = None
+        self.done = False
+        self.result = None
+        self._next()
+
+    def _next(self):
+        try:
+            delay = next(self._steps)
+        except StopIteration as e:
+            self.ready_at = None
+            self.done = True
+            self.result = e.value
+        else:
+            self.ready_at = time.monotonic() + (delay if self._delays else 0.0)
+
+    def delay(self):
+        """ Returns the time in seconds until the conversion is ready. """
+        if self.done:
+            return 0.0
+        return max(0.0, self.ready_at - time.monotonic())
+
+    def fetch(self):
+        """ Continues the measurement and returns True if it is done. """
+        self._next()
+        return self.done
+
+    def wait(self):
+        """ Blocks until the measurement is done and returns its data. """
+        while not self.done:
+            time.sleep(self.delay())
+            self._next()
+        return self.result
+
+    async def wait_async(self):
+        """ Awaits the measurement without blocking the event loop. """
+        import asyncio
+        while not self.done:
+            await asyncio.sleep(self.delay())
+            self._next()
+        return self.result
+
+
+def _pipeline_steps(sensors):
+    import heapq
+    results = [None] * len(sensors)
+    pending = []
+    for i, sensor in enumerate(sensors):
+        measurement = sensor.trigger()
+        if measurement.done:
+            results[i] = measurement.result
+        else:
+            heapq.heappush(pending, (measurement.ready_at, i, measurement))
+
+    while pending:
+        ready_at, i, measurement = pending[0]
+        delay = ready_at - time.monotonic()
+        if delay > 0:
+            yield delay
+        heapq.heappop(pending)
+        if measurement.fetch():
+            results[i] = measurement.result
+        else:
+            heapq.heappush(pending, (measurement.ready_at, i, measurement))
+
+    return results
+
+
+def trigger_pipelined(sensors):
+    """
+    Triggers the measurements of all sensors at once and fetches the results
+    in the order in which the conversions are ready. Hence, a measurement
+    cycle takes as long as the slowest sensor instead of the sum of all. 
+    Returns a Measurement object whose result is a list with the data of 
+    each sensor.
+    """
+    return Measurement(_pipeline_steps(sensors))
+
+
+RawSample = namedtuple('RawSample', ['calibration_id', 'values'])
+
+CALIBRATION_CACHE_FILE = 'calibration.json'
+
+
 class Sensor(Device):
     """
     Basic generic interface of the supported sensors.
+
+    Sensors which have to wait for conversions implement _measure_steps() as
+    a generator, see Measurement. All other sensors just implement measure().
+
+    Sensors which support raw samples implement _measure_raw_steps() which
+    returns a tuple of the raw values named by RAW_FIELDS, and
+    _compensate_raw() which computes the measurement data from them with the
+    calibration data only.
     """
 
+    RAW_FIELDS = ()
+
     def __init__(self, bus, addr):
         super(Sensor, self).__init__(bus, addr)
 
+    @property
+    def calibration_data(self):
+        return {}
+
+    @property
+    def calibration_id(self):
+        """ Returns the ID of the calibration data, see make_calibration_id(). """
+        calibration_id = getattr(self, '_calibration_id', None)
+        if calibration_id is None:
+            calibration_id = self._calibration_id = self.make_calibration_id(
+                    self.calibration_data)
+        return calibration_id
+
+    def _calibration_cache_key(self):
+        return '{}@{}/{:#04x}'.format(self.driver_name(), self._bus.name, self.addr)
+
+    def _read_chip_id(self):
+        raise NotImplementedError
+
+    def _load_calibration_data(self, force=False):
+        """
+        Sets the calibration data of the sensor. If the bus allows it, the
+        data is taken from the on-disk cache provided that the cached entry of
+        the driver, bus and address has the chip ID read by _read_chip_id().
+        Otherwise, or if force is set, the data is read by
+        _read_calibration_data() and stored in the cache.
+        """
+        self._calibration_id = None
+        if not getattr(self._bus, 'calibration_cache', False):
+            self._read_calibration_data()
+            return
+
+        key = self._calibration_cache_key()
+        chip_id = self._read_chip_id()
+        entries = cache.load(CALIBRATION_CACHE_FILE, {})
+        entry = entries.get(key)
+        if not force and entry and entry.get('chip_id') == chip_id:
+            logger.debug('take calibration data of %s from cache', key)
+            self._calibration_data = entry['calibration']
+            for name, val in self._calibration_data.items():
+                setattr(self, 'dig_' + name, val)
+            return
+
+        self._read_calibration_data()
+        entries[key] = {'chip_id': chip_id, 'calibration': self._calibration_data}
+        cache.store(CALIBRATION_CACHE_FILE, entries)
+
+    def refresh_calibration_data(self):
+        """ Reads the calibration data from the sensor and updates the cache. """
+        self._load_calibration_data(force=True)
+
+    @classmethod
+    def make_calibration_id(cls, calibration_data):
+        """
+        Returns a short hex string which identifies the driver together with
+        the calibration data.
+        """
+        return cache.fingerprint([cls.driver_name(), calibration_data])
+
+    @classmethod
+    def from_calibration_data(cls, calibration_data):
+        """
+        Returns an object without bus which only compensates raw values with
+        the given calibration data.
+        """
+        sensor = cls.__new__(cls)
+        sensor._calibration_data = dict(calibration_data)
+        for key, val in calibration_data.items():
+            setattr(sensor, 'dig_' + key, val)
+        return sensor
+
+    @classmethod
+    def compensate_raw(cls, calibration_data, samples):
+        """
+        Compensates a sequence of raw values as returned by measure_raw().
+        Returns a dict which maps each measured quantity to the sequence of 
+        its values.
+        """
+        sensor = cls.from_calibration_data(calibration_data)
+        data = {}
+        for values in samples:
+            for key, value in sensor._compensate_raw(*values).items():
+                data.setdefault(key, []).append(value)
+        return data
+
+    def _compensate_raw(self, *values):
+        raise NotImplementedError
+
+    def _measure_raw_steps(self):
+        raise NotImplementedError
+
+    def _raw_steps(self):
+        values = yield from self._measure_raw_steps()
+        return RawSample(self.calibration_id, values)
+
+    def trigger_raw(self):
+        """ Starts a measurement of raw values and returns a Measurement object. """
+        delays = getattr(self._bus, 'conversion_delays', True)
+        return Measurement(self._raw_steps(), delays)
+
+    def measure_raw(self):
+        """
+        Measures without compensation. Returns a RawSample with the ID of the
+        calibration data and the tuple of the raw values, see compensate_raw().
+        """
+        return self.trigger_raw().wait()
+
+    async def measure_raw_async(self):
+        return await self.trigger_raw().wait_async()
+
+    @classmethod
+    def addresses(cls):
+        """ Returns the addresses at which the sensor can be found. """
+        return (cls.default_addr(),)
+
+    @classmethod
+    def probe(cls, bus, addr):
+        """
+        Checks if the device at the given address is this sensor, e.g. by its
+        chip ID. Returns True or False, or None if the sensor cannot be 
+        identified.
+        """
+        return None
+
     def measure(self):
         return {}
 
+    def _measure_steps(self):
+        yield 0.0
+        return self.measure()
+
+    def trigger(self):
+        """ Starts a measurement and returns a Measurement object. """
+        delays = getattr(self._bus, 'conversion_delays', True)
+        return Measurement(self._measure_steps(), delays)
+
+    async def measure_async(self):
+        """ Measures without blocking the event loop during conversions. """
+        return await self.trigger().wait_async()
+
 
 class AddressParser:
 
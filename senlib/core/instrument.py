@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+
+__author__ = 'Alexander Rüedlinger'
+__all__ = ('InstrumentedBus', 'BusStats', 'BusLogger', 'instrument')
+
+import time
+import threading
+from .i2c import SMBusInterface, I2CInterface
+import logging
+logger = logging.getLogger('instrument')
+
+# Latency histograms have log2 buckets in microseconds: bucket 0 counts calls
+# faster than 1 us, bucket k calls that took [2^(k-1), 2^k) us. The last
+# bucket also counts all slower calls.
+HISTOGRAM_BUCKETS = 24
+
+
+class BusStats(object):
+    """
+    Collects per-device and per-operation counts, transferred bytes, errors
+    and latency histograms of bus calls.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, bus, addr, op, nbytes, elapsed, error=False):
+        key = (bus, addr, op)
+        bucket = min(int(elapsed * 1e6).bit_length(), HISTOGRAM_BUCKETS - 1)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = [0, 0, 0, 0.0, [0] * HISTOGRAM_BUCKETS]
+            stats[0] += 1
+            stats[1] += nbytes
+            stats[2] += error
+            stats[3] += elapsed
+            stats[4][bucket] += 1
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def dump(self):
+        """
+        Returns the statistics as a dict of the form
+        {bus: {addr: {op: {'count':..., 'bytes':..., 'errors':..., 'time':...,
+        'histogram': [...]}}}}. The addresses are given as hex strings.
+        """
+        with self._lock:
+            items = [(key, list(stats[:4]) + [list(stats[4])])
+                    for key, stats in self._stats.items()]
+
+        out = {}
+        for (bus, addr, op), (count, nbytes, errors, elapsed, hist) in sorted(items):
+            device = out.setdefault(bus, {}).setdefault('{:#04x}'.format(addr), {})
+            device[op] = {
+                'count': count,
+                'bytes': nbytes,
+                'errors': errors,
+                'time': elapsed,
+                'histogram': hist
+            }
+        return out
+
+    def format(self):
+        """ Returns the statistics as a plain text table. """
+        lines = ['{:<8} {:<6} {:<26} {:>8} {:>8} {:>6} {:>10} {:>10}'.format(
+            'bus', 'addr', 'op', 'count', 'bytes', 'errors', 'time [ms]', 'mean [us]')]
+        for bus, devices in self.dump().items():
+            for addr, ops in devices.items():
+                for op, stats in ops.items():
+                    lines.append('{:<8} {:<6} {:<26} {:>8} {:>8} {:>6} {:>10.3f} {:>10.1f}'.format(
+                        bus, addr, op, stats['count'], stats['bytes'],
+                        stats['errors'], stats['time'] * 1e3,
+                        stats['time'] * 1e6 / stats['count']))
+        return '\n'.join(lines)
+
+
+class BusLogger(object):
+    """ Logs every bus call on the DEBUG level. """
+
+    def record(self, bus, addr, op, nbytes, elapsed, error=False):
+        logger.debug('%s %#04x %s nbytes=%d time=%.1fus%s', bus, addr, op, nbytes,
+                elapsed * 1e6, ' failed' if error else '')
+
+
+class InstrumentedBus(SMBusInterface, I2CInterface):
+    """
+    Wraps a bus object and reports each call to the attached instruments.
+
+    An instrument is an object with a method record(bus, addr, op, nbytes,
+    elapsed, error). Buses without instruments are not wrapped at all, hence
+    instrumentation has no cost unless it is enabled, see instrument().
+    """
+
+    def __init__(self, bus, *instruments):
+        self._bus = bus
+        self._instruments = instruments
+
+    @property
+    def name(self):
+        return self._bus.name
+
+    @property
+    def bus(self):
+        return self._bus.bus
+
+    @property
+    def conversion_delays(self):
+        return getattr(self._bus, 'conversion_delays', True)
+
+    @property
+    def calibration_cache(self):
+        return getattr(self._bus, 'calibration_cache', False)
+
+    @property
+    def instruments(self):
+        return self._instruments
+
+    def close(self):
+        self._bus.close()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def _record(self, addr, op, nbytes, start, error=False):
+        elapsed = time.perf_counter() - start
+        for instrument in self._instruments:
+            instrument.record(self._bus.name, addr, op, nbytes, elapsed, error)
+
+    def _call(self, op, addr, nbytes, *args):
+        start = time.perf_counter()
+        try:
+            r = getattr(self._bus, op)(addr, *args)
+        except OSError:
+            self._record(addr, op, 0, start, True)
+            raise
+        self._record(addr, op, nbytes, start)
+        return r
+
+    def write_quick(self, addr):
+        self._call('write_quick', addr, 0)
+
+    def read_byte(self, addr):
+        return self._call('read_byte', addr, 1)
+
+    def write_byte(self, addr, val):
+        self._call('write_byte', addr, 1, val)
+
+    def read_byte_data(self, addr, cmd):
+        return self._call('read_byte_data', addr, 1, cmd)
+
+    def write_byte_data(self, addr, cmd, val):
+        self._call('write_byte_data', addr, 1, cmd, val)
+
+    def read_word_data(self, addr, cmd):
+        return self._call('read_word_data', addr, 2, cmd)
+
+    def write_word_data(self, addr, cmd, val):
+        self._call('write_word_data', addr, 2, cmd, val)
+
+    def read_i2c_block_data(self, addr, cmd, nbytes):
+        return self._call('read_i2c_block_data', addr, nbytes, cmd, nbytes)
+
+    def write_i2c_block_data(self, addr, cmd, vals):
+        self._call('write_i2c_block_data', addr, len(vals), cmd, vals)
+
+    def read_i2c_block_data_into(self, addr, cmd, buf):
+        return self._call('read_i2c_block_data_into', addr, len(buf), cmd, buf)
+
+    def read_bytes_into(self, addr, buf):
+        return self._call('read_bytes_into', addr, len(buf), buf)
+
+    def read_registers(self, addr, regs):
+        nbytes = sum(n for _, n in regs)
+        return self._call('read_registers', addr, nbytes, regs)
+
+
+def instrument(bus, *instruments):
+    """
+    Returns an InstrumentedBus object for the given instruments or the bus
+    object itself if there are none.
+    """
+    if not instruments:
+        return bus
+    return InstrumentedBus(bus, *instruments)
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+__author__ = 'Alexander Rüedlinger'
+__all__ = ('BusRegistry', 'SharedBus', 'default_registry')
+
+import threading
+from .i2c import I2CBus, SMBusInterface, I2CInterface
+import logging
+logger = logging.getLogger('registry')
+
+
+class SharedBus(SMBusInterface, I2CInterface):
+    """
+    A reference to a bus handle of a BusRegistry. Closing it releases the
+    reference, the handle itself is closed with its last reference.
+    """
+
+    def __init__(self, registry, bus, handle):
+        self._registry = registry
+        self._bus = bus
+        self._handle = handle
+        self._closed = False
+
+    @property
+    def name(self):
+        return self._handle.name
+
+    @property
+    def bus(self):
+        return self._bus
+
+    @property
+    def handle(self):
+        return self._handle
+
+    @property
+    def conversion_delays(self):
+        return getattr(self._handle, 'conversion_delays', True)
+
+    @property
+    def calibration_cache(self):
+        return getattr(self._handle, 'calibration_cache', False)
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._registry.release(self._bus)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def write_quick(self, addr):
+        self._handle.write_quick(addr)
+
+    def read_byte(self, addr):
+        return self._handle.read_byte(addr)
+
+    def write_byte(self, addr, val):
+        self._handle.write_byte(addr, val)
+
+    def read_byte_data(self, addr, cmd):
+        return self._handle.read_byte_data(addr, cmd)
+
+    def write_byte_data(self, addr, cmd, val):
+        self._handle.write_byte_data(addr, cmd, val)
+
+    def read_word_data(self, addr, cmd):
+        return self._handle.read_word_data(addr, cmd)
+
+    def write_word_data(self, addr, cmd, val):
+        self._handle.write_word_data(addr, cmd, val)
+
+    def read_i2c_block_data(self, addr, cmd, nbytes):
+        return self._handle.read_i2c_block_data(addr, cmd, nbytes)
+
+    def write_i2c_block_data(self, addr, cmd, vals):
+        self._handle.write_i2c_block_data(addr, cmd, vals)
+
+    def read_i2c_block_data_into(self, addr, cmd, buf):
+        return self._handle.read_i2c_block_data_into(addr, cmd, buf)
+
+    def read_bytes_into(self, addr, buf):
+        return self._handle.read_bytes_into(addr, buf)
+
+    def read_registers(self, addr, regs):
+        return self._handle.read_registers(addr, regs)
+
+
+class BusRegistry(object):
+    """
+    Hands out one shared, reference-counted handle per bus number.
+
+    acquire() opens the handle of a bus on first use and returns a SharedBus
+    reference to it. The handle is closed when the last reference is
+    released. Note that the references share one handle but do not
+    serialise access to it, see BusScheduler. The handles are I2CBus objects
+    by default, which support the plain reads of read_bytes_into().
+    """
+
+    def __init__(self, bus_factory=None):
+        self._bus_factory = bus_factory or (lambda bus: I2CBus(bus=bus))
+        self._lock = threading.Lock()
+        self._handles = {}
+        self._refcounts = {}
+        self.opened = 0
+
+    def acquire(self, bus):
+        with self._lock:
+            if bus not in self._handles:
+                self._handles[bus] = self._bus_factory(bus)
+                self._refcounts[bus] = 0
+                self.opened += 1
+                logger.debug('open bus %s', bus)
+            self._refcounts[bus] += 1
+            return SharedBus(self, bus, self._handles[bus])
+
+    def release(self, bus):
+        with self._lock:
+            if bus not in self._refcounts:
+                return
+            self._refcounts[bus] -= 1
+            if self._refcounts[bus] > 0:
+                return
+            del self._refcounts[bus]
+            handle = self._handles.pop(bus)
+        logger.debug('close bus %s', bus)
+        handle.close()
+
+    def refcount(self, bus):
+        with self._lock:
+            return self._refcounts.get(bus, 0)
+
+    def buses(self):
+        """ Returns the numbers of the buses with open handles. """
+        with self._lock:
+            return sorted(self._handles)
+
+    def close(self):
+        """ Closes all handles regardless of their references. """
+        with self._lock:
+            handles = list(self._handles.values())
+            self._handles.clear()
+            self._refcounts.clear()
+        for handle in handles:
+            handle.close()
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def default_registry():
+    """ Returns the process-wide BusRegistry object. """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = BusRegistry()
+        return _registry
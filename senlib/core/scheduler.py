@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+
+__author__ = 'Alexander Rüedlinger'
+__all__ = ('BusScheduler', 'BusWorker', 'ScheduledBus', 'default_scheduler')
+
+import errno
+import threading
+import time
+import queue
+from concurrent.futures import Future
+from .i2c import SMBusInterface, I2CInterface
+from .registry import default_registry
+import logging
+logger = logging.getLogger('scheduler')
+
+
+def _closed_error():
+    return OSError(errno.EBADF, 'Bus worker is closed')
+
+
+class BusWorker(object):
+    """
+    Runs all transactions of one bus on a dedicated worker thread.
+
+    Work is submitted as a function which is called with the bus object as
+    first argument. Each submission returns a concurrent.futures.Future.
+    Once the worker is closed, submissions fail with EBADF.
+    """
+
+    def __init__(self, bus):
+        self._bus = bus
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self.submitted = 0
+        self.completed = 0
+        self.max_queue_depth = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self._thread = threading.Thread(target=self._run,
+                name='{}-worker'.format(bus.name), daemon=True)
+        self._thread.start()
+        logger.debug('start worker for bus %s', bus.name)
+
+    @property
+    def bus(self):
+        return self._bus
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def in_worker(self):
+        return threading.current_thread() is self._thread
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise _closed_error()
+            self._queue.put((future, time.monotonic(), fn, args, kwargs))
+            self.submitted += 1
+            self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return future
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            future, submitted_at, fn, args, kwargs = item
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            wait_time = time.monotonic() - submitted_at
+            with self._lock:
+                self.wait_time_total += wait_time
+                self.wait_time_max = max(self.wait_time_max, wait_time)
+            try:
+                result = fn(self._bus, *args, **kwargs)
+            except BaseException as e:
+                with self._lock:
+                    self.completed += 1
+                future.set_exception(e)
+            else:
+                with self._lock:
+                    self.completed += 1
+                future.set_result(result)
+
+    def stats(self):
+        with self._lock:
+            completed = self.completed
+            return {
+                'queue_depth': self.queue_depth,
+                'max_queue_depth': self.max_queue_depth,
+                'submitted': self.submitted,
+                'completed': completed,
+                'wait_time_total': self.wait_time_total,
+                'wait_time_max': self.wait_time_max,
+                'wait_time_mean': self.wait_time_total / completed if completed else 0.0
+            }
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            # the work which has not started yet fails
+            while True:
+                try:
+                    future = self._queue.get_nowait()[0]
+                except queue.Empty:
+                    break
+                if future.set_running_or_notify_cancel():
+                    future.set_exception(_closed_error())
+            self._queue.put(None)
+        if not self.in_worker():
+            self._thread.join()
+        self._bus.close()
+
+
+class ScheduledBus(SMBusInterface, I2CInterface):
+    """
+    A bus object which runs every call on the worker thread of its bus.
+
+    The calls block until the transaction is done. Calls made from the worker
+    thread itself, e.g. by a function passed to submit(), run directly. Each
+    ScheduledBus object holds a reference to the worker of its bus, close()
+    releases it.
+    """
+
+    def __init__(self, worker, release=None):
+        self._worker = worker
+        self._release = release
+
+    @property
+    def name(self):
+        return self._worker.bus.name
+
+    @property
+    def bus(self):
+        return self._worker.bus.bus
+
+    @property
+    def worker(self):
+        return self._worker
+
+    @property
+    def conversion_delays(self):
+        return getattr(self._worker.bus, 'conversion_delays', True)
+
+    @property
+    def calibration_cache(self):
+        return getattr(self._worker.bus, 'calibration_cache', False)
+
+    def submit(self, fn, *args, **kwargs):
+        return self._worker.submit(fn, *args, **kwargs)
+
+    def _call(self, method, *args):
+        if self._worker.in_worker():
+            return getattr(self._worker.bus, method)(*args)
+        future = self._worker.submit(lambda bus: getattr(bus, method)(*args))
+        return future.result()
+
+    def close(self):
+        release, self._release = self._release, None
+        if release is not None:
+            release()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def write_quick(self, addr):
+        self._call('write_quick', addr)
+
+    def read_byte(self, addr):
+        return self._call('read_byte', addr)
+
+    def write_byte(self, addr, val):
+        self._call('write_byte', addr, val)
+
+    def read_byte_data(self, addr, cmd):
+        return self._call('read_byte_data', addr, cmd)
+
+    def write_byte_data(self, addr, cmd, val):
+        self._call('write_byte_data', addr, cmd, val)
+
+    def read_word_data(self, addr, cmd):
+        return self._call('read_word_data', addr, cmd)
+
+    def write_word_data(self, addr, cmd, val):
+        self._call('write_word_data', addr, cmd, val)
+
+    def read_i2c_block_data(self, addr, cmd, nbytes):
+        return self._call('read_i2c_block_data', addr, cmd, nbytes)
+
+    def write_i2c_block_data(self, addr, cmd, vals):
+        self._call('write_i2c_block_data', addr, cmd, vals)
+
+    def read_i2c_block_data_into(self, addr, cmd, buf):
+        return self._call('read_i2c_block_data_into', addr, cmd, buf)
+
+    def read_bytes_into(self, addr, buf):
+        return self._call('read_bytes_into', addr, buf)
+
+    def read_registers(self, addr, regs):
+        return self._call('read_registers', addr, regs)
+
+
+class BusScheduler(object):
+    """
+    Runs one worker thread per physical bus.
+
+    Transactions on the same bus are serialised, while transactions on
+    different buses run in parallel. By default, the bus handles are taken
+    from the process-wide BusRegistry. The ScheduledBus objects returned by
+    bus() are reference-counted, the worker of a bus stops and releases its
+    handle when the last one is closed.
+    """
+
+    def __init__(self, bus_factory=None):
+        self._bus_factory = bus_factory or default_registry().acquire
+        self._workers = {}
+        self._refcounts = {}
+        self._lock = threading.Lock()
+
+    def _worker(self, bus):
+        if bus not in self._workers:
+            self._workers[bus] = BusWorker(self._bus_factory(bus))
+        return self._workers[bus]
+
+    def worker(self, bus):
+        with self._lock:
+            return self._worker(bus)
+
+    def bus(self, bus):
+        """ Returns a ScheduledBus object for the given bus number. """
+        with self._lock:
+            worker = self._worker(bus)
+            self._refcounts[bus] = self._refcounts.get(bus, 0) + 1
+        return ScheduledBus(worker, lambda: self.release(bus))
+
+    def release(self, bus):
+        with self._lock:
+            if bus not in self._refcounts:
+                return
+            self._refcounts[bus] -= 1
+            if self._refcounts[bus] > 0:
+                return
+            del self._refcounts[bus]
+            worker = self._workers.pop(bus, None)
+        if worker is not None:
+            worker.close()
+
+    def refcount(self, bus):
+        with self._lock:
+            return self._refcounts.get(bus, 0)
+
+    def submit(self, bus, fn, *args, **kwargs):
+        """
+        Runs fn(bus_object, *args, **kwargs) on the worker thread of the given
+        bus number and returns a future. The worker is not reference-counted,
+        i.e. it runs until the scheduler is closed. Use the submit() method of
+        a ScheduledBus object to release it after the work.
+        """
+        return self.worker(bus).submit(fn, *args, **kwargs)
+
+    def stats(self):
+        with self._lock:
+            workers = list(self._workers.values())
+        return {worker.bus.name: worker.stats() for worker in workers}
+
+    def close(self):
+        with self._lock:
+            workers = list(self._workers.values())
+            self._workers.clear()
+            self._refcounts.clear()
+        for worker in workers:
+            worker.close()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def default_scheduler():
+    """ Returns the process-wide BusScheduler object. """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = BusScheduler()
+        return _scheduler
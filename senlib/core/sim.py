@@ -0,0 +1,818 @@
+# -*- coding: utf-8 -*-
+
+__author__ = 'Alexander Rüedlinger'
+__all__ = ('SimulatedBus', 'DeviceModel', 'MODELS', 'create_model')
+
+import errno
+import random
+import threading
+import time
+from .i2c import SMBusInterface, I2CInterface
+import logging
+logger = logging.getLogger('sim')
+
+
+def _nack():
+    return OSError(errno.EREMOTEIO, 'Remote I/O error')
+
+
+def _crc8(data, poly=0x31, init=0xFF):
+    crc = init
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ poly) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+    return crc
+
+
+def _crc16_modbus(data):
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 0x01 else crc >> 1
+    return crc
+
+
+class Environment(object):
+    """
+    The physical quantities seen by the simulated sensors. Every sample adds
+    some gaussian noise to the configured values.
+    """
+
+    def __init__(self, temperature=21.0, humidity=45.0, pressure=96000.0,
+            illuminance=300.0, rng=None):
+        self.temperature = temperature
+        self.humidity = humidity
+        self.pressure = pressure
+        self.illuminance = illuminance
+        self.rng = rng or random.Random()
+
+    def sample(self, name, sigma):
+        return getattr(self, name) + self.rng.gauss(0.0, sigma)
+
+
+class DeviceModel(object):
+    """
+    Base class of the simulated devices.
+
+    The default implementation is a 256 byte register map with an
+    auto-incrementing register pointer: the first byte of a write sets the
+    pointer, further bytes are written to the registers. Reads start at the
+    pointer. Command-based devices override write() and read().
+    """
+
+    ADDR = None
+
+    def __init__(self, env=None, clock_stretch=0.0):
+        self.env = env or Environment()
+        self.clock_stretch = clock_stretch
+        self.registers = bytearray(256)
+        self.pointer = 0
+
+    def now(self):
+        return time.monotonic()
+
+    def write(self, data):
+        if not data:
+            return
+        self.pointer = data[0]
+        for val in data[1:]:
+            self.write_register(self.pointer, val)
+            self.pointer = (self.pointer + 1) & 0xFF
+
+    def read(self, nbytes):
+        data = []
+        for _ in range(nbytes):
+            data.append(self.read_register(self.pointer))
+            self.pointer = (self.pointer + 1) & 0xFF
+        return data
+
+    def read_register(self, reg):
+        return self.registers[reg]
+
+    def write_register(self, reg, val):
+        self.registers[reg] = val
+
+    def set_registers(self, reg, data):
+        self.registers[reg:reg + len(data)] = bytes(data)
+
+
+class _BoschModel(DeviceModel):
+    """
+    Common parts of the Bosch sensor models. The raw ADC values are the raw
+    values of a real sensor plus some noise.
+    """
+
+    CHIP_ID = 0x00
+    REG_ID = 0xD0
+    CALIBRATION = {}
+    RAW = {}
+    NOISE = {}
+
+    def __init__(self, env=None, clock_stretch=0.0):
+        super(_BoschModel, self).__init__(env, clock_stretch)
+        self.registers[self.REG_ID] = self.CHIP_ID
+        for reg, data in self.CALIBRATION.items():
+            self.set_registers(reg, data)
+
+    def sample_raw(self, name, bits):
+        value = int(round(self.RAW[name] + self.env.rng.gauss(0.0, self.NOISE[name])))
+        return min(max(value, 0), (1 << bits) - 1)
+
+
+class BMP280Model(_BoschModel):
+
+    ADDR = 0x77
+    CHIP_ID = 0x58
+    CALIBRATION = {
+        0x88: [30, 109, 97, 103, 24, 252, 147, 140, 255, 213, 208, 11, 160, 15,
+            139, 0, 249, 255, 140, 60, 248, 198, 112, 23, 0, 0]
+    }
+    RAW = {'adc_p': 444816, 'adc_t': 511536}
+    NOISE = {'adc_p': 40.0, 'adc_t': 30.0}
+
+    def _update(self):
+        adc_p = self.sample_raw('adc_p', 20)
+        adc_t = self.sample_raw('adc_t', 20)
+        self.set_registers(0xF7, [adc_p >> 12, (adc_p >> 4) & 0xFF, (adc_p & 0xF) << 4])
+        self.set_registers(0xFA, [adc_t >> 12, (adc_t >> 4) & 0xFF, (adc_t & 0xF) << 4])
+
+    def write(self, data):
+        super(BMP280Model, self).write(data)
+        # a read of the data registers starts with a new sample
+        if len(data) == 1 and data[0] == 0xF7:
+            self._update()
+
+
+class BME280Model(BMP280Model):
+
+    CHIP_ID = 0x60
+    CALIBRATION = {
+        0x88: [104, 110, 232, 100, 50, 0, 83, 143, 171, 213, 208, 11, 163, 34,
+            53, 0, 249, 255, 172, 38, 10, 216, 189, 16, 0, 75],
+        0xE1: [108, 1, 0, 19, 10, 0, 30]
+    }
+    RAW = {'adc_p': 354384, 'adc_t': 517488, 'adc_h': 29919}
+    NOISE = {'adc_p': 40.0, 'adc_t': 30.0, 'adc_h': 15.0}
+
+    def _update(self):
+        super(BME280Model, self)._update()
+        adc_h = self.sample_raw('adc_h', 16)
+        self.set_registers(0xFD, [adc_h >> 8, adc_h & 0xFF])
+
+
+class BMP180Model(_BoschModel):
+
+    ADDR = 0x77
+    CHIP_ID = 0x55
+    CALIBRATION = {
+        0xAA: [27, 103, 251, 151, 199, 52, 127, 144, 97, 164, 65, 238, 25, 115,
+            0, 42, 128, 0, 209, 246, 11, 6]
+    }
+    # the raw pressure value is given for oversampling setting 1
+    RAW = {'ut': 25611, 'up': 74555}
+    NOISE = {'ut': 4.0, 'up': 10.0}
+
+    TEMPERATURE_CONVERSION_TIME = 0.0045
+    PRESSURE_CONVERSION_TIMES = [0.0045, 0.0075, 0.0135, 0.0255]
+
+    def __init__(self, env=None, clock_stretch=0.0):
+        super(BMP180Model, self).__init__(env, clock_stretch)
+        self._ready_at = 0.0
+
+    def write_register(self, reg, val):
+        super(BMP180Model, self).write_register(reg, val)
+        if reg != 0xF4:
+            return
+
+        if val == 0x2E:
+            self._ready_at = self.now() + self.TEMPERATURE_CONVERSION_TIME
+            ut = self.sample_raw('ut', 16)
+            self._result = [ut >> 8, ut & 0xFF, 0]
+        elif val & 0x3F == 0x34:
+            oss = val >> 6
+            self._ready_at = self.now() + self.PRESSURE_CONVERSION_TIMES[oss]
+            up = self.sample_raw('up', 17) << 7
+            self._result = [(up >> 16) & 0xFF, (up >> 8) & 0xFF, up & 0xFF]
+
+    def read_register(self, reg):
+        # the result registers keep the old values until the conversion is done
+        if self._ready_at and self.now() >= self._ready_at:
+            self.set_registers(0xF6, self._result)
+            self.registers[0xF4] &= ~0x20 & 0xFF
+            self._ready_at = 0.0
+        elif self._ready_at and reg == 0xF4:
+            return self.registers[0xF4] | 0x20 # start of conversion bit
+        return self.registers[reg]
+
+
+class SHT31Model(DeviceModel):
+
+    ADDR = 0x44
+    CONVERSION_TIMES = {0x00: 0.015, 0x0B: 0.006, 0x16: 0.004,
+            0x06: 0.015, 0x0D: 0.006, 0x10: 0.004}
+    # periods of the periodic data acquisition modes by command MSB
+    PERIODS = {0x20: 2.0, 0x21: 1.0, 0x22: 0.5, 0x23: 0.25, 0x27: 0.1}
+    CMD_ART = 0x2B32
+    CMD_FETCH_DATA = 0xE000
+    CMD_BREAK = 0x3093
+
+    def __init__(self, env=None, clock_stretch=0.0):
+        super(SHT31Model, self).__init__(env, clock_stretch)
+        self._ready_at = None
+        self._result = []
+        self._period = None
+        self._next_at = None
+
+    def _measure(self):
+        t = self.env.sample('temperature', 0.02)
+        h = self.env.sample('humidity', 0.1)
+        t_raw = min(max(int((t + 45) * 65535 / 175.0), 0), 0xFFFF)
+        h_raw = min(max(int(h * 65535 / 100.0), 0), 0xFFFF)
+        t_data = [t_raw >> 8, t_raw & 0xFF]
+        h_data = [h_raw >> 8, h_raw & 0xFF]
+        return t_data + [_crc8(t_data)] + h_data + [_crc8(h_data)]
+
+    def command(self, cmd):
+        msb, lsb = cmd >> 8, cmd & 0xFF
+        if self._period is not None:
+            # only fetch data and break are accepted in the periodic modes
+            if cmd == self.CMD_FETCH_DATA and self.now() >= self._next_at:
+                self._result = self._measure()
+                self._ready_at = self.now()
+                while self._next_at <= self.now():
+                    self._next_at += self._period
+            elif cmd == self.CMD_FETCH_DATA:
+                self._ready_at = None
+            elif cmd == self.CMD_BREAK:
+                self._period = None
+        elif msb in self.PERIODS or cmd == self.CMD_ART:
+            self._period = self.PERIODS.get(msb, 0.25)
+            self._next_at = self.now() + 0.015
+            self._ready_at = None
+        elif msb in (0x24, 0x2C) and lsb in self.CONVERSION_TIMES:
+            self._ready_at = self.now() + self.CONVERSION_TIMES[lsb]
+            self._result = self._measure()
+        elif cmd == 0x30A2: # soft reset
+            self._ready_at = None
+            self._result = []
+
+    def write(self, data):
+        # commands are 16 bit words, an incomplete command discards the data
+        if len(data) >= 2:
+            self.command((data[0] << 8) | data[1])
+        elif data:
+            self._ready_at = None
+
+    def read(self, nbytes):
+        if self._ready_at is None or self.now() < self._ready_at:
+            raise _nack()
+        data = (self._result + [0xFF] * nbytes)[:nbytes]
+        self._ready_at = None
+        return data
+
+
+class SI7021Model(DeviceModel):
+
+    ADDR = 0x40
+    CMD_MEASURE_HUM_HOLD = 0xE5
+    CMD_MEASURE_HUM = 0xF5
+    CMD_MEASURE_TEMP_HOLD = 0xE3
+    CMD_MEASURE_TEMP = 0xF3
+    CMD_LAST_TEMP = 0xE0
+    CMD_WRITE_USER_REG = 0xE6
+    CMD_READ_USER_REG = 0xE7
+    CMD_RESET = 0xFE
+
+    # maximum conversion times by the resolution bits of the user register
+    HUMIDITY_CONVERSION_TIMES = {0x00: 0.012, 0x01: 0.0031, 0x80: 0.0045, 0x81: 0.007}
+    TEMPERATURE_CONVERSION_TIMES = {0x00: 0.0108, 0x01: 0.0038, 0x80: 0.0062, 0x81: 0.0024}
+
+    def __init__(self, env=None, clock_stretch=0.0):
+        super(SI7021Model, self).__init__(env, clock_stretch)
+        self._ready_at = None
+        self._result = []
+        self._last_temp = 0
+        self.user_reg = 0x3A
+
+    def _temperature_code(self):
+        t = self.env.sample('temperature', 0.02)
+        return min(max(int((t + 46.85) * 65536 / 175.72), 0), 0xFFFF) & 0xFFFC
+
+    def _humidity_code(self):
+        h = self.env.sample('humidity', 0.1)
+        return min(max(int((h + 6) * 65536 / 125.0), 0), 0xFFFF) & 0xFFFC
+
+    def _set_result(self, code, delay):
+        data = [code >> 8, code & 0xFF]
+        self._result = data + [_crc8(data, init=0x00)]
+        self._ready_at = self.now() + delay
+
+    def write(self, data):
+        if not data:
+            return
+        cmd = data[0]
+        resolution = self.user_reg & 0x81
+        if cmd in (self.CMD_MEASURE_HUM, self.CMD_MEASURE_HUM_HOLD):
+            # a humidity conversion also measures the temperature
+            self._last_temp = self._temperature_code()
+            self._set_result(self._humidity_code(),
+                    self.HUMIDITY_CONVERSION_TIMES[resolution] +
+                    self.TEMPERATURE_CONVERSION_TIMES[resolution])
+        elif cmd in (self.CMD_MEASURE_TEMP, self.CMD_MEASURE_TEMP_HOLD):
+            self._last_temp = self._temperature_code()
+            self._set_result(self._last_temp, self.TEMPERATURE_CONVERSION_TIMES[resolution])
+        elif cmd == self.CMD_LAST_TEMP:
+            self._set_result(self._last_temp, 0.0)
+            self._result = self._result[:2]
+        elif cmd == self.CMD_READ_USER_REG:
+            self._result = [self.user_reg]
+            self._ready_at = self.now()
+        elif cmd == self.CMD_WRITE_USER_REG and len(data) > 1:
+            self.user_reg = data[1]
+        elif cmd == self.CMD_RESET:
+            self._ready_at = None
+            self._result = []
+            self.user_reg = 0x3A
+
+    def read(self, nbytes):
+        # the sensor does not acknowledge reads while it is converting
+        if self._ready_at is None or self.now() < self._ready_at:
+            raise _nack()
+        data = self._result[:nbytes]
+        self._result = self._result[nbytes:]
+        if not self._result:
+            self._ready_at = None
+        return data + [0xFF] * (nbytes - len(data))
+
+
+class HDC1008Model(DeviceModel):
+
+    ADDR = 0x40
+    REG_TMP = 0x00
+    REG_HUM = 0x01
+    REG_CONFIG = 0x02
+
+    TEMPERATURE_CONVERSION_TIMES = {0: 0.00635, 1: 0.00365}
+    HUMIDITY_CONVERSION_TIMES = {0: 0.0065, 1: 0.00385, 2: 0.0025}
+
+    def __init__(self, env=None, clock_stretch=0.0):
+        super(HDC1008Model, self).__init__(env, clock_stretch)
+        self.words = {
+            self.REG_CONFIG: 0x1000,
+            0xFB: 0x0123, 0xFC: 0x4567, 0xFD: 0x8900,
+            0xFE: 0x5449, 0xFF: 0x1000
+        }
+        self._ready_at = None
+        self._result = []
+
+    @property
+    def config(self):
+        return self.words[self.REG_CONFIG]
+
+    def _measure(self, reg):
+        mode = (self.config >> 12) & 0x1
+        tres = (self.config >> 10) & 0x1
+        hres = (self.config >> 8) & 0x3
+        t = self.env.sample('temperature', 0.02)
+        h = self.env.sample('humidity', 0.1)
+        t_raw = min(max(int((t + 40) * 65536 / 165.0), 0), 0xFFFF)
+        h_raw = min(max(int(h * 65536 / 100.0), 0), 0xFFFF)
+
+        if reg == self.REG_TMP and mode:
+            delay = self.TEMPERATURE_CONVERSION_TIMES[tres] + \
+                    self.HUMIDITY_CONVERSION_TIMES.get(hres, 0.0065)
+            self._result = [t_raw >> 8, t_raw & 0xFF, h_raw >> 8, h_raw & 0xFF]
+        elif reg == self.REG_TMP:
+            delay = self.TEMPERATURE_CONVERSION_TIMES[tres]
+            self._result = [t_raw >> 8, t_raw & 0xFF]
+        else:
+            delay = self.HUMIDITY_CONVERSION_TIMES.get(hres, 0.0065)
+            self._result = [h_raw >> 8, h_raw & 0xFF]
+        self._ready_at = self.now() + delay
+
+    def write(self, data):
+        if not data:
+            return
+        self.pointer = data[0]
+        if len(data) >= 3 and self.pointer in self.words:
+            self.words[self.pointer] = (data[1] << 8) | data[2]
+        elif len(data) == 1 and self.pointer in (self.REG_TMP, self.REG_HUM):
+            self._measure(self.pointer)
+
+    def read(self, nbytes):
+        if self.pointer in (self.REG_TMP, self.REG_HUM):
+            if self._ready_at is None or self.now() < self._ready_at:
+                raise _nack()
+            data = self._result[:nbytes]
+            self._result = self._result[nbytes:]
+            if not self._result:
+                self._ready_at = None
+            return data + [0xFF] * (nbytes - len(data))
+
+        word = self.words.get(self.pointer, 0)
+        return ([word >> 8, word & 0xFF] * nbytes)[:nbytes]
+
+
+class LM75Model(DeviceModel):
+
+    ADDR = 0x48
+
+    def read(self, nbytes):
+        if self.pointer == 0x00:
+            t = int(round(self.env.sample('temperature', 0.1) * 2))
+            word = (t << 7) & 0xFFFF
+            return ([word >> 8, word & 0xFF] * nbytes)[:nbytes]
+        return super(LM75Model, self).read(nbytes)
+
+
+class MCP9808Model(DeviceModel):
+
+    ADDR = 0x18
+    WORDS = {0x06: 0x0054, 0x07: 0x0400}
+
+    def read(self, nbytes):
+        if self.pointer == 0x05:
+            t = int(round(self.env.sample('temperature', 0.05) * 16))
+            word = t & 0x1FFF
+        else:
+            word = self.WORDS.get(self.pointer, 0)
+        return ([word >> 8, word & 0xFF] * nbytes)[:nbytes]
+
+
+class BH1750Model(DeviceModel):
+
+    ADDR = 0x23
+    CONVERSION_TIMES = {0x10: 0.12, 0x11: 0.12, 0x13: 0.016,
+            0x20: 0.12, 0x21: 0.12, 0x23: 0.016}
+
+    def __init__(self, env=None, clock_stretch=0.0):
+        super(BH1750Model, self).__init__(env, clock_stretch)
+        self.powered = False
+        self.mode = None
+        self.mtreg = 69
+        self._ready_at = None
+        self._count = 0
+
+    def _counts(self, mode):
+        lux = max(self.env.sample('illuminance', 1.0), 0.0)
+        count = lux * 1.2 * self.mtreg / 69.0
+        if mode in (0x11, 0x21):
+            count *= 2
+        return min(int(count), 0xFFFF)
+
+    def _update(self):
+        if self._ready_at is not None and self.now() >= self._ready_at:
+            self._count = self._counts(self.mode)
+            if self.mode in (0x10, 0x11, 0x13):
+                # continuous modes start the next conversion right away
+                self._ready_at += self.CONVERSION_TIMES[self.mode] * self.mtreg / 69.0
+            else:
+                self._ready_at = None
+                self.powered = False
+
+    def write(self, data):
+        for cmd in data:
+            self._update()
+            if cmd == 0x00:
+                self.powered = False
+                self._ready_at = None
+            elif cmd == 0x01:
+                self.powered = True
+            elif cmd == 0x07 and self.powered:
+                self._count = 0
+            elif cmd in self.CONVERSION_TIMES:
+                self.powered = True
+                self.mode = cmd
+                self._ready_at = self.now() + \
+                        self.CONVERSION_TIMES[cmd] * self.mtreg / 69.0
+            elif cmd & 0xF8 == 0x40:
+                self.mtreg = (self.mtreg & 0x1F) | ((cmd & 0x07) << 5)
+            elif cmd & 0xE0 == 0x60:
+                self.mtreg = (self.mtreg & 0xE0) | (cmd & 0x1F)
+
+    def read(self, nbytes):
+        self._update()
+        return ([self._count >> 8, self._count & 0xFF] * nbytes)[:nbytes]
+
+
+class MPL115A2Model(DeviceModel):
+
+    ADDR = 0x60
+    COEFFICIENTS = [60, 149, 182, 174, 198, 209, 50, 8]
+    RAW = {'padc': 417, 'tadc': 521}
+    NOISE = {'padc': 1.0, 'tadc': 1.0}
+    CONVERSION_TIME = 0.003
+
+    def __init__(self, env=None, clock_stretch=0.0):
+        super(MPL115A2Model, self).__init__(env, clock_stretch)
+        self.set_registers(0x04, self.COEFFICIENTS)
+
+    def write(self, data):
+        super(MPL115A2Model, self).write(data)
+        if data and data[0] == 0x12:
+            for reg, name in ((0x00, 'padc'), (0x02, 'tadc')):
+                adc = int(round(self.RAW[name] + self.env.rng.gauss(0.0, self.NOISE[name])))
+                adc = min(max(adc, 0), 0x3FF) << 6
+                self.set_registers(reg, [adc >> 8, adc & 0xFF])
+
+
+class MPL3115A2Model(DeviceModel):
+    """
+    In active mode a sample is taken every 2^ST seconds of CTRL_REG2 but not
+    faster than the conversion time, in standby mode the OST bit triggers a
+    single conversion. With F_MODE set, the samples go to a 32 sample FIFO
+    which is read by burst reads from OUT_P_MSB or F_DATA and STATUS reads
+    as F_STATUS.
+    """
+
+    ADDR = 0x60
+    WHO_AM_I = 0xC4
+    REG_STATUS = 0x00
+    REG_WHO_AM_I = 0x0C
+    REG_F_STATUS = 0x0D
+    REG_F_DATA = 0x0E
+    REG_F_SETUP = 0x0F
+    REG_PT_DATA_CFG = 0x13
+    REG_CTRL_REG1 = 0x26
+    REG_CTRL_REG2 = 0x27
+    FIFO_SIZE = 32
+    CONVERSION_TIMES = (0.006, 0.010, 0.018, 0.034, 0.066, 0.130, 0.258, 0.512)
+
+    def __init__(self, env=None, clock_stretch=0.0):
+        super(MPL3115A2Model, self).__init__(env, clock_stretch)
+        self.registers[self.REG_WHO_AM_I] = self.WHO_AM_I
+        self._next_at = None
+        self._fifo = []
+        self._fifo_byte = 0
+        self._overflow = False
+
+    def conversion_time(self):
+        osr = (self.registers[self.REG_CTRL_REG1] >> 3) & 0x7
+        return self.CONVERSION_TIMES[osr]
+
+    def period(self):
+        st = self.registers[self.REG_CTRL_REG2] & 0x0F
+        return max(float(1 << st), self.conversion_time())
+
+    def fifo_mode(self):
+        return self.registers[self.REG_F_SETUP] >> 6
+
+    def _sample(self):
+        p = int(round(self.env.sample('pressure', 2.0) * 4)) << 4
+        t = int(round(self.env.sample('temperature', 0.02) * 16)) << 4
+        data = [(p >> 16) & 0xFF, (p >> 8) & 0xFF, p & 0xF0, (t >> 8) & 0xFF, t & 0xF0]
+        if not self.fifo_mode():
+            self.set_registers(0x01, data)
+            self.registers[self.REG_STATUS] |= 0x0E
+        elif len(self._fifo) < self.FIFO_SIZE:
+            self._fifo.append(data)
+        elif self.fifo_mode() == 1: # circular
+            self._fifo.pop(0)
+            self._fifo.append(data)
+            self._fifo_byte = 0
+            self._overflow = True
+        else:
+            self._overflow = True
+
+    def _update(self):
+        ctrl = self.registers[self.REG_CTRL_REG1]
+        now = self.now()
+        if not ctrl & 0x01: # standby
+            if not ctrl & 0x02:
+                self._next_at = None
+            elif self._next_at is None: # one-shot
+                self._next_at = now + self.conversion_time()
+            elif now >= self._next_at:
+                self._next_at = None
+                self.registers[self.REG_CTRL_REG1] &= ~0x02 & 0xFF
+                self._sample()
+            return
+        if self._next_at is None:
+            self._next_at = now + self.conversion_time()
+        # samples missed since the last access, at most a full FIFO
+        for _ in range(self.FIFO_SIZE):
+            if now < self._next_at:
+                break
+            self._next_at += self.period()
+            self._sample()
+        else:
+            self._next_at = now + self.period()
+
+    def _f_status(self):
+        watermark = self.registers[self.REG_F_SETUP] & 0x3F
+        count = len(self._fifo)
+        return (self._overflow << 7) | ((0 < watermark <= count) << 6) | count
+
+    def write(self, data):
+        super(MPL3115A2Model, self).write(data)
+        if len(data) > 1 and data[0] == self.REG_F_SETUP and not self.fifo_mode():
+            del self._fifo[:]
+            self._fifo_byte = 0
+            self._overflow = False
+        self._update()
+
+    def read(self, nbytes):
+        if self.fifo_mode() and self.pointer in (0x01, self.REG_F_DATA):
+            # burst reads of the FIFO do not advance the register pointer
+            self._update()
+            return [self._read_fifo() for _ in range(nbytes)]
+        return super(MPL3115A2Model, self).read(nbytes)
+
+    def _read_fifo(self):
+        if not self._fifo:
+            return 0
+        val = self._fifo[0][self._fifo_byte]
+        self._fifo_byte += 1
+        if self._fifo_byte == len(self._fifo[0]):
+            self._fifo.pop(0)
+            self._fifo_byte = 0
+            self._overflow = False
+        return val
+
+    def read_register(self, reg):
+        self._update()
+        if self.fifo_mode() and reg in (self.REG_STATUS, self.REG_F_STATUS):
+            return self._f_status()
+        val = self.registers[reg]
+        if reg in (0x01, 0x02, 0x03):
+            self.registers[self.REG_STATUS] &= ~0x0C & 0xFF
+        elif reg in (0x04, 0x05):
+            self.registers[self.REG_STATUS] &= ~0x0A & 0xFF
+        return val
+
+
+class AM2315Model(DeviceModel):
+
+    ADDR = 0x5c
+
+    def __init__(self, env=None, clock_stretch=0.0):
+        super(AM2315Model, self).__init__(env, clock_stretch)
+        self._result = []
+
+    def write(self, data):
+        if len(data) == 3 and data[0] == 0x03:
+            start, nregs = data[1], data[2]
+            h = int(self.env.sample('humidity', 0.1) * 10)
+            t = int(self.env.sample('temperature', 0.05) * 10)
+            regs = [h >> 8, h & 0xFF, t >> 8, t & 0xFF]
+            frame = [0x03, nregs] + regs[start:start + nregs]
+            crc = _crc16_modbus(frame)
+            self._result = frame + [crc & 0xFF, crc >> 8]
+
+    def read(self, nbytes):
+        return (self._result + [0] * nbytes)[:nbytes]
+
+
+MODELS = {
+    'am2315': AM2315Model,
+    'am2321': AM2315Model,
+    'bh1750': BH1750Model,
+    'bme280': BME280Model,
+    'bmp085': BMP180Model,
+    'bmp180': BMP180Model,
+    'bmp280': BMP280Model,
+    'hdc1008': HDC1008Model,
+    'lm75': LM75Model,
+    'mcp9808': MCP9808Model,
+    'mpl115a2': MPL115A2Model,
+    'mpl3115a2': MPL3115A2Model,
+    'sht31': SHT31Model,
+    'si7021': SI7021Model
+}
+
+
+def create_model(name, env=None, **kwargs):
+    """ Creates the device model of the sensor with the given driver name. """
+    return MODELS[name.lower()](env=env, **kwargs)
+
+
+class SimulatedBus(SMBusInterface, I2CInterface):
+    """
+    A simulated I2C bus with device models and a timing model.
+
+    A transaction takes a fixed latency plus the time to clock its bits at
+    the given bus speed (9 bits per byte including the address byte and the
+    acknowledge bit) plus the clock stretching time of the device. With
+    realtime set, transactions really take that long, otherwise the time is
+    only accounted in busy_time. Transactions fail with EREMOTEIO if no
+    device acknowledges or if an error is injected by error_rate.
+    """
+
+    SPEED_STANDARD = 100000
+    SPEED_FAST = 400000
+
+    calibration_cache = False
+
+    def __init__(self, bus=1, devices=None, speed=SPEED_STANDARD, latency=0.0001,
+            clock_stretch=0.0, error_rate=0.0, seed=None, realtime=True):
+        self._bus = bus
+        self._devices = dict(devices or {})
+        self._speed = speed
+        self._latency = latency
+        self._clock_stretch = clock_stretch
+        self._error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._realtime = realtime
+        self._lock = threading.Lock()
+        self.transactions = 0
+        self.errors = 0
+        self.busy_time = 0.0
+
+    @property
+    def name(self):
+        return 'i2c-{}'.format(self._bus)
+
+    @property
+    def bus(self):
+        return self._bus
+
+    @property
+    def devices(self):
+        return self._devices
+
+    def add_device(self, addr, model):
+        self._devices[addr] = model
+        return model
+
+    def close(self):
+        pass
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def _transaction(self, addr, msgs):
+        """
+        Runs a transaction, msgs is a list of data lists to write and of byte
+        counts to read. Returns the read data.
+        """
+        with self._lock:
+            self.transactions += 1
+            device = self._devices.get(addr)
+            nbits = 0
+            for msg in msgs:
+                nbits += 9 * (1 + (msg if isinstance(msg, int) else len(msg))) + 1
+            duration = self._latency + nbits / float(self._speed) + \
+                    self._clock_stretch + (device.clock_stretch if device else 0.0)
+            self.busy_time += duration
+            if self._realtime:
+                time.sleep(duration)
+
+            if device is None or (self._error_rate and self._rng.random() < self._error_rate):
+                self.errors += 1
+                raise _nack()
+
+            try:
+                data = []
+                for msg in msgs:
+                    if isinstance(msg, int):
+                        data.append(device.read(msg))
+                    else:
+                        device.write(list(msg))
+                return data
+            except OSError:
+                self.errors += 1
+                raise
+
+    def write_quick(self, addr):
+        self._transaction(addr, [])
+
+    def read_byte(self, addr):
+        return self._transaction(addr, [1])[0][0]
+
+    def write_byte(self, addr, val):
+        self._transaction(addr, [[val]])
+
+    def read_byte_data(self, addr, cmd):
+        return self._transaction(addr, [[cmd], 1])[0][0]
+
+    def write_byte_data(self, addr, cmd, val):
+        self._transaction(addr, [[cmd, val]])
+
+    def read_word_data(self, addr, cmd):
+        lsb, msb = self._transaction(addr, [[cmd], 2])[0]
+        return (msb << 8) | lsb
+
+    def write_word_data(self, addr, cmd, val):
+        self._transaction(addr, [[cmd, val & 0xFF, (val >> 8) & 0xFF]])
+
+    def read_i2c_block_data(self, addr, cmd, nbytes):
+        return self._transaction(addr, [[cmd], nbytes])[0]
+
+    def write_i2c_block_data(self, addr, cmd, vals):
+        self._transaction(addr, [[cmd] + list(vals)])
+
+    def read_bytes_into(self, addr, buf):
+        data = self._transaction(addr, [len(buf)])[0]
+        memoryview(buf)[:len(data)] = bytes(data)
+        return len(data)
+
+    def read_registers(self, addr, regs):
+        msgs = []
+        for cmd, nbytes in regs:
+            msgs.extend([[cmd], nbytes])
+        return self._transaction(addr, msgs)
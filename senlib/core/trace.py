@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+
+__author__ = 'Alexander Rüedlinger'
+__all__ = ('RecordingBus', 'ReplayBus', 'TraceError', 'TraceMismatch')
+
+import io
+import os
+import mmap
+import struct
+import time
+from .i2c import SMBusInterface, I2CInterface
+import logging
+logger = logging.getLogger('trace')
+
+# A trace file starts with a header followed by the records. Each record
+# consists of a record header and the payload, i.e. the data which was read
+# or written. Failed transactions have the ERROR bit set in their op code and
+# store the errno value as payload.
+HEADER = struct.Struct('<8sHH') # magic, version, bus number
+RECORD = struct.Struct('<dBBBH') # timestamp, op, addr, cmd, payload length
+MAGIC = b'SENTRACE'
+VERSION = 1
+
+OP_READ_BYTE = 0x01
+OP_WRITE_BYTE = 0x02
+OP_READ_BYTE_DATA = 0x03
+OP_WRITE_BYTE_DATA = 0x04
+OP_READ_WORD_DATA = 0x05
+OP_WRITE_WORD_DATA = 0x06
+OP_READ_BLOCK_DATA = 0x07
+OP_WRITE_BLOCK_DATA = 0x08
+OP_WRITE_QUICK = 0x09
+OP_READ = 0x0A
+OP_ERROR = 0x80
+
+
+class TraceError(Exception):
+    pass
+
+
+class TraceMismatch(TraceError):
+    pass
+
+
+class RecordingBus(SMBusInterface, I2CInterface):
+    """
+    Wraps a bus object and logs every transaction to a binary trace file.
+    """
+
+    # the trace has to contain the calibration reads to be replayable
+    calibration_cache = False
+
+    def __init__(self, bus, path):
+        self._bus = bus
+        self._file = io.open(path, 'wb')
+        self._file.write(HEADER.pack(MAGIC, VERSION, bus.bus))
+        logger.debug('record bus %s to %s', bus.name, path)
+
+    @property
+    def name(self):
+        return self._bus.name
+
+    @property
+    def bus(self):
+        return self._bus.bus
+
+    def _record(self, op, addr, cmd, payload):
+        self._file.write(RECORD.pack(time.time(), op, addr, cmd, len(payload)))
+        self._file.write(payload)
+
+    def _call(self, op, addr, cmd, method, *args):
+        try:
+            return method(*args)
+        except OSError as e:
+            self._record(op | OP_ERROR, addr, cmd, bytes([(e.errno or 0) & 0xFF]))
+            raise
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+        self._bus.close()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def write_quick(self, addr):
+        self._call(OP_WRITE_QUICK, addr, 0, self._bus.write_quick, addr)
+        self._record(OP_WRITE_QUICK, addr, 0, b'')
+
+    def read_byte(self, addr):
+        r = self._call(OP_READ_BYTE, addr, 0, self._bus.read_byte, addr)
+        self._record(OP_READ_BYTE, addr, 0, bytes([r]))
+        return r
+
+    def write_byte(self, addr, val):
+        self._call(OP_WRITE_BYTE, addr, val, self._bus.write_byte, addr, val)
+        self._record(OP_WRITE_BYTE, addr, val, b'')
+
+    def read_byte_data(self, addr, cmd):
+        r = self._call(OP_READ_BYTE_DATA, addr, cmd, self._bus.read_byte_data, addr, cmd)
+        self._record(OP_READ_BYTE_DATA, addr, cmd, bytes([r]))
+        return r
+
+    def write_byte_data(self, addr, cmd, val):
+        self._call(OP_WRITE_BYTE_DATA, addr, cmd, self._bus.write_byte_data, addr, cmd, val)
+        self._record(OP_WRITE_BYTE_DATA, addr, cmd, bytes([val]))
+
+    def read_word_data(self, addr, cmd):
+        r = self._call(OP_READ_WORD_DATA, addr, cmd, self._bus.read_word_data, addr, cmd)
+        self._record(OP_READ_WORD_DATA, addr, cmd, struct.pack('<H', r))
+        return r
+
+    def write_word_data(self, addr, cmd, val):
+        self._call(OP_WRITE_WORD_DATA, addr, cmd, self._bus.write_word_data, addr, cmd, val)
+        self._record(OP_WRITE_WORD_DATA, addr, cmd, struct.pack('<H', val))
+
+    def read_i2c_block_data(self, addr, cmd, nbytes):
+        r = self._call(OP_READ_BLOCK_DATA, addr, cmd, self._bus.read_i2c_block_data,
+                addr, cmd, nbytes)
+        self._record(OP_READ_BLOCK_DATA, addr, cmd, bytes(r))
+        return r
+
+    def read_i2c_block_data_into(self, addr, cmd, buf):
+        nbytes = self._call(OP_READ_BLOCK_DATA, addr, cmd,
+                self._bus.read_i2c_block_data_into, addr, cmd, buf)
+        self._record(OP_READ_BLOCK_DATA, addr, cmd, bytes(memoryview(buf)[:nbytes]))
+        return nbytes
+
+    def write_i2c_block_data(self, addr, cmd, vals):
+        self._call(OP_WRITE_BLOCK_DATA, addr, cmd, self._bus.write_i2c_block_data,
+                addr, cmd, vals)
+        self._record(OP_WRITE_BLOCK_DATA, addr, cmd, bytes(vals))
+
+    def read_bytes_into(self, addr, buf):
+        nbytes = self._call(OP_READ, addr, 0, self._bus.read_bytes_into, addr, buf)
+        self._record(OP_READ, addr, 0, bytes(memoryview(buf)[:nbytes]))
+        return nbytes
+
+    def read_registers(self, addr, regs):
+        cmd = regs[0][0] if regs else 0
+        data = self._call(OP_READ_BLOCK_DATA, addr, cmd, self._bus.read_registers,
+                addr, regs)
+        for (cmd, _), block in zip(regs, data):
+            self._record(OP_READ_BLOCK_DATA, addr, cmd, bytes(block))
+        return data
+
+
+class ReplayBus(SMBusInterface, I2CInterface):
+    """
+    Serves the transactions of a trace file recorded by a RecordingBus.
+
+    The trace file is memory-mapped and read record by record. Each device
+    address has its own cursor, hence the order of transactions of different
+    devices does not matter. In strict mode, a call that does not match the
+    next record of its device raises a TraceMismatch error. With loop set,
+    the replay starts over at the end of the trace. The cursor then skips
+    the records up to the first one matching the call, e.g. the records of
+    the driver initialization.
+
+    Recorded data needs no conversion time, so drivers do not wait for
+    conversions when they use a ReplayBus.
+    """
+
+    conversion_delays = False
+    calibration_cache = False
+
+    def __init__(self, path, loop=False, strict=True):
+        self._file = io.open(path, 'rb')
+        if os.fstat(self._file.fileno()).st_size < HEADER.size:
+            self._file.close()
+            raise TraceError('{} is not a trace file'.format(path))
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self._bus = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise TraceError('{} is not a trace file'.format(path))
+        self._loop = loop
+        self._strict = strict
+        self._cursors = {}
+        self.replayed = 0
+        logger.debug('replay bus %s from %s', self.name, path)
+
+    @property
+    def name(self):
+        return 'i2c-{}'.format(self._bus)
+
+    @property
+    def bus(self):
+        return self._bus
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def _scan(self, offset, addr, op=None, cmd=None):
+        """ Returns the offset of the next record of a device or None. """
+        size = len(self._mmap)
+        while offset + RECORD.size <= size:
+            _, rec_op, rec_addr, rec_cmd, length = RECORD.unpack_from(self._mmap, offset)
+            if rec_addr == addr and (op is None or
+                    (rec_op & ~OP_ERROR == op and rec_cmd == cmd)):
+                return offset
+            offset += RECORD.size + length
+        return None
+
+    def _next(self, op, addr, cmd):
+        offset = self._scan(self._cursors.get(addr, HEADER.size), addr)
+        if offset is None and self._loop:
+            offset = self._scan(HEADER.size, addr, op, cmd)
+        if offset is None:
+            raise TraceError('end of trace for address {:#04x}'.format(addr))
+
+        _, rec_op, _, rec_cmd, length = RECORD.unpack_from(self._mmap, offset)
+        start = offset + RECORD.size
+        if self._strict and (rec_op & ~OP_ERROR != op or rec_cmd != cmd):
+            raise TraceMismatch('expected op {:#04x} cmd {:#04x} at address '
+                    '{:#04x}, got op {:#04x} cmd {:#04x}'.format(op, cmd, addr,
+                        rec_op, rec_cmd))
+
+        self._cursors[addr] = start + length
+        self.replayed += 1
+        if rec_op & OP_ERROR:
+            err = self._mmap[start]
+            raise OSError(err, os.strerror(err))
+        return start, length
+
+    def _payload(self, op, addr, cmd):
+        start, length = self._next(op, addr, cmd)
+        return self._mmap[start:start + length]
+
+    def write_quick(self, addr):
+        self._next(OP_WRITE_QUICK, addr, 0)
+
+    def read_byte(self, addr):
+        start, _ = self._next(OP_READ_BYTE, addr, 0)
+        return self._mmap[start]
+
+    def write_byte(self, addr, val):
+        self._next(OP_WRITE_BYTE, addr, val)
+
+    def read_byte_data(self, addr, cmd):
+        start, _ = self._next(OP_READ_BYTE_DATA, addr, cmd)
+        return self._mmap[start]
+
+    def write_byte_data(self, addr, cmd, val):
+        self._next(OP_WRITE_BYTE_DATA, addr, cmd)
+
+    def read_word_data(self, addr, cmd):
+        start, _ = self._next(OP_READ_WORD_DATA, addr, cmd)
+        return struct.unpack_from('<H', self._mmap, start)[0]
+
+    def write_word_data(self, addr, cmd, val):
+        self._next(OP_WRITE_WORD_DATA, addr, cmd)
+
+    def read_i2c_block_data(self, addr, cmd, nbytes):
+        return list(self._payload(OP_READ_BLOCK_DATA, addr, cmd)[:nbytes])
+
+    def read_i2c_block_data_into(self, addr, cmd, buf):
+        start, length = self._next(OP_READ_BLOCK_DATA, addr, cmd)
+        nbytes = min(length, len(buf))
+        memoryview(buf)[:nbytes] = self._mmap[start:start + nbytes]
+        return nbytes
+
+    def write_i2c_block_data(self, addr, cmd, vals):
+        self._next(OP_WRITE_BLOCK_DATA, addr, cmd)
+
+    def read_bytes_into(self, addr, buf):
+        start, length = self._next(OP_READ, addr, 0)
+        nbytes = min(length, len(buf))
+        memoryview(buf)[:nbytes] = self._mmap[start:start + nbytes]
+        return nbytes
+
+    def read_registers(self, addr, regs):
+        return [self.read_i2c_block_data(addr, cmd, nbytes) for cmd, nbytes in regs]
@@ -3,49 +3,89 @@
 __author__ = 'Alexander Rüedlinger'
 __all__ = ()
 
-from .sensors import amx
-from .sensors import bhx
-from .sensors import bmex
-from .sensors import bmpx
-from .sensors import hdcx
-from .sensors import lmx
-from .sensors import mcpx
-from .sensors import mplx
-from .sensors import shtx
-from .sensors import six
-from ..core.i2c import SMBus
+import importlib
 
+# Drivers are given as module path and class name and imported on first use.
+# Further drivers can be registered by other packages through entry points
+# of the group senlib.drivers, e.g. in their setup.py:
+#
+#   entry_points={'senlib.drivers': ['xyz123 = xyzpkg.driver:XYZ123']}
 _SENSORS = {
-        'am2315': amx.AM2315,
-        'am2321': amx.AM2321,
-        'bh1750': bhx.BH1750,
-        'bme280': bmex.BME280,
-        'bmp085': bmpx.BMP085,
-        'bmp180': bmpx.BMP180,
-        'bmp280': bmpx.BMP280,
-        'hdc1008': hdcx.HDC1008,
-        'lm75': lmx.LM75,
-        'mcp9808': mcpx.MCP9808,
-        'mpl115a2': mplx.MPL115A2,
-        'mpl3115a2': mplx.MPL3115A2,
-        'sht31': shtx.SHT31,
-        'si7021': six.SI7021
+        'am2315': 'senlib.i2c.sensors.amx:AM2315',
+        'am2321': 'senlib.i2c.sensors.amx:AM2321',
+        'bh1750': 'senlib.i2c.sensors.bhx:BH1750',
+        'bme280': 'senlib.i2c.sensors.bmex:BME280',
+        'bmp085': 'senlib.i2c.sensors.bmpx:BMP085',
+        'bmp180': 'senlib.i2c.sensors.bmpx:BMP180',
+        'bmp280': 'senlib.i2c.sensors.bmpx:BMP280',
+        'hdc1008': 'senlib.i2c.sensors.hdcx:HDC1008',
+        'lm75': 'senlib.i2c.sensors.lmx:LM75',
+        'mcp9808': 'senlib.i2c.sensors.mcpx:MCP9808',
+        'mpl115a2': 'senlib.i2c.sensors.mplx:MPL115A2',
+        'mpl3115a2': 'senlib.i2c.sensors.mplx:MPL3115A2',
+        'sht31': 'senlib.i2c.sensors.shtx:SHT31',
+        'si7021': 'senlib.i2c.sensors.six:SI7021'
 }
 
+ENTRY_POINT_GROUP = 'senlib.drivers'
+
+_drivers = {}
+_plugins = None
+
+
 class DriverNotFound(Exception):
     pass
 
 
+def _entry_points():
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        try:
+            import pkg_resources
+        except ImportError:
+            return []
+        return list(pkg_resources.iter_entry_points(ENTRY_POINT_GROUP))
+
+    eps = entry_points()
+    if hasattr(eps, 'select'):
+        return list(eps.select(group=ENTRY_POINT_GROUP))
+    return list(eps.get(ENTRY_POINT_GROUP, []))
+
+
+def _plugin_drivers():
+    """ Returns the entry points of third-party drivers, looked up once. """
+    global _plugins
+    if _plugins is None:
+        _plugins = {ep.name.lower(): ep for ep in _entry_points()
+                if ep.name.lower() not in _SENSORS}
+    return _plugins
+
+
+def driver_names():
+    """ Returns the names of all built-in and registered drivers. """
+    return sorted(set(_SENSORS) | set(_plugin_drivers()))
+
+
 def get_sensor_driver(name):
-    if name.lower() in _SENSORS:
-        driver_class = _SENSORS[name]
-        return driver_class
+    name = name.lower()
+    if name in _drivers:
+        return _drivers[name]
+
+    if name in _SENSORS:
+        module_name, class_name = _SENSORS[name].split(':')
+        driver_class = getattr(importlib.import_module(module_name), class_name)
+    elif name in _plugin_drivers():
+        driver_class = _plugin_drivers()[name].load()
     else:
        raise DriverNotFound("Driver {} not found!".format(name))
 
+    _drivers[name] = driver_class
+    return driver_class
+
 def get_sensor(name, bus, addr):
+    from ..core.scheduler import default_scheduler
     driver_class = get_sensor_driver(name)
-    i2c_ctrl = SMBus(bus or 1)
+    i2c_ctrl = default_scheduler().bus(bus or 1)
     sensor = driver_class(i2c_ctrl, addr or driver_class.DEFAULT_ADDR)
     return sensor
-
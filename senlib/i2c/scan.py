@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+__author__ = 'Alexander Rüedlinger'
+__all__ = ('scan', 'scan_bus', 'identify', 'detect')
+
+from . import driver_names, get_sensor_driver
+from ..core import cache
+from ..core.scheduler import default_scheduler
+import logging
+logger = logging.getLogger('scan')
+
+SCAN_RANGE = range(0x03, 0x78)
+CACHE_FILE = 'scan.json'
+
+# EEPROMs could be written to by a quick write, i2cdetect reads a byte at
+# these addresses instead
+READ_RANGES = (range(0x30, 0x38), range(0x50, 0x60))
+
+
+def _candidates():
+    """ Returns a dict which maps each address to a list of (name, driver) tuples. """
+    candidates = {}
+    for name in driver_names():
+        driver_class = get_sensor_driver(name)
+        for addr in driver_class.addresses():
+            candidates.setdefault(addr, []).append((name, driver_class))
+    return candidates
+
+
+def _probe(driver_class, bus, addr):
+    try:
+        return driver_class.probe(bus, addr)
+    except OSError:
+        return False
+
+
+def _present(bus, addr):
+    """ Checks if a device acknowledges its address like i2cdetect does. """
+    try:
+        if any(addr in addresses for addresses in READ_RANGES):
+            bus.read_byte(addr)
+        else:
+            bus.write_quick(addr)
+    except OSError:
+        return False
+    return True
+
+
+def identify(bus, addr, candidates, present=True):
+    """
+    Returns the name of the driver for the device at the given address or
+    None. Drivers which identify the device by an ID take precedence over
+    drivers which cannot identify it, e.g. at 0x40 an HDC1008 is recognised
+    by its device ID, otherwise the device is taken for an SI7021. If the
+    device did not acknowledge, only an identified driver is returned.
+    """
+    unverified = []
+    for name, driver_class in candidates:
+        result = _probe(driver_class, bus, addr)
+        if result:
+            return name
+        if result is None:
+            unverified.append(name)
+    if present and unverified:
+        return unverified[0]
+    return None
+
+
+def scan_bus(bus, addresses=SCAN_RANGE):
+    """
+    Scans the addresses of a bus object and returns a dict which maps each
+    responding address to a driver name or None for unknown devices.
+    Sleeping devices such as the AM2315 do not acknowledge, hence the known
+    addresses are probed in any case.
+    """
+    candidates = _candidates()
+    devices = {}
+    for addr in addresses:
+        present = _present(bus, addr)
+        if not present and addr not in candidates:
+            continue
+
+        name = identify(bus, addr, candidates.get(addr, ()), present)
+        if present or name:
+            logger.debug('found %s at %s/%#04x', name, bus.name, addr)
+            devices[addr] = name
+    return devices
+
+
+def _run_all(scheduler, fn, args):
+    """
+    Runs fn(bus_object, arg) on the worker thread of each bus given by the
+    dict args, which maps the bus numbers to the arguments, and returns the
+    results by bus number. The buses are only referenced while the work runs,
+    hence the workers and handles of buses without other users are released
+    afterwards.
+    """
+    scheduled = {bus: scheduler.bus(bus) for bus in args}
+    try:
+        futures = {bus: scheduled[bus].submit(fn, arg) for bus, arg in args.items()}
+        return {bus: future.result() for bus, future in futures.items()}
+    finally:
+        for i2c_ctrl in scheduled.values():
+            i2c_ctrl.close()
+
+
+def scan(buses=(1,), scheduler=None, addresses=SCAN_RANGE):
+    """
+    Scans several buses concurrently, each on the worker thread of its bus.
+    Returns a dict which maps each bus number to the result of scan_bus().
+    """
+    scheduler = scheduler or default_scheduler()
+    return _run_all(scheduler, scan_bus, {bus: addresses for bus in buses})
+
+
+def _verify(bus, addr, name):
+    try:
+        result = get_sensor_driver(name).probe(bus, addr)
+    except OSError:
+        return False
+    if result is None:
+        result = _present(bus, addr)
+    return result
+
+
+def _verify_all(bus, devices):
+    # nothing to verify of an empty result, hence the bus is scanned again
+    return bool(devices) and all(_verify(bus, addr, name) for addr, name in devices)
+
+
+def detect(buses=(1,), scheduler=None, refresh=False):
+    """
+    Returns a list of (name, bus, addr) tuples of the sensors found on the
+    given buses. The result of a scan is cached on disk unless no sensors
+    were found. A cached result is only verified by probing the cached 
+    sensors, a full scan is done if the verification fails or if refresh is
+    set.
+    """
+    scheduler = scheduler or default_scheduler()
+    cached = {} if refresh else cache.load(CACHE_FILE, {})
+    found = {}
+    rescan = []
+    for bus in buses:
+        devices = cached.get(str(bus))
+        if devices is None:
+            rescan.append(bus)
+        else:
+            found[bus] = [(int(addr, 16), name) for addr, name in sorted(devices.items())]
+
+    verified = _run_all(scheduler, _verify_all, found)
+    rescan += [bus for bus, result in verified.items() if not result]
+
+    if rescan:
+        for bus, devices in scan(rescan, scheduler).items():
+            found[bus] = [(addr, name) for addr, name in sorted(devices.items()) if name]
+            if found[bus]:
+                cached[str(bus)] = {'{:#04x}'.format(addr): name for addr, name in found[bus]}
+            else:
+                cached.pop(str(bus), None)
+        cache.store(CACHE_FILE, cached)
+
+    return [(name, bus, addr) for bus in buses for addr, name in found[bus]]
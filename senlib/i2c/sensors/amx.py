@@ -48,6 +48,20 @@ class AM2315(I2CSensor):
     def default_addr(cls):
         return cls.DEFAULT_ADDR
 
+    @classmethod
+    def probe(cls, bus, addr):
+        # the sensor sleeps, the first write wakes it up but fails
+        try:
+            bus.write_byte(addr, 0x00)
+        except OSError:
+            pass
+        bus.write_i2c_block_data(addr, cls.FC_READ_REG, [0x00, 0x04])
+        time.sleep(0.0015)
+        vals = bus.read_i2c_block_data(addr, cls.FC_READ_REG, 8)
+        crc_code = (vals[7] << 8) | vals[6]
+        return vals[0] == cls.FC_READ_REG and vals[1] == 4 and \
+                cls._compute_crc16(vals, 6) == crc_code
+
     def _read_data(self):
         _time = time.time()
         if self.MIN_SAMPLING_PERIOD > _time - self._time:
@@ -79,7 +93,8 @@ class AM2315(I2CSensor):
         except OSError as e:
             logger.debug('AM2315 is probably not awake, OSError: %s', e)
 
-    def _compute_crc16(self, data, length):
+    @staticmethod
+    def _compute_crc16(data, length):
         crc = 0xffff
         for i in range(length):
             crc ^=  data[i]
@@ -3,9 +3,9 @@
 __author__ = 'Alexander Rüedlinger'
 __all__ = ('BH1750FVI')
 
-import time
 from senlib import logger
 import struct
+import time
 from senlib.core.i2c import Sensor as I2CSensor
 
 
@@ -26,6 +26,8 @@ class BH1750(I2CSensor):
     CMD_PWR_DOWN = 0x00
     CMD_PWR_ON = 0x01
     CMD_RST = 0x07
+    CMD_MTREG_HIGH = 0x40 # bits 7-5 of MTreg
+    CMD_MTREG_LOW = 0x60 # bits 4-0 of MTreg
 
     CMD_HRES_MEAS_C = 0x10
     CMD_HRES2_MEAS_C = 0x11
@@ -46,7 +48,28 @@ class BH1750(I2CSensor):
     MODE_HRES_C = 3
     MODE_HRES2_C = 4
     MODE_LRES_C = 5
+
+    # the measurement time register scales the sensitivity and the time
+    MTREG_MIN = 31
+    MTREG_DEFAULT = 69
+    MTREG_MAX = 254
+
+    # the adaptive settings by light level: (minimal illuminance, mode, MTreg),
+    # from slow and precise in the dark to fast in bright light
+    ADAPTIVE_LEVELS = (
+        (0.0, MODE_HRES2, MTREG_MAX), # 0.11 lx resolution
+        (10.0, MODE_HRES, MTREG_DEFAULT), # 1 lx resolution
+        (1000.0, MODE_LRES, MTREG_DEFAULT), # 4 lx resolution
+        (40000.0, MODE_LRES, MTREG_MIN) # up to 120000 lx
+    )
+    # a level is left for the one below under this fraction of its illuminance
+    ADAPTIVE_HYSTERESIS = 0.8
     
+    _DATA = struct.Struct('>H')
+
+    _CONTINUOUS_MODES = {MODE_HRES: MODE_HRES_C, MODE_HRES2: MODE_HRES2_C, 
+            MODE_LRES: MODE_LRES_C}
+
     _MODES = {
             MODE_HRES: [CMD_HRES_MEAS, MAX_TIME_HRES],
             MODE_HRES2: [CMD_HRES2_MEAS, MAX_TIME_HRES2],
@@ -60,9 +83,15 @@ class BH1750(I2CSensor):
         super(BH1750, self).__init__(bus, addr)
         logger.debug('create %s(addr=%#04x) object', self.__class__.__name__, addr)
         self._illuminance = 0.0
+        self._buf = bytearray(self._DATA.size)
         self._power_on()
         self._mode = None
         self._mode_data = None
+        self._mtreg = self.MTREG_DEFAULT
+        self._adaptive = False
+        self._level = 1
+        self._continuous = False
+        self._ready_at = None
         self._set_mode(self.MODE_HRES)
         self._reset()
 
@@ -74,13 +103,72 @@ class BH1750(I2CSensor):
     def default_addr(cls):
         return cls.DEFAULT_ADDR
 
+    @classmethod
+    def addresses(cls):
+        return (cls.ADDR_L, cls.ADDR_H)
+
+    def configure(self, mode=None, mtreg=None, adaptive=None):
+        """
+        Configures the measurement mode, one of the MODE_* constants, and the
+        measurement time register MTreg. In the continuous modes the chip is
+        started once and each measurement reads the latest result as soon as
+        a new conversion is done. If adaptive is set, the resolution and
+        MTreg follow the light level according to ADAPTIVE_LEVELS, the mode
+        only selects between one-time and continuous measurements. Arguments
+        which are None are left unchanged.
+        """
+        if mode is not None and mode not in self._MODES:
+            raise ValueError('invalid mode: {}'.format(mode))
+        if mtreg is not None and not self.MTREG_MIN <= mtreg <= self.MTREG_MAX:
+            raise ValueError('invalid MTreg: {}'.format(mtreg))
+        mode = self._mode if mode is None else mode
+        if adaptive is not None:
+            self._adaptive = adaptive
+        if self._adaptive:
+            _, level_mode, mtreg = self.ADAPTIVE_LEVELS[self._level]
+            continuous = mode in self._CONTINUOUS_MODES.values()
+            mode = self._CONTINUOUS_MODES[level_mode] if continuous else level_mode
+        self._set_mode(mode)
+        if mtreg is not None:
+            self._set_mtreg(mtreg)
+
+    def measurement_time(self):
+        """ Returns the maximal conversion time in seconds of the current settings. """
+        _, _time = self._mode_data
+        return _time * self._mtreg / self.MTREG_DEFAULT
+
     def _set_mode(self, mode):
         self._mode = mode if mode in self._MODES else self.MODE_HRES
         self._mode_data = self._MODES[self._mode]
+        self._continuous = self._mode in self._CONTINUOUS_MODES.values()
+        # a continuous measurement is (re)started by the next measurement
+        self._ready_at = None
         cmd, _time = self._mode_data
         logger.debug('set mode to %s, measurement cmd: %#04x, max measurement time: %ss', 
                 self._mode, cmd, _time)
 
+    def _set_mtreg(self, mtreg):
+        logger.debug('set MTreg to %s', mtreg)
+        self._bus.write_byte(self.addr, self.CMD_MTREG_HIGH | (mtreg >> 5))
+        self._bus.write_byte(self.addr, self.CMD_MTREG_LOW | (mtreg & 0x1F))
+        self._mtreg = mtreg
+        self._ready_at = None
+
+    def _adapt(self):
+        levels = self.ADAPTIVE_LEVELS
+        level = self._level
+        while level + 1 < len(levels) and self._illuminance >= levels[level + 1][0]:
+            level += 1
+        while level > 0 and self._illuminance < levels[level][0] * self.ADAPTIVE_HYSTERESIS:
+            level -= 1
+        if level != self._level:
+            self._level = level
+            logger.debug('adapt settings to level %s', level)
+            _, mode, mtreg = levels[level]
+            self._set_mode(self._CONTINUOUS_MODES[mode] if self._continuous else mode)
+            if mtreg != self._mtreg:
+                self._set_mtreg(mtreg)
+
     def _power_down(self):
         logger.debug('set state to power down')
         self._bus.write_byte(self.addr, self.CMD_PWR_DOWN)
@@ -96,18 +184,42 @@ class BH1750(I2CSensor):
     def _trigger_measurement(self):
         logger.debug('trigger measurement')
         cmd, _ = self._mode_data
-        self._bus.write_byte(self.addr, self.CMD_HRES_MEAS) 
+        self._bus.write_byte(self.addr, cmd)
  
-    def _read_illuminance_data(self):
-        self._trigger_measurement()
-        _, _time = self._mode_data
-        wait_s = 2 * _time
-        logger.debug('wait %ss before reading measurement data', wait_s)
-        time.sleep(wait_s)
+    def _fetch_illuminance_data(self):
         logger.debug('read measurement data')
-        msb, lsb = self._bus.read_i2c_block_data(self.addr, 0x00, 2)
-        i_word = (msb << 8) | lsb
-        self._illuminance = i_word / 1.2
+        self._bus.read_bytes_into(self.addr, self._buf)
+        i_word, = self._DATA.unpack_from(self._buf)
+        illuminance = i_word / 1.2 * self.MTREG_DEFAULT / self._mtreg
+        if self._mode in (self.MODE_HRES2, self.MODE_HRES2_C):
+            illuminance /= 2
+        self._illuminance = illuminance
+        return self._illuminance
+
+    def _measure_steps(self):
+        wait_s = self.measurement_time()
+        if not self._continuous:
+            self._trigger_measurement()
+            logger.debug('wait %ss before reading measurement data', wait_s)
+            yield wait_s
+        else:
+            if self._ready_at is None:
+                self._trigger_measurement()
+                self._ready_at = time.monotonic() + wait_s
+            # the chip converts continuously, wait for the next result only
+            delay = self._ready_at - time.monotonic()
+            if delay > 0:
+                yield delay
+            self._ready_at = max(self._ready_at + wait_s, time.monotonic())
+        self._fetch_illuminance_data()
+        if self._adaptive:
+            self._adapt()
+        return {
+            'illuminance': self._illuminance
+        }
+
+    def _read_illuminance_data(self):
+        self.trigger().wait()
         return self._illuminance
 
     def read_illuminance(self):
@@ -115,10 +227,7 @@ class BH1750(I2CSensor):
        return self._illuminance
 
     def measure(self):
-        self._read_illuminance_data()
-        return {
-            'illuminance': self._illuminance
-        }
+        return self.trigger().wait()
 
     def illuminance(self):
         return self._illuminance
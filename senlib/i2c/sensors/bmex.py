@@ -6,6 +6,7 @@ __all__ = ('BME280')
 from senlib import logger
 import struct
 from senlib.core.i2c import Sensor as I2CSensor
+from senlib.i2c.sensors import bosch
 
 
 class BME280(I2CSensor):
@@ -25,17 +26,50 @@ class BME280(I2CSensor):
 
     DRIVER_NAME = 'bme280'
 
-    ADDR = 0x77
+    ADDR1 = 0x76
+    ADDR2 = 0x77
+    ADDR = ADDR2
     DEFAULT_ADDR = ADDR
 
     REG_TEMP = 0xFA
     REG_PRESS = 0xF7
     REG_HUM = 0xFD
+    REG_DATA = REG_PRESS # 0xF7 to 0xFE: pressure, temperature, humidity
+
+    REG_ID = 0xD0
+    CHIP_ID = 0x60
 
     REG_CONFIG = 0xF5
     REG_CTRL_MEAS = 0xF4
     REG_CTRL_HUM = 0xF2
 
+    MODE_SLEEP = 0
+    MODE_FORCED = 1
+    MODE_NORMAL = 3
+
+    OSRS_SKIP = 0
+    OSRS_X1 = 1
+    OSRS_X2 = 2
+    OSRS_X4 = 3
+    OSRS_X8 = 4
+    OSRS_X16 = 5
+    OVERSAMPLING = (0, 1, 2, 4, 8, 16)
+
+    FILTER_OFF = 0
+    FILTER_2 = 1
+    FILTER_4 = 2
+    FILTER_8 = 3
+    FILTER_16 = 4
+
+    STANDBY_0_5_MS = 0
+    STANDBY_62_5_MS = 1
+    STANDBY_125_MS = 2
+    STANDBY_250_MS = 3
+    STANDBY_500_MS = 4
+    STANDBY_1000_MS = 5
+    STANDBY_10_MS = 6
+    STANDBY_20_MS = 7
+
     MAX_TEMPERATURE = 85
     MIN_TEMPERATURE = -40
     MAX_PRESSURE = 110000.0
@@ -43,6 +77,17 @@ class BME280(I2CSensor):
     MAX_HUMIDITY = 100.0
     MIN_HUMIDITY = 0.0
 
+    COMPENSATION_FLOAT = 'float'
+    COMPENSATION_INTEGER = 'integer'
+
+    RAW_FIELDS = ('adc_t', 'adc_p', 'adc_h')
+
+    _compensation = COMPENSATION_FLOAT
+
+    _CALIB_88 = struct.Struct('<HhhHhhhhhhhhBB')
+    _CALIB_E1 = struct.Struct('<hBbBbb')
+    _DATA_SIZE = 8
+
     def __init__(self, bus, addr=DEFAULT_ADDR):
         super(BME280, self).__init__(bus, addr)
         logger.debug('create BME280(addr=%s) object', addr)
@@ -54,14 +99,16 @@ class BME280(I2CSensor):
         self.t_fine = 0.0
         self._temperature = self._humidity = self._pressure = 0.0
         self._calibration_data = {}
-        self._read_calibration_data()
+        self._load_calibration_data()
 
-        self.osrs_h = 1
-        self.osrs_t = 1
-        self.osrs_p = 1
-        self.power_mode = 3
-        self.filter = 0
-        self.t_sb = 5
+        self.osrs_h = self.OSRS_X1
+        self.osrs_t = self.OSRS_X1
+        self.osrs_p = self.OSRS_X1
+        self.power_mode = self.MODE_NORMAL
+        self.filter = self.FILTER_OFF
+        self.t_sb = self.STANDBY_1000_MS
+        self._measurement_time = self.measurement_time()
+        self._data_buf = bytearray(self._DATA_SIZE)
 
         self._set_meas_and_hum()
         self._set_config()
@@ -70,6 +117,22 @@ class BME280(I2CSensor):
     def calibration_data(self):
         return self._calibration_data
 
+    @property
+    def compensation(self):
+        """
+        The compensation formulas in use: COMPENSATION_FLOAT for the double
+        precision formulas or COMPENSATION_INTEGER for the 32/64-bit integer
+        formulas of the datasheet, which give the same results on every
+        platform. The batch compensation always uses the float formulas.
+        """
+        return self._compensation
+
+    @compensation.setter
+    def compensation(self, compensation):
+        if compensation not in (self.COMPENSATION_FLOAT, self.COMPENSATION_INTEGER):
+            raise ValueError('invalid compensation: {}'.format(compensation))
+        self._compensation = compensation
+
     @classmethod
     def driver_name(cls):
         return cls.DRIVER_NAME
@@ -78,12 +141,23 @@ class BME280(I2CSensor):
     def default_addr(cls):
         return cls.DEFAULT_ADDR
 
-    def _set_meas(self):
+    @classmethod
+    def addresses(cls):
+        return (cls.ADDR1, cls.ADDR2)
+
+    @classmethod
+    def probe(cls, bus, addr):
+        return bus.read_byte_data(addr, cls.REG_ID) == cls.CHIP_ID
+
+    def _read_chip_id(self):
+        return self._bus.read_byte_data(self.addr, self.REG_ID)
+
+    def _set_meas(self, power_mode=None):
         logger.debug('configure temperature and pressure osrs')
         settings = 0
         settings |= (self.osrs_t << 5)
         settings |= (self.osrs_p << 2)
-        settings |= self.power_mode
+        settings |= self.power_mode if power_mode is None else power_mode
         self._bus.write_byte_data(self.addr, self.REG_CTRL_MEAS, settings)
 
     def _set_hum(self):
@@ -96,6 +170,55 @@ class BME280(I2CSensor):
         self._set_hum()
         self._set_meas()
 
+    def configure(self, osrs_t=None, osrs_p=None, osrs_h=None, filter=None,
+            power_mode=None, t_sb=None):
+        """
+        Changes the oversampling of the temperature, pressure and humidity
+        (OSRS_*), the IIR filter coefficient (FILTER_*), the power mode
+        (MODE_*) and the standby time of the normal mode (STANDBY_*). 
+        Settings which are None are left unchanged.
+
+        In forced mode the sensor sleeps between the measurements, each
+        measurement starts a single conversion and waits for
+        measurement_time().
+        """
+        settings = {'osrs_t': (osrs_t, 5), 'osrs_p': (osrs_p, 5),
+                'osrs_h': (osrs_h, 5), 'filter': (filter, 4), 't_sb': (t_sb, 7)}
+        for name, (value, maximum) in settings.items():
+            if value is not None and not 0 <= value <= maximum:
+                raise ValueError('invalid {} setting: {}'.format(name, value))
+            if value is not None:
+                setattr(self, name, value)
+        if power_mode is not None:
+            if power_mode not in (self.MODE_SLEEP, self.MODE_FORCED, self.MODE_NORMAL):
+                raise ValueError('invalid power mode: {}'.format(power_mode))
+            self.power_mode = power_mode
+        self._measurement_time = self.measurement_time()
+
+        # the config register is only written reliably in sleep mode and
+        # ctrl_hum takes effect with the next write of ctrl_meas
+        self._set_meas(self.MODE_SLEEP)
+        self._set_config()
+        self._set_hum()
+        if self.power_mode == self.MODE_NORMAL:
+            self._set_meas()
+        else:
+            self._set_meas(self.MODE_SLEEP)
+
+    def measurement_time(self):
+        """
+        Returns the maximum time in seconds of a measurement with the current
+        oversampling settings, see section 9.1 of the datasheet.
+        """
+        t = 1.25
+        if self.osrs_t:
+            t += 2.3 * self.OVERSAMPLING[self.osrs_t]
+        if self.osrs_p:
+            t += 2.3 * self.OVERSAMPLING[self.osrs_p] + 0.575
+        if self.osrs_h:
+            t += 2.3 * self.OVERSAMPLING[self.osrs_h] + 0.575
+        return t / 1000.0
+
     def _set_config(self):
         logger.debug('configure sensor')
         config = 0
@@ -105,19 +228,18 @@ class BME280(I2CSensor):
 
     def _read_calibration_data(self):
         logger.debug('read calibration data')
-        dig_88_A1 = self._bus.read_i2c_block_data(self.addr, 0x88, 26)
-        dig_88_A1 = struct.unpack('<HhhHhhhhhhhhBB', bytearray(dig_88_A1))
+        buf = bytearray(self._CALIB_88.size)
+        self._bus.read_i2c_block_data_into(self.addr, 0x88, buf)
         (self.dig_T1, self.dig_T2, self.dig_T3, self.dig_P1, self.dig_P2, 
                 self.dig_P3, self.dig_P4, self.dig_P5, self.dig_P6, self.dig_P7, 
-                self.dig_P8, self.dig_P9, _, self.dig_H1) = dig_88_A1
+                self.dig_P8, self.dig_P9, _, self.dig_H1) = self._CALIB_88.unpack_from(buf)
 
-        dig_e1_e7 = self._bus.read_i2c_block_data(self.addr, 0xE1, 7)
-        self.dig_H2, self.dig_H3 = struct.unpack('<hB', bytearray(dig_e1_e7[:3]))
-        e4_sign = struct.unpack('<b', bytes([dig_e1_e7[3]]))[0]
-        self.dig_H4 = (e4_sign << 4) | (dig_e1_e7[4] & 0xF)
-        e6_sign = struct.unpack('<b', bytes([dig_e1_e7[5]]))[0]
-        self.dig_H5 = (e6_sign << 4) | (dig_e1_e7[4] >> 4)
-        self.dig_H6 = struct.unpack('<b', bytes([dig_e1_e7[6]]))[0]
+        buf = bytearray(self._CALIB_E1.size)
+        self._bus.read_i2c_block_data_into(self.addr, 0xE1, buf)
+        (self.dig_H2, self.dig_H3, e4_sign, e5, e6_sign, 
+                self.dig_H6) = self._CALIB_E1.unpack_from(buf)
+        self.dig_H4 = (e4_sign << 4) | (e5 & 0xF)
+        self.dig_H5 = (e6_sign << 4) | (e5 >> 4)
 
         keys = ['T1', 'T2', 'T3', 'P1', 'P2', 'P3', 'P4', 'P5', 'P6', 'P7', 'P8', 
                 'P9', 'H1', 'H2', 'H3', 'H4', 'H5', 'H6']
@@ -130,12 +252,11 @@ class BME280(I2CSensor):
             logger.debug('%s=%s', key, val) 
  
     def _read_raw_sensor_data(self):
-        logger.debug('read pressure data')
-        press_msb, press_lsb, press_xlsb = self._bus.read_i2c_block_data(self.addr, self.REG_PRESS, 3)
-        logger.debug('read temperature data')
-        temp_msb, temp_lsb, temp_xlsb = self._bus.read_i2c_block_data(self.addr, self.REG_TEMP, 3)
-        logger.debug('read humidity data')
-        hum_msb, hum_lsb = self._bus.read_i2c_block_data(self.addr, self.REG_HUM, 2)
+        logger.debug('read pressure, temperature and humidity data')
+        # the data registers are contiguous, hence one burst read fetches all
+        self._bus.read_i2c_block_data_into(self.addr, self.REG_DATA, self._data_buf)
+        (press_msb, press_lsb, press_xlsb, temp_msb, temp_lsb, temp_xlsb, 
+                hum_msb, hum_lsb) = self._data_buf
 
         adc_p = (press_msb << 12) | (press_lsb << 4) | (press_xlsb >> 4)
         adc_t = (temp_msb << 12) | (temp_lsb << 4) | (temp_xlsb >> 4)
@@ -143,6 +264,21 @@ class BME280(I2CSensor):
         return adc_p, adc_t, adc_h
 
     def _compensate_temperature(self, adc_t):
+        if self._compensation == self.COMPENSATION_INTEGER:
+            return self._compensate_temperature_int(adc_t)
+        return self._compensate_temperature_float(adc_t)
+
+    def _compensate_pressure(self, adc_p):
+        if self._compensation == self.COMPENSATION_INTEGER:
+            return self._compensate_pressure_int(adc_p)
+        return self._compensate_pressure_float(adc_p)
+
+    def _compensate_humidity(self, adc_h):
+        if self._compensation == self.COMPENSATION_INTEGER:
+            return self._compensate_humidity_int(adc_h)
+        return self._compensate_humidity_float(adc_h)
+
+    def _compensate_temperature_float(self, adc_t):
         UT = float(adc_t)
         var1 = (UT / 16384.0 - self.dig_T1 / 1024.0) * float(self.dig_T2)
         var2 = ((UT / 131072.0 - self.dig_T1 / 8192.0) * (
@@ -157,7 +293,7 @@ class BME280(I2CSensor):
         else:
             return temperature
 
-    def _compensate_pressure(self, adc_p):
+    def _compensate_pressure_float(self, adc_p):
         var1 = self.t_fine / 2.0 - 64000.0
         var2 = var1 * var1 * self.dig_P6 / 32768.0
         var2 = var2 + var1 * self.dig_P5 * 2.0
@@ -179,7 +315,7 @@ class BME280(I2CSensor):
         else:
             return pressure
 
-    def _compensate_humidity(self, adc_h):
+    def _compensate_humidity_float(self, adc_h):
         h = self.t_fine - 76800.0
         h = (adc_h - (self.dig_H4 * 64.0 + self.dig_H5 / 16384.0 * h)) * (
         self.dig_H2 / 65536.0 * (1.0 + self.dig_H6 / 67108864.0 * h * (
@@ -192,22 +328,133 @@ class BME280(I2CSensor):
             return self.MIN_HUMIDITY
         return humidity
 
-    def read_temperature(self):
+    def _compensate_temperature_int(self, adc_t):
+        var1 = (((adc_t >> 3) - (self.dig_T1 << 1)) * self.dig_T2) >> 11
+        var2 = (((((adc_t >> 4) - self.dig_T1) * ((adc_t >> 4) - self.dig_T1)) >> 12) *
+                self.dig_T3) >> 14
+        self.t_fine = var1 + var2
+        temperature = ((self.t_fine * 5 + 128) >> 8) / 100.0
+
+        if temperature < self.MIN_TEMPERATURE:
+            return self.MIN_TEMPERATURE
+        elif temperature > self.MAX_TEMPERATURE:
+            return self.MAX_TEMPERATURE
+        else:
+            return temperature
+
+    def _compensate_pressure_int(self, adc_p):
+        var1 = self.t_fine - 128000
+        var2 = var1 * var1 * self.dig_P6
+        var2 = var2 + ((var1 * self.dig_P5) << 17)
+        var2 = var2 + (self.dig_P4 << 35)
+        var1 = ((var1 * var1 * self.dig_P3) >> 8) + ((var1 * self.dig_P2) << 12)
+        var1 = (((1 << 47) + var1) * self.dig_P1) >> 33
+        if var1 == 0:
+            return 0
+        p = 1048576 - adc_p
+        p = bosch.div_trunc(((p << 31) - var2) * 3125, var1)
+        var1 = (self.dig_P9 * (p >> 13) * (p >> 13)) >> 25
+        var2 = (self.dig_P8 * p) >> 19
+        p = ((p + var1 + var2) >> 8) + (self.dig_P7 << 4)
+        pressure = p / 256.0
+
+        if pressure < self.MIN_PRESSURE:
+            return self.MIN_PRESSURE
+        elif pressure > self.MAX_PRESSURE:
+            return self.MAX_PRESSURE
+        else:
+            return pressure
+
+    def _compensate_humidity_int(self, adc_h):
+        h = self.t_fine - 76800
+        h = (((((adc_h << 14) - (self.dig_H4 << 20) - (self.dig_H5 * h)) + 16384) >> 15) *
+                (((((((h * self.dig_H6) >> 10) * (((h * self.dig_H3) >> 11) + 32768)) >> 10) +
+                2097152) * self.dig_H2 + 8192) >> 14))
+        h = h - (((((h >> 15) * (h >> 15)) >> 7) * self.dig_H1) >> 4)
+        h = min(max(h, 0), 419430400)
+        humidity = (h >> 12) / 1024.0
+
+        if humidity > self.MAX_HUMIDITY:
+            return self.MAX_HUMIDITY
+        elif humidity < self.MIN_HUMIDITY:
+            return self.MIN_HUMIDITY
+        return humidity
+
+    @classmethod
+    def compensate(cls, calibration_data, adc_t, adc_p, adc_h):
+        """
+        Compensates sequences of raw temperature, pressure and humidity values
+        in one go. Returns a dict with NumPy arrays of the compensated values,
+        which are bit-identical to those of measure(). Without NumPy the values
+        are compensated one by one and lists are returned.
+        """
+        if not bosch.have_numpy():
+            sensor = cls.from_calibration_data(calibration_data)
+            data = {'temperature': [], 'pressure': [], 'humidity': []}
+            for t, p, h in zip(adc_t, adc_p, adc_h):
+                data['temperature'].append(sensor._compensate_temperature(t))
+                data['pressure'].append(sensor._compensate_pressure(p))
+                data['humidity'].append(sensor._compensate_humidity(h))
+            return data
+
+        temperature, t_fine = bosch.compensate_temperature(calibration_data, adc_t,
+                (cls.MIN_TEMPERATURE, cls.MAX_TEMPERATURE))
+        return {
+            'temperature': temperature,
+            'pressure': bosch.compensate_pressure(calibration_data, adc_p, t_fine,
+                (cls.MIN_PRESSURE, cls.MAX_PRESSURE)),
+            'humidity': bosch.compensate_humidity(calibration_data, adc_h, t_fine,
+                (cls.MIN_HUMIDITY, cls.MAX_HUMIDITY))
+        }
+
+    @classmethod
+    def compensate_raw(cls, calibration_data, samples):
+        adc_t, adc_p, adc_h = list(zip(*samples)) or ((), (), ())
+        return cls.compensate(calibration_data, adc_t, adc_p, adc_h)
+
+    def _compensate_raw(self, adc_t, adc_p, adc_h):
+        temperature = self._compensate_temperature(adc_t)
+        return {
+            'temperature': temperature,
+            'humidity': self._compensate_humidity(adc_h),
+            'pressure': self._compensate_pressure(adc_p)
+        }
+
+    def _measure_raw_steps(self):
+        if self.power_mode == self.MODE_FORCED:
+            logger.debug('trigger forced measurement')
+            self._set_meas()
+            yield self._measurement_time
+        else:
+            yield 0.0
         adc_p, adc_t, adc_h = self._read_raw_sensor_data()
+        return adc_t, adc_p, adc_h
+
+    def _measure_steps(self):
+        adc_t, adc_p, adc_h = yield from self._measure_raw_steps()
+        return self._compensate_measurement(adc_t, adc_p, adc_h)
+
+    def read_temperature(self):
+        adc_t, adc_p, adc_h = self.measure_raw().values
         return self._compensate_temperature(adc_t)
 
     def read_pressure(self):
-        adc_p, adc_t, adc_h = self._read_raw_sensor_data()
+        adc_t, adc_p, adc_h = self.measure_raw().values
         self._compensate_temperature(adc_t)
         return self._compensate_pressure(adc_p)
 
     def read_humidity(self):
-        adc_p, adc_t, adc_h = self._read_raw_sensor_data()
+        adc_t, adc_p, adc_h = self.measure_raw().values
         self._compensate_temperature(adc_t)
         return self._compensate_humidity(adc_h)
 
     def measure(self):
+        if self.power_mode == self.MODE_FORCED:
+            return self.trigger().wait()
         adc_p, adc_t, adc_h = self._read_raw_sensor_data()
+        return self._compensate_measurement(adc_t, adc_p, adc_h)
+
+    def _compensate_measurement(self, adc_t, adc_p, adc_h):
         self._temperature = self._compensate_temperature(adc_t)
         self._pressure = self._compensate_pressure(adc_p)
         self._humidity = self._compensate_humidity(adc_h)
@@ -4,9 +4,9 @@ __author__ = 'Alexander Rüedlinger'
 __all__ = ('BMP085', 'BMP180', 'BMP280')
 
 from senlib import logger
-import time
 import struct
 from senlib.core.i2c import Sensor as I2CSensor
+from senlib.i2c.sensors import bosch
 
 
 class BMP085(I2CSensor):
@@ -36,6 +36,15 @@ class BMP085(I2CSensor):
     CTRL_READ_TEMP = 0x2E
     CTRL_READ_PRESS = 0x34
 
+    # maximum conversion times of the datasheet
+    TEMPERATURE_CONVERSION_TIME = 0.0045
+    PRESSURE_CONVERSION_TIMES = {
+        MODE_LOW: 0.0045,
+        MODE_STANDARD: 0.0075,
+        MODE_HIGH: 0.0135,
+        MODE_ULTRA_HIGH: 0.0255
+    }
+
     REG_OUT_XLSB = 0xF8  # adc out: bits 7-3
     REG_OUT_LSB = 0xF7  # adc out: bits 7-0
     REG_OUT_MSB = 0xF6  # adc out: bits 7-0
@@ -43,6 +52,16 @@ class BMP085(I2CSensor):
     REG_CTRL_MEAS = 0xF4
     REG_SOF = 0xE0  # reset
     REG_ID = 0xD0
+    CHIP_ID = 0x55
+
+    RAW_FIELDS = ('adc_t', 'adc_p', 'mode')
+
+    _CALIBRATION = struct.Struct('>hhhHHHhhhhh')
+
+    # raw temperature and B5 of the last compensation
+    _adc_t = _b5 = None
+    _ADC_T = struct.Struct('>H')
+    _ADC_P = struct.Struct('>HB')
 
     def __init__(self, bus, addr=DEFAULT_ADDR):
         super(BMP085, self).__init__(bus, addr)
@@ -55,8 +74,14 @@ class BMP085(I2CSensor):
         self.id = self._read_id()
 
         self._temperature = self._pressure = 0
+        self._ut = None
+        self._temperature_interval = 1
+        self._temperature_drift = None
+        self._temperature_age = 1
+        self._adc_t_buf = bytearray(self._ADC_T.size)
+        self._adc_p_buf = bytearray(self._ADC_P.size)
         self._calibration_data = {}
-        self._read_calibration_data()
+        self._load_calibration_data()
 
     @property
     def calibration_data(self):
@@ -70,32 +95,68 @@ class BMP085(I2CSensor):
     def default_addr(cls):
         return cls.DEFAULT_ADDR
 
+    @classmethod
+    def probe(cls, bus, addr):
+        return bus.read_byte_data(addr, cls.REG_ID) == cls.CHIP_ID
+
+    def configure(self, mode=None, temperature_interval=None, temperature_drift=None):
+        """
+        Configures the sampling. mode is the oversampling setting of the
+        pressure, MODE_LOW to MODE_ULTRA_HIGH. The temperature is converted
+        before every temperature_interval-th pressure conversion only, the
+        other samples reuse the last temperature. If the temperature changed
+        by more than temperature_drift °C, it is converted again with the
+        next sample. Arguments which are None are left unchanged.
+        """
+        if mode is not None:
+            if mode not in self.PRESSURE_CONVERSION_TIMES:
+                raise ValueError('invalid mode: {}'.format(mode))
+            self.mode = mode
+        if temperature_interval is not None:
+            if temperature_interval < 1:
+                raise ValueError('invalid temperature interval: {}'.format(
+                    temperature_interval))
+            self._temperature_interval = temperature_interval
+        if temperature_drift is not None:
+            self._temperature_drift = temperature_drift
+        self._temperature_age = self._temperature_interval
+
+    def measurement_time(self):
+        """ Returns the time in seconds of a sample which converts the temperature. """
+        return self.TEMPERATURE_CONVERSION_TIME + self.PRESSURE_CONVERSION_TIMES[self.mode]
+
     def _read_id(self):
         logger.debug('read device id')
         return self._bus.read_byte_data(self.addr, self.REG_ID)
 
+    def _read_chip_id(self):
+        return self.id
+
+    def _compute_b5(self, UT):
+        # B5 depends on the raw temperature only, it is cached for the
+        # pressure samples which reuse the temperature
+        if UT != self._adc_t:
+            X1 = ((UT - self.dig_AC6) * self.dig_AC5) >> 15
+            X2 = (self.dig_MC << 11) // (X1 + self.dig_MD)
+            self._adc_t, self._b5 = UT, X1 + X2
+        return self._b5
+
     def _compensate_temperature(self, UT):
-        X1 = ((UT - self.dig_AC6) * self.dig_AC5) >> 15
-        X2 = (self.dig_MC << 11) // (X1 + self.dig_MD)
-        B5 = X1 + X2
+        B5 = self._compute_b5(UT)
         temp = ((B5 + 8) >> 4) / 10.0
         return temp
 
-    def _compensate_pressure(self, UT, UP):
-        X1 = ((UT - self.dig_AC6) * self.dig_AC5) >> 15
-        X2 = (self.dig_MC << 11) // (X1 + self.dig_MD)
-        B5 = X1 + X2
-
-        B6 = B5 - 4000
+    def _compensate_pressure(self, UT, UP, mode):
+        B6 = self._compute_b5(UT) - 4000
         X1 = (self.dig_B2 * (B6 * B6) >> 12) >> 11
         X2 = (self.dig_AC2 * B6) >> 11
         X3 = X1 + X2
-        B3 = (((self.dig_AC1 * 4 + X3) << self.mode) + 2) // 4
+        B3 = (((self.dig_AC1 * 4 + X3) << mode) + 2) // 4
         X1 = (self.dig_AC3 * B6) >> 13
         X2 = (self.dig_B1 * ((B6 * B6) >> 12)) >> 16
         X3 = ((X1 + X2) + 2) >> 2
         B4 = (self.dig_AC4 * (X3 + 32768)) >> 15
-        B7 = (UP - B3) * (50000 >> self.mode)
+        B7 = (UP - B3) * (50000 >> mode)
 
         if B7 < 0x80000000:
             p = (B7 * 2) // B4
@@ -117,38 +178,69 @@ class BMP085(I2CSensor):
         return pressure
 
     def _read_sensor_data(self):
-        adc_t, adc_p = self._read_raw_temperature(), self._read_raw_pressure()
-        return self._compensate_temperature(adc_t), self._compensate_pressure(adc_t, adc_p)
+        data = self.trigger().wait()
+        return data['temperature'], data['pressure']
+
+    def _trigger_temperature(self):
+        logger.debug('trigger temperature measurement')
+        self._bus.write_byte_data(self.addr, self.REG_CTRL_MEAS, self.CTRL_READ_TEMP)
+
+    def _trigger_pressure(self):
+        logger.debug('trigger pressure measurement')
+        self._bus.write_byte_data(self.addr, self.REG_CTRL_MEAS, self.CTRL_READ_PRESS + (self.mode << 6))
 
     def _read_raw_temperature(self):
         logger.debug('read temperature data')
-        self._bus.write_byte_data(self.addr, self.REG_CTRL_MEAS, self.CTRL_READ_TEMP)
-        time.sleep(0.005)
-        msb, lsb = self._bus.read_i2c_block_data(self.addr, self.REG_OUT_MSB, 2)
-        adc_t = (msb << 8) | lsb
+        self._bus.read_i2c_block_data_into(self.addr, self.REG_OUT_MSB, self._adc_t_buf)
+        adc_t, = self._ADC_T.unpack_from(self._adc_t_buf)
         return adc_t
 
     def _read_raw_pressure(self):
         logger.debug('read pressure data')
-        self._bus.write_byte_data(self.addr, self.REG_CTRL_MEAS, self.CTRL_READ_PRESS + (self.mode << 6))
+        self._bus.read_i2c_block_data_into(self.addr, self.REG_OUT_MSB, self._adc_p_buf)
+        msb_lsb, xlsb = self._ADC_P.unpack_from(self._adc_p_buf)
+        adc_p = ((msb_lsb << 8) + xlsb) >> (8 - self.mode)
+        return adc_p
 
-        if self.mode == self.MODE_LOW:
-            time.sleep(0.005)
-        elif self.mode == self.MODE_HIGH:
-            time.sleep(0.014)
-        elif self.mode == self.MODE_ULTRA_HIGH:
-            time.sleep(0.026)
-        else:
-            time.sleep(0.008)
+    def _store_temperature(self, UT):
+        # stores the raw value of a temperature conversion and schedules the
+        # next one, which is due with the next sample if the temperature drifts
+        drifted = self._temperature_drift is not None and self._ut is not None and \
+                abs(self._compensate_temperature(self._ut) -
+                    self._compensate_temperature(UT)) > self._temperature_drift
+        self._ut = UT
+        self._temperature_age = self._temperature_interval - 1 if drifted else 0
+
+    def _measure_raw_steps(self):
+        if self._temperature_age >= self._temperature_interval:
+            self._trigger_temperature()
+            yield self.TEMPERATURE_CONVERSION_TIME
+            self._store_temperature(self._read_raw_temperature())
+
+        self._trigger_pressure()
+        yield self.PRESSURE_CONVERSION_TIMES[self.mode]
+        adc_p = self._read_raw_pressure()
+        self._temperature_age += 1
+        return self._ut, adc_p, self.mode
+
+    def _compensate_raw(self, adc_t, adc_p, mode):
+        # the mode of the sample, which may differ from the configured one
+        return {
+            'temperature': self._compensate_temperature(adc_t),
+            'pressure': self._compensate_pressure(adc_t, adc_p, mode)
+        }
 
-        msb, lsb, xlsb = self._bus.read_i2c_block_data(self.addr, self.REG_OUT_MSB, 3)
-        adc_p = ((msb << 16) + (lsb << 8) + xlsb) >> (8 - self.mode)
-        return adc_p
+    def _measure_steps(self):
+        raw = yield from self._measure_raw_steps()
+        data = self._compensate_raw(*raw)
+        self._temperature, self._pressure = data['temperature'], data['pressure']
+        return data
 
     def _read_calibration_data(self):
         logger.debug('read calibration data')
-        dig_AC1_MD = self._bus.read_i2c_block_data(self.addr, self.REG_AC1, 22)
-        dig_AC1_MD = struct.unpack('>hhhHHHhhhhh',  bytearray(dig_AC1_MD))
+        buf = bytearray(self._CALIBRATION.size)
+        self._bus.read_i2c_block_data_into(self.addr, self.REG_AC1, buf)
+        dig_AC1_MD = self._CALIBRATION.unpack_from(buf)
         (self.dig_AC1, self.dig_AC2, self.dig_AC3, self.dig_AC4, self.dig_AC5, 
                 self.dig_AC6, self.dig_B1, self.dig_B2, self.dig_MB, self.dig_MC, 
                 self.dig_MD) = dig_AC1_MD
@@ -160,12 +252,7 @@ class BMP085(I2CSensor):
             logger.debug('%s=%s', key, val) 
 
     def measure(self):
-        self._temperature, self._pressure = self._read_sensor_data()
-
-        return {
-            'temperature': self._temperature,
-            'pressure': self._pressure
-        }
+        return self.trigger().wait()
 
     def temperature(self):
         return self._temperature
@@ -199,6 +286,17 @@ class BMP280(I2CSensor):
 
     REG_CONFIG = 0xF5
     REG_CTRL_MEAS = 0xF4
+    REG_ID = 0xD0
+    CHIP_ID = 0x58
+
+    COMPENSATION_FLOAT = 'float'
+    COMPENSATION_INTEGER = 'integer'
+
+    RAW_FIELDS = ('adc_t', 'adc_p')
+
+    _compensation = COMPENSATION_FLOAT
+
+    _CALIB_88 = struct.Struct('<HhhHhhhhhhhhBB')
 
     def __init__(self, bus, addr=DEFAULT_ADDR):
         super(BMP280, self).__init__(bus, addr)
@@ -210,7 +308,7 @@ class BMP280(I2CSensor):
         self.t_fine = 0.0
         self._temperature = self._humidity = self._pressure = 0.0
         self._calibration_data = {}
-        self._read_calibration_data()
+        self._load_calibration_data()
 
         self.osrs_h = 1
         self.osrs_t = 1
@@ -226,6 +324,22 @@ class BMP280(I2CSensor):
     def calibration_data(self):
         return self._calibration_data
 
+    @property
+    def compensation(self):
+        """
+        The compensation formulas in use: COMPENSATION_FLOAT for the double
+        precision formulas or COMPENSATION_INTEGER for the 32/64-bit integer
+        formulas of the datasheet, which give the same results on every
+        platform. The batch compensation always uses the float formulas.
+        """
+        return self._compensation
+
+    @compensation.setter
+    def compensation(self, compensation):
+        if compensation not in (self.COMPENSATION_FLOAT, self.COMPENSATION_INTEGER):
+            raise ValueError('invalid compensation: {}'.format(compensation))
+        self._compensation = compensation
+
     @classmethod
     def driver_name(cls):
         return cls.DRIVER_NAME
@@ -234,6 +348,17 @@ class BMP280(I2CSensor):
     def default_addr(cls):
         return cls.DEFAULT_ADDR
 
+    @classmethod
+    def addresses(cls):
+        return (cls.ADDR1, cls.ADDR2)
+
+    @classmethod
+    def probe(cls, bus, addr):
+        return bus.read_byte_data(addr, cls.REG_ID) == cls.CHIP_ID
+
+    def _read_chip_id(self):
+        return self._bus.read_byte_data(self.addr, self.REG_ID)
+
     def _set_meas(self):
         logger.debug('configure temperature and pressure osrs')
         settings = 0
@@ -254,24 +379,29 @@ class BMP280(I2CSensor):
 
     def _read_calibration_data(self):
         logger.debug('read calibration data')
-        dig_88_A1 = self._bus.read_i2c_block_data(self.addr, 0x88, 26)
-        dig_88_A1 = struct.unpack('<HhhHhhhhhhhhBB', bytearray(dig_88_A1))
+        buf = bytearray(self._CALIB_88.size)
+        self._bus.read_i2c_block_data_into(self.addr, 0x88, buf)
+        dig_88_A1 = self._CALIB_88.unpack_from(buf)
         (self.dig_T1, self.dig_T2, self.dig_T3, self.dig_P1, self.dig_P2, 
                 self.dig_P3, self.dig_P4, self.dig_P5, self.dig_P6, self.dig_P7, 
                 self.dig_P8, self.dig_P9, _, self.dig_H1) = dig_88_A1
 
         keys = ['T1', 'T2', 'T3', 'P1', 'P2', 'P3', 'P4', 'P5', 'P6', 'P7',
-                'P8', 'P7', 'H1']
-        self._calibration_data = dict(zip(keys, dig_88_A1))
+                'P8', 'P9', 'H1']
+        values = [self.dig_T1, self.dig_T2, self.dig_T3, self.dig_P1, self.dig_P2, 
+                self.dig_P3, self.dig_P4, self.dig_P5, self.dig_P6, self.dig_P7, 
+                self.dig_P8, self.dig_P9, self.dig_H1]
+        self._calibration_data = dict(zip(keys, values))
         for key, val in self._calibration_data.items():
             logger.debug('%s=%s', key, val) 
 
 
     def _read_raw_sensor_data(self):
-        logger.debug('read pressure data')
-        press_msb, press_lsb, press_xlsb = self._bus.read_i2c_block_data(self.addr, self.REG_PRESS, 3)
-        logger.debug('read temperature data')
-        temp_msb, temp_lsb, temp_xlsb = self._bus.read_i2c_block_data(self.addr, self.REG_TEMP, 3)
+        logger.debug('read pressure and temperature data')
+        press_data, temp_data = self._bus.read_registers(self.addr, 
+                [(self.REG_PRESS, 3), (self.REG_TEMP, 3)])
+        press_msb, press_lsb, press_xlsb = press_data
+        temp_msb, temp_lsb, temp_xlsb = temp_data
 
         adc_p = (press_msb << 12) | (press_lsb << 4) | (press_xlsb >> 4)
         adc_t = (temp_msb << 12) | (temp_lsb << 4) | (temp_xlsb >> 4)
@@ -279,6 +409,16 @@ class BMP280(I2CSensor):
         return adc_p, adc_t
 
     def _compensate_temperature(self, adc_t):
+        if self._compensation == self.COMPENSATION_INTEGER:
+            return self._compensate_temperature_int(adc_t)
+        return self._compensate_temperature_float(adc_t)
+
+    def _compensate_pressure(self, adc_p):
+        if self._compensation == self.COMPENSATION_INTEGER:
+            return self._compensate_pressure_int(adc_p)
+        return self._compensate_pressure_float(adc_p)
+
+    def _compensate_temperature_float(self, adc_t):
         UT = float(adc_t)
         var1 = (UT / 16384.0 - self.dig_T1 / 1024.0) * float(self.dig_T2)
         var2 = ((UT / 131072.0 - self.dig_T1 / 8192.0) * (
@@ -287,7 +427,7 @@ class BMP280(I2CSensor):
         temp = (var1 + var2) / 5120.0
         return temp
 
-    def _compensate_pressure(self, adc_p):
+    def _compensate_pressure_float(self, adc_p):
         var1 = self.t_fine / 2.0 - 64000.0
         var2 = var1 * var1 * self.dig_P6 / 32768.0
         var2 = var2 + var1 * self.dig_P5 * 2.0
@@ -304,6 +444,70 @@ class BMP280(I2CSensor):
         p = p + (var1 + var2 + self.dig_P7) / 16.0
         return p
 
+    def _compensate_temperature_int(self, adc_t):
+        var1 = (((adc_t >> 3) - (self.dig_T1 << 1)) * self.dig_T2) >> 11
+        var2 = (((((adc_t >> 4) - self.dig_T1) * ((adc_t >> 4) - self.dig_T1)) >> 12) *
+                self.dig_T3) >> 14
+        self.t_fine = var1 + var2
+        temperature = ((self.t_fine * 5 + 128) >> 8) / 100.0
+        return temperature
+
+    def _compensate_pressure_int(self, adc_p):
+        var1 = self.t_fine - 128000
+        var2 = var1 * var1 * self.dig_P6
+        var2 = var2 + ((var1 * self.dig_P5) << 17)
+        var2 = var2 + (self.dig_P4 << 35)
+        var1 = ((var1 * var1 * self.dig_P3) >> 8) + ((var1 * self.dig_P2) << 12)
+        var1 = (((1 << 47) + var1) * self.dig_P1) >> 33
+        if var1 == 0:
+            return 0
+        p = 1048576 - adc_p
+        p = bosch.div_trunc(((p << 31) - var2) * 3125, var1)
+        var1 = (self.dig_P9 * (p >> 13) * (p >> 13)) >> 25
+        var2 = (self.dig_P8 * p) >> 19
+        p = ((p + var1 + var2) >> 8) + (self.dig_P7 << 4)
+        pressure = p / 256.0
+        return pressure
+
+    @classmethod
+    def compensate(cls, calibration_data, adc_t, adc_p):
+        """
+        Compensates sequences of raw temperature and pressure values in one
+        go. Returns a dict with NumPy arrays of the compensated values, which
+        are bit-identical to those of measure(). Without NumPy the values are
+        compensated one by one and lists are returned.
+        """
+        if not bosch.have_numpy():
+            sensor = cls.from_calibration_data(calibration_data)
+            data = {'temperature': [], 'pressure': []}
+            for t, p in zip(adc_t, adc_p):
+                data['temperature'].append(sensor._compensate_temperature(t))
+                data['pressure'].append(sensor._compensate_pressure(p))
+            return data
+
+        temperature, t_fine = bosch.compensate_temperature(calibration_data, adc_t)
+        return {
+            'temperature': temperature,
+            'pressure': bosch.compensate_pressure(calibration_data, adc_p, t_fine)
+        }
+
+    @classmethod
+    def compensate_raw(cls, calibration_data, samples):
+        adc_t, adc_p = list(zip(*samples)) or ((), ())
+        return cls.compensate(calibration_data, adc_t, adc_p)
+
+    def _compensate_raw(self, adc_t, adc_p):
+        temperature = self._compensate_temperature(adc_t)
+        return {
+            'temperature': temperature,
+            'pressure': self._compensate_pressure(adc_p)
+        }
+
+    def _measure_raw_steps(self):
+        yield 0.0
+        adc_p, adc_t = self._read_raw_sensor_data()
+        return adc_t, adc_p
+
     def read_temperature(self):
         adc_p, adc_t = self._read_raw_sensor_data()
         return self._compensate_temperature(adc_t)
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorized compensation functions of the Bosch BMP280 and BME280 sensors.
+
+The functions take arrays of raw ADC values and the calibration data of a
+sensor as returned by its calibration_data property. The computations are
+the same floating point operations in the same order as in the scalar
+methods of the drivers, hence the results are bit-identical.
+
+NumPy is an optional dependency (pip install senlib[numpy]) and imported on
+first use.
+
+div_trunc() is the integer division of C as used by the fixed-point
+compensation formulas of the datasheets.
+"""
+
+__author__ = 'Alexander Rüedlinger'
+__all__ = ('have_numpy', 'div_trunc', 'compensate_temperature', 
+        'compensate_pressure', 'compensate_humidity')
+
+_np = None
+
+
+def _numpy():
+    global _np
+    if _np is None:
+        import numpy
+        _np = numpy
+    return _np
+
+
+def div_trunc(a, b):
+    """ Divides two integers and rounds toward zero like C. """
+    q = abs(a) // abs(b)
+    return q if (a < 0) == (b < 0) else -q
+
+
+def have_numpy():
+    """ Returns True if NumPy can be imported. """
+    try:
+        _numpy()
+    except ImportError:
+        return False
+    return True
+
+
+def _clip(values, limits):
+    if limits is None:
+        return values
+    return _numpy().clip(values, *limits)
+
+
+def compensate_temperature(calib, adc_t, limits=None):
+    """
+    Returns the arrays of the temperatures and of t_fine. The temperatures
+    are clipped to limits, a (min, max) tuple, if given.
+    """
+    np = _numpy()
+    dig_T1, dig_T2, dig_T3 = calib['T1'], calib['T2'], calib['T3']
+    UT = np.asarray(adc_t, dtype=np.float64)
+    var1 = (UT / 16384.0 - dig_T1 / 1024.0) * float(dig_T2)
+    var2 = ((UT / 131072.0 - dig_T1 / 8192.0) * (
+    UT / 131072.0 - dig_T1 / 8192.0)) * float(dig_T3)
+    t_fine = np.trunc(var1 + var2)
+    temperature = (var1 + var2) / 5120.0
+    return _clip(temperature, limits), t_fine
+
+
+def compensate_pressure(calib, adc_p, t_fine, limits=None):
+    """
+    Returns the array of the pressures, clipped to limits if given. The
+    pressure is zero where the compensation would divide by zero.
+    """
+    np = _numpy()
+    dig_P1, dig_P2, dig_P3, dig_P4, dig_P5, dig_P6, dig_P7, dig_P8, dig_P9 = (
+            calib['P1'], calib['P2'], calib['P3'], calib['P4'], calib['P5'],
+            calib['P6'], calib['P7'], calib['P8'], calib['P9'])
+    adc_p = np.asarray(adc_p, dtype=np.float64)
+    var1 = t_fine / 2.0 - 64000.0
+    var2 = var1 * var1 * dig_P6 / 32768.0
+    var2 = var2 + var1 * dig_P5 * 2.0
+    var2 = var2 / 4.0 + dig_P4 * 65536.0
+    var1 = (dig_P3 * var1 * var1 / 524288.0 + dig_P2 * var1) / 524288.0
+    var1 = (1.0 + var1 / 32768.0) * dig_P1
+    zero = var1 == 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = 1048576.0 - adc_p
+        p = ((p - var2 / 4096.0) * 6250.0) / var1
+        var1 = dig_P9 * p * p / 2147483648.0
+        var2 = p * dig_P8 / 32768.0
+        p = p + (var1 + var2 + dig_P7) / 16.0
+    return np.where(zero, 0.0, _clip(p, limits))
+
+
+def compensate_humidity(calib, adc_h, t_fine, limits=None):
+    """ Returns the array of the relative humidities, clipped to limits if given. """
+    np = _numpy()
+    dig_H1, dig_H2, dig_H3, dig_H4, dig_H5, dig_H6 = (calib['H1'], calib['H2'],
+            calib['H3'], calib['H4'], calib['H5'], calib['H6'])
+    adc_h = np.asarray(adc_h, dtype=np.float64)
+    h = t_fine - 76800.0
+    h = (adc_h - (dig_H4 * 64.0 + dig_H5 / 16384.0 * h)) * (
+    dig_H2 / 65536.0 * (1.0 + dig_H6 / 67108864.0 * h * (
+    1.0 + dig_H3 / 67108864.0 * h)))
+    return _clip(h * (1.0 - dig_H1 * h / 524288.0), limits)
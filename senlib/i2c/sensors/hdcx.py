@@ -5,6 +5,7 @@ __all__ = ('HDC1008')
 
 from senlib import logger
 import time
+import struct
 from senlib.core.i2c import Sensor as I2CSensor
 
 
@@ -25,26 +26,43 @@ class HDC1008(I2CSensor):
     REG_ID_MSB = 0xFB
     REG_ID_CSB = 0xFC
     REG_ID_LSB = 0xFD
+    REG_MANUFACTURER_ID = 0xFE
+    REG_DEVICE_ID = 0xFF
+    MANUFACTURER_ID = 0x5449
+    DEVICE_ID = 0x1000
 
     RST = 0
-    HEAT = 1
+    HEAT = 0 # heater disabled
     MODE = 1 # humidity and temperature
     BTST = 0
     TRES = 0 # 14 bit resolution
     HRES = 0 # 14 bit resolution
 
+    TRES_14 = 0
+    TRES_11 = 1
+    HRES_14 = 0
+    HRES_11 = 1
+    HRES_8 = 2
+
+    # typical conversion times of the datasheet by resolution
+    TEMPERATURE_CONVERSION_TIMES = {TRES_14: 0.00635, TRES_11: 0.00365}
+    HUMIDITY_CONVERSION_TIMES = {HRES_14: 0.0065, HRES_11: 0.00385, HRES_8: 0.0025}
+    # the sensor does not acknowledge reads until the conversion is done, it
+    # is polled in this interval after the typical conversion time
+    POLL_INTERVAL = 0.001
+
+    _DATA = struct.Struct('>HH')
+
     def __init__(self, bus, addr=DEFAULT_ADDR):
         super(HDC1008, self).__init__(bus, addr)
         logger.debug('create HDC1008(addr=%s) object', addr)
         self._temperature = self._humidity = 0.0
-        settings = 0
-        settings |= (self.RST << 15)
-        settings |= (self.HEAT << 13)
-        settings |= (self.MODE << 12)
-        settings |= (self.BTST << 11)
-        settings |= (self.TRES << 10)
-        settings |= (self.HRES << 8)
-        self._bus.write_word_data(self.addr, self.REG_CONFIG, settings)
+        self._tres = self.TRES
+        self._hres = self.HRES
+        self._buf = bytearray(self._DATA.size)
+        self._deadline = 0.0
+        self._write_config()
+        self._measurement_time = self.measurement_time()
 
     @classmethod
     def driver_name(cls):
@@ -54,46 +72,88 @@ class HDC1008(I2CSensor):
     def default_addr(cls):
         return cls.DEFAULT_ADDR
 
-    def _trigger_temperature_measurement(self):
-        logger.debug('trigger temperature measurement')
+    @classmethod
+    def probe(cls, bus, addr):
+        msb, lsb = bus.read_i2c_block_data(addr, cls.REG_DEVICE_ID, 2)
+        return (msb << 8) | lsb == cls.DEVICE_ID
+
+    def configure(self, tres=None, hres=None):
+        """
+        Configures the resolution of the temperature, TRES_14 or TRES_11,
+        and of the humidity, HRES_14, HRES_11 or HRES_8. Lower resolutions
+        convert faster. Arguments which are None are left unchanged.
+        """
+        if tres is not None:
+            if tres not in self.TEMPERATURE_CONVERSION_TIMES:
+                raise ValueError('invalid temperature resolution: {}'.format(tres))
+            self._tres = tres
+        if hres is not None:
+            if hres not in self.HUMIDITY_CONVERSION_TIMES:
+                raise ValueError('invalid humidity resolution: {}'.format(hres))
+            self._hres = hres
+        self._write_config()
+        self._measurement_time = self.measurement_time()
+
+    def measurement_time(self):
+        """ Returns the typical time in seconds of a temperature and humidity conversion. """
+        return self.TEMPERATURE_CONVERSION_TIMES[self._tres] + \
+                self.HUMIDITY_CONVERSION_TIMES[self._hres]
+
+    def _write_config(self):
+        settings = 0
+        settings |= (self.RST << 15)
+        settings |= (self.HEAT << 13)
+        settings |= (self.MODE << 12)
+        settings |= (self.BTST << 11)
+        settings |= (self._tres << 10)
+        settings |= (self._hres << 8)
+        logger.debug('write configuration %#06x', settings)
+        # the configuration register is written MSB first
+        self._bus.write_i2c_block_data(self.addr, self.REG_CONFIG,
+                [settings >> 8, settings & 0xFF])
+
+    def _trigger_measurement(self):
+        # in the sequential mode the humidity is converted after the temperature
+        logger.debug('trigger temperature and humidity measurement')
         self._bus.write_byte(self.addr, self.REG_TMP)
-        time.sleep(0.015)
-
-    def _trigger_humidity_measurement(self):
-        logger.debug('trigger humidity measurement')
-        self._bus.write_byte(self.addr, self.REG_HUM)
-        time.sleep(0.015)
+        # the datasheet gives no maximal conversion times
+        self._deadline = time.monotonic() + self._measurement_time * 2
+
+    def _read_data(self):
+        # returns False while the sensor is converting
+        try:
+            self._bus.read_bytes_into(self.addr, self._buf)
+        except OSError:
+            if time.monotonic() > self._deadline:
+                raise
+            return False
+        logger.debug('read temperature and humidity data')
+        tdata, hdata = self._DATA.unpack_from(self._buf)
+        self._temperature = (tdata / 65536.0) * 165 - 40
+        self._humidity = (hdata / 65536.0) * 100
+        return True
 
     def read_temperature(self):
-        self._trigger_temperature_measurement()
-        logger.debug('read temperature data')
-        msb = self._bus.read_byte(self.addr)
-        lsb = self._bus.read_byte(self.addr)
-        tdata = (msb << 8) | lsb
-        temp = (tdata / 65536.0) * 165 - 40
-        return temp
+        return self.measure()['temperature']
 
     def temperature(self):
         return self._temperature
 
     def read_humidity(self):
-        self._trigger_humidity_measurement()
-        logger.debug('read humidity data')
-        msb = self._bus.read_byte(self.addr)
-        lsb = self._bus.read_byte(self.addr)
-        hdata = (msb << 8) | lsb
-        hum = (hdata / 65536.0) * 100
-        return hum
+        return self.measure()['humidity']
 
     def humidity(self):
         return self._humidity
 
-    def measure(self):
-        self._temperature = self.read_temperature()
-        self._humidity = self.read_humidity()
-
+    def _measure_steps(self):
+        self._trigger_measurement()
+        yield self._measurement_time
+        while not self._read_data():
+            yield self.POLL_INTERVAL
         return {
             'temperature': self._temperature,
             'humidity': self._humidity
         }
 
+    def measure(self):
+        return self.trigger().wait()
@@ -22,7 +22,10 @@ class MCP9808(I2CSensor):
 
     REG_ALERT = 0x04
     REG_TMP = 0x05
+    REG_MANUFACTURER_ID = 0x06
     REG_DEVICE_ID = 0x07
+    MANUFACTURER_ID = 0x0054
+    DEVICE_ID = 0x04
     REG_RES = 0x08
 
     def __init__(self, bus, addr=DEFAULT_ADDR):
@@ -39,6 +42,13 @@ class MCP9808(I2CSensor):
     def default_addr(cls):
         return cls.DEFAULT_ADDR
 
+    @classmethod
+    def probe(cls, bus, addr):
+        msb, lsb = bus.read_i2c_block_data(addr, cls.REG_MANUFACTURER_ID, 2)
+        if (msb << 8) | lsb != cls.MANUFACTURER_ID:
+            return False
+        return bus.read_byte_data(addr, cls.REG_DEVICE_ID) == cls.DEVICE_ID
+
     def _read_device_id(self):
         logger.debug('read device id')
         return self._bus.read_byte_data(self.addr, self.REG_DEVICE_ID)
@@ -3,9 +3,10 @@ __author__ = 'Alexander Rüedlinger'
 __all__ = ('MPL115A2')
 
 from senlib import logger
+import errno
 import time
 import struct
-from senlib.core.i2c import Sensor as I2CSensor
+from senlib.core.i2c import Sensor as I2CSensor, Measurement
 
 
 class MPL115A2(I2CSensor):
@@ -28,12 +29,20 @@ class MPL115A2(I2CSensor):
     REG_B2 = 0x08
     REG_C12 = 0x0A
 
+    CONVERSION_TIME = 0.005
+
+    RAW_FIELDS = ('adc_t', 'adc_p')
+
+    _CALIBRATION = struct.Struct('>hhhh')
+    _ADC = struct.Struct('>H')
+
     def __init__(self, bus, addr=DEFAULT_ADDR):
         super(MPL115A2, self).__init__(bus, addr)
         logger.debug('create MPL115A2(addr=%s) object', addr)
         self.dig_A0 = self.dig_B1 = self.dig_B2 = self.dig_C12 = 0.0
 
         self._pressure = self._temperature = 0.0
+        self._adc_buf = bytearray(self._ADC.size)
         self._calibration_data = {}
         self._read_calibration_data()
 
@@ -52,8 +61,9 @@ class MPL115A2(I2CSensor):
 
     def _read_calibration_data(self):
         logger.debug('read calibration data')
-        calib_data = self._bus.read_i2c_block_data(self.addr, self.REG_A0, 8)
-        self.dig_A0, self.dig_B1, self.dig_B2, self.dig_C12 = struct.unpack('>hhhh', bytearray(calib_data))
+        buf = bytearray(self._CALIBRATION.size)
+        self._bus.read_i2c_block_data_into(self.addr, self.REG_A0, buf)
+        self.dig_A0, self.dig_B1, self.dig_B2, self.dig_C12 = self._CALIBRATION.unpack_from(buf)
         self.dig_A0 /= 8.0
         self.dig_B1 /= 8192.0
         self.dig_B2 /= 16384.0
@@ -64,32 +74,65 @@ class MPL115A2(I2CSensor):
         for key, val in self._calibration_data.items():
             logger.debug('%s=%s', key, val)
 
+    def _read_adc(self, reg):
+        self._bus.read_i2c_block_data_into(self.addr, reg, self._adc_buf)
+        adc, = self._ADC.unpack_from(self._adc_buf)
+        return adc >> 6
+
     def _read_adc_t(self):
-        msb, lsb = self._bus.read_i2c_block_data(self.addr, self.REG_TADC, 2)
-        adc_t = ((msb << 8) | lsb) >> 6
-        return adc_t
+        return self._read_adc(self.REG_TADC)
 
-    def read_pressure(self):
-        logger.debug('read pressure data')
+    def _convert(self):
         self._bus.write_byte_data(self.addr, self.CMD_CONVERT, 0x00)
-        time.sleep(5/1000.0)
 
-        adc_t = self._read_adc_t()
-        msb, lsb = self._bus.read_i2c_block_data(self.addr, self.REG_PADC, 2)
-        adc_p = ((msb << 8) | lsb) >> 6
+    def _compute_pressure(self, adc_t, adc_p):
         p_comp = self.dig_A0 + (self.dig_B1 + self.dig_C12 * adc_t) * adc_p + self.dig_B2 * adc_t
         return ((p_comp / 15.737) + 50.0) * 1000
 
-    def read_temperature(self):
+    def _compute_temperature(self, adc_t):
         # black magic temperature formula: http://forums.adafruit.com/viewtopic.php?f=25&t=34787
         # thx @park
+        return adc_t * -0.1706 + 112.27
+
+    def _read_pressure_data(self):
+        logger.debug('read pressure data')
+        adc_t = self._read_adc_t()
+        adc_p = self._read_adc(self.REG_PADC)
+        return self._compute_pressure(adc_t, adc_p)
+
+    def _read_temperature_data(self):
         logger.debug('read temperature data')
-        self._bus.write_byte_data(self.addr, self.CMD_CONVERT, 0x00)
-        time.sleep(5/1000.0)
+        return self._compute_temperature(self._read_adc_t())
 
+    def read_pressure(self):
+        self._convert()
+        time.sleep(self.CONVERSION_TIME)
+        return self._read_pressure_data()
+
+    def read_temperature(self):
+        self._convert()
+        time.sleep(self.CONVERSION_TIME)
+        return self._read_temperature_data()
+
+    def _measure_raw_steps(self):
+        # pressure and temperature come from a single conversion
+        self._convert()
+        yield self.CONVERSION_TIME
         adc_t = self._read_adc_t()
-        t = adc_t * -0.1706 + 112.27
-        return t
+        adc_p = self._read_adc(self.REG_PADC)
+        return adc_t, adc_p
+
+    def _measure_steps(self):
+        raw = yield from self._measure_raw_steps()
+        data = self._compensate_raw(*raw)
+        self._pressure, self._temperature = data['pressure'], data['temperature']
+        return data
+
+    def _compensate_raw(self, adc_t, adc_p):
+        return {
+            'pressure': self._compute_pressure(adc_t, adc_p),
+            'temperature': self._compute_temperature(adc_t)
+        }
 
     def pressure(self):
         return self._pressure
@@ -98,19 +141,20 @@ class MPL115A2(I2CSensor):
         return self._temperature
 
     def measure(self):
-        self._pressure = self.read_pressure()
-        self._temperature = self.read_temperature()
+        return self.trigger().wait()
+
 
-        return {
-            'pressure': self._pressure,
-            'temperature': self._temperature
-        }
 
 
 class MPL3115A2(I2CSensor):
     """
     This is a driver implementation for the MPL3115A2 sensor
     for use with Raspberry Pi computers.
+
+    In active mode the sensor samples every 2^time_step seconds on its own,
+    in one-shot mode each measurement triggers a conversion. With the FIFO
+    enabled, the sensor buffers up to 32 samples which are drained by
+    read_fifo() or trigger_fifo() in burst reads.
     """
 
     DRIVER_NAME = 'mpl3115a2'
@@ -118,7 +162,17 @@ class MPL3115A2(I2CSensor):
     ADDR = 0x60
     DEFAULT_ADDR = ADDR
 
+    REG_STATUS = 0x00
+    REG_OUT_P = 0x01
+    REG_OUT_T = 0x04
+    REG_WHO_AM_I = 0x0C
+    REG_F_STATUS = 0x0D
+    REG_F_DATA = 0x0E
+    REG_F_SETUP = 0x0F
+    DEVICE_ID = 0xC4
+
     CTRL_REG1 = 0x26
+    CTRL_REG2 = 0x27
     PT_DATA_CFG = 0x13
 
     MODE_BAROMETER = 0
@@ -128,11 +182,37 @@ class MPL3115A2(I2CSensor):
     RST = 0
     OST = 0
     SBYB = 1
+    ST = 0
 
     DREM = 1
     PDEFE = 1
     TDEFE = 1
 
+    # oversampling ratios
+    OS_1 = 0
+    OS_2 = 1
+    OS_4 = 2
+    OS_8 = 3
+    OS_16 = 4
+    OS_32 = 5
+    OS_64 = 6
+    OS_128 = 7
+
+    # minimal time between two samples per oversampling ratio
+    CONVERSION_TIMES = (0.006, 0.010, 0.018, 0.034, 0.066, 0.130, 0.258, 0.512)
+
+    # FIFO modes
+    FIFO_DISABLED = 0
+    FIFO_CIRCULAR = 1 # the oldest samples are overwritten
+    FIFO_FILL = 2 # new samples are dropped once the FIFO is full
+
+    FIFO_SIZE = 32
+    FIFO_SAMPLE_SIZE = 5 # pressure and temperature bytes
+    FIFO_BURST = 6 # samples per block read
+
+    # status polling once a sample is due
+    POLL_INTERVAL = 0.002
+
     def __init__(self, bus, addr=DEFAULT_ADDR):
         super(MPL3115A2, self).__init__(bus, addr)
         logger.debug('create MPL3115A2(addr=%s) object', addr)
@@ -142,13 +222,10 @@ class MPL3115A2(I2CSensor):
         self._rst = self.RST
         self._ost = self.OST
         self._sbyb = self.SBYB
-
-        settings = self._mode << 7
-        settings |= (self._raw << 6)
-        settings |= (self._os << 3)
-        settings |= (self._rst << 2)
-        settings |= (self._ost << 1)
-        settings |= self._sbyb
+        self._st = self.ST
+        self._fifo = self.FIFO_DISABLED
+        self._watermark = 0
+        self._pressure = self._temperature = 0.0
 
         # enable data flags in PT_DATA_CFG
         pt_data_cfg = (self.DREM << 2)
@@ -157,7 +234,8 @@ class MPL3115A2(I2CSensor):
         self._bus.write_byte_data(self.addr, self.PT_DATA_CFG, pt_data_cfg)
 
         # set settings
-        self._bus.write_byte_data(self.addr, self.CTRL_REG1, settings)
+        self._bus.write_byte_data(self.addr, self.CTRL_REG1, self._settings())
+        self._next_at = time.monotonic() + self.CONVERSION_TIMES[self._os]
 
     @classmethod
     def driver_name(cls):
@@ -167,41 +245,127 @@ class MPL3115A2(I2CSensor):
     def default_addr(cls):
         return cls.DEFAULT_ADDR
 
-    def _wait(self):
-        while True: # busy waiting
-            sta = self._bus.read_byte_data(self.addr, 0x00)
-            if sta & 0x08: # check if data is ready
-                break
-            time.sleep(0.3)
-
-    def _read_pressure_data(self, wait=False):
-        logger.debug('read pressure data')
-        if wait:
-            self._wait()
+    @classmethod
+    def probe(cls, bus, addr):
+        return bus.read_byte_data(addr, cls.REG_WHO_AM_I) == cls.DEVICE_ID
 
+    def _settings(self, ost=0):
+        settings = self._mode << 7
+        settings |= (self._raw << 6)
+        settings |= (self._os << 3)
+        settings |= (self._rst << 2)
+        settings |= (ost << 1)
+        settings |= self._sbyb
+        return settings
+
+    def configure(self, oversampling=None, time_step=None, one_shot=None, fifo=None,
+            watermark=None):
+        """
+        Sets the oversampling ratio (OS_*), the time step of 2^time_step 
+        seconds between the samples in active mode, the one-shot mode and the
+        FIFO mode (FIFO_*) with its watermark of 1-31 samples, 0 disables the
+        watermark. The FIFO needs the active mode. Arguments which are None 
+        are left unchanged.
+        """
+        if oversampling is not None and oversampling not in range(8):
+            raise ValueError('invalid oversampling: {}'.format(oversampling))
+        if time_step is not None and time_step not in range(16):
+            raise ValueError('invalid time_step: {}'.format(time_step))
+        if fifo is not None and fifo not in (self.FIFO_DISABLED, self.FIFO_CIRCULAR,
+                self.FIFO_FILL):
+            raise ValueError('invalid fifo: {}'.format(fifo))
+        if watermark is not None and watermark not in range(self.FIFO_SIZE):
+            raise ValueError('invalid watermark: {}'.format(watermark))
+
+        sbyb = self._sbyb if one_shot is None else int(not one_shot)
+        fifo = self._fifo if fifo is None else fifo
+        if fifo and not sbyb:
+            raise ValueError('invalid fifo: {} in one-shot mode'.format(fifo))
+        if oversampling is not None:
+            self._os = oversampling
+        if time_step is not None:
+            self._st = time_step
+        if watermark is not None:
+            self._watermark = watermark
+
+        # the settings can only be changed in standby mode
+        self._sbyb = 0
+        self._bus.write_byte_data(self.addr, self.CTRL_REG1, self._settings())
+        self._bus.write_byte_data(self.addr, self.CTRL_REG2, self._st)
+        if fifo and self._fifo:
+            # the FIFO mode can only be changed via the disabled mode
+            self._bus.write_byte_data(self.addr, self.REG_F_SETUP, 0)
+        self._bus.write_byte_data(self.addr, self.REG_F_SETUP, (fifo << 6) | self._watermark)
+        self._fifo = fifo
+        self._sbyb = sbyb
+        if sbyb:
+            self._bus.write_byte_data(self.addr, self.CTRL_REG1, self._settings())
+        self._next_at = time.monotonic() + self.CONVERSION_TIMES[self._os]
+
+    def measurement_time(self):
+        """ Returns the time in seconds between two samples. """
+        conversion_time = self.CONVERSION_TIMES[self._os]
+        if not self._sbyb:
+            return conversion_time
+        return max(float(1 << self._st), conversion_time)
+
+    def _data_ready(self):
+        sta = self._bus.read_byte_data(self.addr, self.REG_STATUS)
+        return sta & 0x08 # check if data is ready
+
+    def _fifo_count(self):
+        f_status = self._bus.read_byte_data(self.addr, self.REG_F_STATUS)
+        if f_status & 0x80:
+            logger.debug('FIFO overflow')
+        return f_status & 0x3F
+
+    def _decode_pressure(self, data):
         # the pressure value is representated as a Q18.2 fixed point
-        p_msb = self._bus.read_byte_data(self.addr, 0x01)
-        p_csb = self._bus.read_byte_data(self.addr, 0x02)
-        p_lsb = self._bus.read_byte_data(self.addr, 0x03)
+        p_msb, p_csb, p_lsb = data
         p_data = (p_msb << 16 | (p_csb << 8) | p_lsb) >> 4
         return p_data / 4
 
-    def _read_temperature_data(self, wait=False):
-        logger.debug('read temperature data')
-        if wait:
-            self._wait()
-
-        # the temperature value is representated as a Q8.4 fixed point
-        t_msb = self._bus.read_byte_data(self.addr, 0x04)
-        t_lsb = self._bus.read_byte_data(self.addr, 0x05)
+    def _decode_temperature(self, data):
+        # the temperature value is representated as a signed Q8.4 fixed point
+        t_msb, t_lsb = data
         t_data = ((t_msb << 8) | t_lsb) >> 4
+        if t_data & 0x800:
+            t_data -= 0x1000
         return t_data / 16
 
+    def _read_sensor_data(self):
+        logger.debug('read pressure and temperature data')
+        p_data, t_data = self._bus.read_registers(self.addr, 
+                [(self.REG_OUT_P, 3), (self.REG_OUT_T, 2)])
+        return self._decode_pressure(p_data), self._decode_temperature(t_data)
+
+    def _read_fifo_data(self, count):
+        logger.debug('read %s FIFO samples', count)
+        if not count:
+            return []
+        nbytes = count * self.FIFO_SAMPLE_SIZE
+        burst = self.FIFO_BURST * self.FIFO_SAMPLE_SIZE
+        blocks = self._bus.read_registers(self.addr, [(self.REG_F_DATA, 
+            min(burst, nbytes - i)) for i in range(0, nbytes, burst)])
+        data = [val for block in blocks for val in block]
+        self._next_at = time.monotonic() + self.measurement_time()
+
+        samples = []
+        for i in range(0, nbytes, self.FIFO_SAMPLE_SIZE):
+            samples.append({
+                'pressure': self._decode_pressure(data[i:i + 3]),
+                'temperature': self._decode_temperature(data[i + 3:i + 5])
+            })
+        if samples:
+            self._pressure = samples[-1]['pressure']
+            self._temperature = samples[-1]['temperature']
+        return samples
+
     def read_pressure(self):
-        return self._read_pressure_data(True)
+        return self.measure()['pressure']
 
     def read_temperature(self):
-        return self._read_temperature_data(True)
+        return self.measure()['temperature']
 
     def pressure(self):
         return self._pressure
@@ -209,11 +373,72 @@ class MPL3115A2(I2CSensor):
     def temperature(self):
         return self._temperature
 
-    def measure(self):
-        self._pressure = self._read_pressure_data(True)
-        self._temperature = self._read_temperature_data(False)
+    def _fifo_steps(self, count):
+        # waits until the FIFO holds count samples and drains it
+        deadline = None
+        available = self._fifo_count()
+        while available < count:
+            now = time.monotonic()
+            period = self.measurement_time()
+            if deadline is None:
+                deadline = max(now, self._next_at) + (count - available) * period
+            elif now > deadline:
+                raise OSError(errno.ETIMEDOUT, 'MPL3115A2 FIFO not filled')
+            yield max(self._next_at + (count - available - 1) * period - now, 
+                    self.POLL_INTERVAL)
+            available = self._fifo_count()
+        return self._read_fifo_data(available)
+
+    def _measure_steps(self):
+        if self._fifo:
+            samples = yield from self._fifo_steps(1)
+            return samples[-1]
+
+        if not self._sbyb:
+            self._bus.write_byte_data(self.addr, self.CTRL_REG1, self._settings(ost=1))
+            self._next_at = time.monotonic() + self.CONVERSION_TIMES[self._os]
+            yield self.CONVERSION_TIMES[self._os]
+
+        # wait until the next sample is due, then poll the data ready flag
+        now = time.monotonic()
+        if self._next_at > now:
+            yield self._next_at - now
+        deadline = None
+        while not self._data_ready():
+            now = time.monotonic()
+            if deadline is None:
+                deadline = max(now, self._next_at) + self.measurement_time()
+            elif now > deadline:
+                raise OSError(errno.ETIMEDOUT, 'MPL3115A2 data not ready')
+            yield max(self._next_at - now, self.POLL_INTERVAL)
+        self._pressure, self._temperature = self._read_sensor_data()
+        self._next_at = time.monotonic() + self.measurement_time()
 
         return {
             'pressure': self._pressure,
             'temperature': self._temperature
         }
+
+    def measure(self):
+        return self.trigger().wait()
+
+    def trigger_fifo(self, count=None):
+        """
+        Starts waiting for count samples in the FIFO, by default for the 
+        watermark or for a full FIFO. Returns a Measurement object whose
+        result is the list of all samples in the FIFO, oldest first.
+        """
+        if not self._fifo:
+            raise ValueError('invalid fifo: {}'.format(self._fifo))
+        if count is None:
+            count = self._watermark or self.FIFO_SIZE
+        if count not in range(1, self.FIFO_SIZE + 1):
+            raise ValueError('invalid count: {}'.format(count))
+        delays = getattr(self._bus, 'conversion_delays', True)
+        return Measurement(self._fifo_steps(count), delays)
+
+    def read_fifo(self):
+        """ Returns the samples in the FIFO without waiting, oldest first. """
+        if not self._fifo:
+            raise ValueError('invalid fifo: {}'.format(self._fifo))
+        return self._read_fifo_data(self._fifo_count())
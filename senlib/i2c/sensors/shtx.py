@@ -3,12 +3,23 @@
 __author__ = 'Alexander Rüedlinger'
 __all__ = ('SHT31')
 
-import time
 from senlib import logger
+import errno
 import struct
+import time
 from senlib.core.i2c import Sensor as I2CSensor
 
 
+def _crc8_table(poly):
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ poly) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return bytes(table)
+
+
 class SHT31(I2CSensor):
     """
     This is a quick and dirty driver implementation for the sensor STH31 
@@ -31,13 +42,52 @@ class SHT31(I2CSensor):
     REP_LOW = 0x16
     REP_HIGH_S = 0.015
 
+    # maximum single shot conversion times of the datasheet
+    CONVERSION_TIMES = {REP_HIGH: REP_HIGH_S, REP_MEDIUM: 0.006, REP_LOW: 0.004}
+
+    # measurements per second of the periodic data acquisition modes
+    MPS_SINGLE_SHOT = 0
+    MPS_0_5 = 0.5
+    MPS_1 = 1
+    MPS_2 = 2
+    MPS_4 = 4
+    MPS_10 = 10
+    MPS_ART = 4 # the accelerated response time mode samples at 4 Hz
+
     CMD_SOFT_RESET = 0x30, 0xA2
+    CMD_FETCH_DATA = 0xE0, 0x00
+    CMD_BREAK = 0x30, 0x93
+    CMD_ART = 0x2B, 0x32
+
+    # command MSB and the LSBs by repeatability of the periodic modes
+    PERIODIC_COMMANDS = {
+        MPS_0_5: (0x20, {REP_HIGH: 0x32, REP_MEDIUM: 0x24, REP_LOW: 0x2F}),
+        MPS_1: (0x21, {REP_HIGH: 0x30, REP_MEDIUM: 0x26, REP_LOW: 0x2D}),
+        MPS_2: (0x22, {REP_HIGH: 0x36, REP_MEDIUM: 0x20, REP_LOW: 0x2B}),
+        MPS_4: (0x23, {REP_HIGH: 0x34, REP_MEDIUM: 0x22, REP_LOW: 0x29}),
+        MPS_10: (0x27, {REP_HIGH: 0x37, REP_MEDIUM: 0x21, REP_LOW: 0x2A})
+    }
+
+    # additional attempts to read a frame with a CRC error or without data
+    RETRIES = 3
+
+    CRC8_TABLE = _crc8_table(0x31)
+
+    RAW_FIELDS = ('adc_t', 'adc_h')
+
+    _DATA = struct.Struct('>HBHB')
 
     def __init__(self, bus, addr=DEFAULT_ADDR):
         super(SHT31, self).__init__(bus, addr)
         logger.debug('create SHT31(addr=%s) object', addr)
         self._temperature = self._humidity = 0.0
         self._repeatability = self.REP_HIGH
+        self._mps = self.MPS_SINGLE_SHOT
+        self._art = False
+        self._period = None
+        self._ready_at = None
+        self._error = None
+        self._buf = bytearray(self._DATA.size)
         self._soft_reset()
 
     @classmethod
@@ -48,6 +98,55 @@ class SHT31(I2CSensor):
     def default_addr(cls):
         return cls.DEFAULT_ADDR
 
+    @classmethod
+    def addresses(cls):
+        return (cls.ADDR1, cls.ADDR2)
+
+    def configure(self, repeatability=None, mps=None, art=None):
+        """
+        Configures the repeatability, one of the REP_* constants without
+        clock stretching, and the data acquisition mode. With mps set to one
+        of the MPS_* constants except MPS_SINGLE_SHOT the sensor samples on
+        its own and measurements just fetch the latest sample. art selects
+        the periodic mode with accelerated response time instead. Arguments
+        which are None are left unchanged.
+        """
+        if repeatability is not None:
+            if repeatability not in self.CONVERSION_TIMES:
+                raise ValueError('invalid repeatability: {}'.format(repeatability))
+            self._repeatability = repeatability
+        if mps is not None and mps != self.MPS_SINGLE_SHOT and \
+                mps not in self.PERIODIC_COMMANDS:
+            raise ValueError('invalid measurements per second: {}'.format(mps))
+        if self._period is not None and self._ready_at is not None:
+            self._stop_periodic()
+        self._ready_at = None
+        if mps is not None:
+            self._mps = mps
+        if art is not None:
+            self._art = art
+        if self._art:
+            self._period = 1.0 / self.MPS_ART
+        else:
+            self._period = 1.0 / self._mps if self._mps else None
+
+    def _start_periodic(self):
+        if self._art:
+            logger.debug('start periodic measurements with ART')
+            msb, lsb = self.CMD_ART
+        else:
+            logger.debug('start periodic measurements, mps=%s', self._mps)
+            msb, lsbs = self.PERIODIC_COMMANDS[self._mps]
+            lsb = lsbs[self._repeatability]
+        self._bus.write_byte_data(self.addr, msb, lsb)
+        self._ready_at = time.monotonic() + self.CONVERSION_TIMES[self._repeatability]
+
+    def _stop_periodic(self):
+        logger.debug('stop periodic measurements')
+        msb, lsb = self.CMD_BREAK
+        self._bus.write_byte_data(self.addr, msb, lsb)
+        self._ready_at = None
+
     def _soft_reset(self):
         logger.debug('perform a soft reset')
         msb, lsb = self.CMD_SOFT_RESET
@@ -58,18 +157,78 @@ class SHT31(I2CSensor):
         self._bus.write_byte_data(self.addr, self.CS_DISBALED,
                 self._repeatability)
  
-    def _read_data(self):
-        self._trigger_measurement()
-        time.sleep(self.REP_HIGH_S)
-        logger.debug('read temperature and humidity data')
-        data = self._bus.read_i2c_block_data(self.addr, 0x00, 6)
+    def _start_measurement(self):
+        # returns the time until the data is ready, a single shot measurement
+        # is only triggered if there is none in progress
+        if self._ready_at is None:
+            if self._period is None:
+                self._trigger_measurement()
+                self._ready_at = time.monotonic() + self.CONVERSION_TIMES[self._repeatability]
+            else:
+                self._start_periodic()
+        return max(self._ready_at - time.monotonic(), 0.0)
+
+    def _read_frame(self):
+        # returns the raw words or None if there is no valid data
+        if self._period is not None:
+            logger.debug('fetch data')
+            msb, lsb = self.CMD_FETCH_DATA
+            self._bus.write_byte_data(self.addr, msb, lsb)
+        else:
+            logger.debug('read temperature and humidity data')
+        try:
+            # the read header follows the command directly
+            self._bus.read_bytes_into(self.addr, self._buf)
+        except OSError as e:
+            if e.errno == errno.EOPNOTSUPP:
+                raise
+            # the read is not acknowledged if there is no new sample yet
+            logger.debug('no data available: %s', e)
+            self._error = e
+            self._ready_at = time.monotonic() + (self._period / 10 if self._period
+                    else self.CONVERSION_TIMES[self._repeatability] / 4)
+            return None
+        self._ready_at = None if self._period is None else time.monotonic() + self._period
+
+        t_word, t_crc, h_word, h_crc = self._DATA.unpack_from(self._buf)
+        if self._compute_crc8(self._buf, 0) != t_crc or \
+                self._compute_crc8(self._buf, 3) != h_crc:
+            logger.debug('CRC mismatch in data %s', list(self._buf))
+            self._error = OSError(errno.EBADMSG, 'CRC mismatch')
+            return None
+        return t_word, h_word
+
+    @classmethod
+    def _compute_crc8(cls, data, offset):
+        # CRC-8 of the word at offset
+        table = cls.CRC8_TABLE
+        crc = table[0xFF ^ data[offset]]
+        return table[crc ^ data[offset + 1]]
+
+    def _measure_raw_steps(self):
+        for _ in range(self.RETRIES + 1):
+            delay = self._start_measurement()
+            if delay:
+                yield delay
+            words = self._read_frame()
+            if words is not None:
+                return words
+        raise self._error
 
-        t_msb, t_lsb, t_crc, h_msb, h_lsb, h_crc = data
-        t_word = (t_msb << 8) | t_lsb
-        h_word = (h_msb << 8) | h_lsb
+    def _measure_steps(self):
+        raw = yield from self._measure_raw_steps()
+        data = self._compensate_raw(*raw)
+        self._temperature, self._humidity = data['temperature'], data['humidity']
+        return data
 
-        self._temperature = self._compute_temperature_c(t_word) 
-        self._humidity = self._compute_humidity(h_word)
+    def _compensate_raw(self, t_word, h_word):
+        return {
+            'temperature': self._compute_temperature_c(t_word),
+            'humidity': self._compute_humidity(h_word)
+        }
+
+    def _read_data(self):
+        self.trigger().wait()
         return self._temperature, self._humidity
 
     def _compute_temperature_c(self, t_raw):
@@ -90,11 +249,7 @@ class SHT31(I2CSensor):
         return self._humidity
 
     def measure(self):
-        self._read_data()
-        return {
-            'temperature': self._temperature,
-            'humidity': self._humidity
-        }
+        return self.trigger().wait()
 
     def temperature(self):
         return self._temperature
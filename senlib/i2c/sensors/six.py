@@ -4,6 +4,7 @@ __author__ = 'Alexander Rüedlinger'
 __all__ = ('SI7021')
 
 from senlib import logger
+import struct
 import time
 from senlib.core.i2c import Sensor as I2CSensor
 
@@ -22,11 +23,46 @@ class SI7021(I2CSensor):
     CMD_MEASURE_HUM = 0xF5
     CMD_MEASURE_TEMP = 0xF3
     CMD_LAST_TEMP = 0xE0
+    CMD_WRITE_USER_REG = 0xE6
+    CMD_READ_USER_REG = 0xE7
+
+    # resolution bits D7 and D0 of the user register
+    RES_MASK = 0x81
+    RES_RH12_T14 = 0x00
+    RES_RH8_T12 = 0x01
+    RES_RH10_T13 = 0x80
+    RES_RH11_T11 = 0x81
+
+    # typical and maximum conversion times of the datasheet by resolution
+    HUMIDITY_CONVERSION_TIMES = {
+        RES_RH12_T14: (0.010, 0.012),
+        RES_RH8_T12: (0.0026, 0.0031),
+        RES_RH10_T13: (0.0037, 0.0045),
+        RES_RH11_T11: (0.0058, 0.007)
+    }
+    TEMPERATURE_CONVERSION_TIMES = {
+        RES_RH12_T14: (0.007, 0.0108),
+        RES_RH8_T12: (0.0024, 0.0038),
+        RES_RH10_T13: (0.004, 0.0062),
+        RES_RH11_T11: (0.0015, 0.0024)
+    }
+    # the sensor does not acknowledge reads until the conversion is done, it
+    # is polled in this interval after the typical conversion time
+    POLL_INTERVAL = 0.001
+
+    RAW_FIELDS = ('adc_h', 'adc_t')
+
+    _WORD = struct.Struct('>H')
 
     def __init__(self, bus, addr=ADDR):
         super(SI7021, self).__init__(bus, addr)
         logger.debug('create SI7021(addr=%s) object', addr)
         self._temperature = self._humidity = 0.0
+        self._h_buf = bytearray(self._WORD.size)
+        self._t_buf = bytearray(self._WORD.size)
+        self._deadline = 0.0
+        self._resolution = self._read_user_register() & self.RES_MASK
+        self._set_conversion_times()
 
     @classmethod
     def driver_name(cls):
@@ -36,36 +72,98 @@ class SI7021(I2CSensor):
     def default_addr(cls):
         return cls.DEFAULT_ADDR
 
+    def configure(self, resolution=None):
+        """
+        Configures the resolution of the humidity and the temperature, one of
+        the RES_* constants. Lower resolutions convert faster. Arguments
+        which are None are left unchanged.
+        """
+        if resolution is not None:
+            if resolution not in self.HUMIDITY_CONVERSION_TIMES:
+                raise ValueError('invalid resolution: {}'.format(resolution))
+            user_reg = self._read_user_register()
+            self._write_user_register((user_reg & ~self.RES_MASK & 0xFF) | resolution)
+            self._resolution = resolution
+        self._set_conversion_times()
+
+    def measurement_time(self):
+        """ Returns the maximal time in seconds of a humidity and temperature conversion. """
+        return self.HUMIDITY_CONVERSION_TIMES[self._resolution][1] + \
+                self.TEMPERATURE_CONVERSION_TIMES[self._resolution][1]
+
+    def _set_conversion_times(self):
+        self._conversion_time = self.HUMIDITY_CONVERSION_TIMES[self._resolution][0] + \
+                self.TEMPERATURE_CONVERSION_TIMES[self._resolution][0]
+        self._max_conversion_time = self.measurement_time()
+
+    def _read_user_register(self):
+        logger.debug('read user register')
+        return self._bus.read_byte_data(self.addr, self.CMD_READ_USER_REG)
+
+    def _write_user_register(self, value):
+        logger.debug('write user register %#04x', value)
+        self._bus.write_byte_data(self.addr, self.CMD_WRITE_USER_REG, value)
+
+    def _compute_temperature(self, data):
+        return (175.72 * data)/65536.0 - 46.85
+
+    def _compute_humidity(self, data):
+        return (125 * data)/65536.0 - 6
+
+    def _trigger_humidity(self):
+        # the humidity conversion measures the temperature as well
+        logger.debug('trigger humidity measurement')
+        self._bus.write_byte(self.addr, self.CMD_MEASURE_HUM)
+        self._deadline = time.monotonic() + self._max_conversion_time * 2
+        return self._conversion_time
+
+    def _poll_humidity(self):
+        # returns the raw humidity or None while the sensor is converting
+        try:
+            self._bus.read_bytes_into(self.addr, self._h_buf)
+        except OSError:
+            if time.monotonic() > self._deadline:
+                raise
+            return None
+        logger.debug('read humidity data')
+        adc_h, = self._WORD.unpack_from(self._h_buf)
+        return adc_h
+
+    def _read_last_temperature(self):
+        logger.debug('read temperature data of the humidity measurement')
+        self._bus.read_i2c_block_data_into(self.addr, self.CMD_LAST_TEMP, self._t_buf)
+        adc_t, = self._WORD.unpack_from(self._t_buf)
+        return adc_t
+
     def read_temperature(self):
-        logger.debug('read temperature data')
-        self._bus.write_byte(self.addr, self.CMD_MEASURE_TEMP)
-        time.sleep(0.05)
-        msb = self._bus.read_byte(self.addr)
-        lsb = self._bus.read_byte(self.addr)
-        data = (msb << 8) | lsb
-        temp = (175.72 * data)/65536.0 - 46.85
-        return temp
+        return self.measure()['temperature']
 
     def read_humidity(self):
-        logger.debug('read humidity data')
-        self._bus.write_byte(self.addr, self.CMD_MEASURE_HUM)
-        time.sleep(0.05)
-        msb = self._bus.read_byte(self.addr)
-        lsb = self._bus.read_byte(self.addr)
-        data = (msb << 8) | lsb
-        hum = (125 * data)/65536.0 - 6
-        return hum
+        return self.measure()['humidity']
 
-    def measure(self):
-        self._humidity = self.read_humidity()
-        time.sleep(0.01)
-        self._temperature = self.read_temperature()
+    def _measure_raw_steps(self):
+        yield self._trigger_humidity()
+        adc_h = self._poll_humidity()
+        while adc_h is None:
+            yield self.POLL_INTERVAL
+            adc_h = self._poll_humidity()
+        return adc_h, self._read_last_temperature()
 
+    def _compensate_raw(self, adc_h, adc_t):
         return {
-            'temperature': self._temperature,
-            'humidity': self._humidity
+            'temperature': self._compute_temperature(adc_t),
+            'humidity': self._compute_humidity(adc_h)
         }
 
+    def _measure_steps(self):
+        raw = yield from self._measure_raw_steps()
+        data = self._compensate_raw(*raw)
+        self._temperature, self._humidity = data['temperature'], data['humidity']
+        return data
+
+    def measure(self):
+        return self.trigger().wait()
+
     def temperature(self):
         return self._temperature
 
@@ -13,3 +13,6 @@ class Sensor(object):
             'temperature': 29.5,
             'humidity': 35.2
         }
+
+    async def measure_async(self):
+        return self.measure()
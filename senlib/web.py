@@ -6,16 +6,17 @@ import aiohttp
 import asyncio
 from aiohttp import web
 from senlib import logger
-import time
 
 
 class WebServer:
 
-    def __init__(self, interval, loop, sensor):
+    def __init__(self, interval, loop, sensor, stats=None):
         self._loop = loop
-        self._handler = Handler(interval, self._loop, sensor)
+        self._handler = Handler(interval, self._loop, sensor, stats)
         self._app = web.Application()
         self._app.router.add_get('/', self._handler.index)
+        if stats is not None:
+            self._app.router.add_get('/stats', self._handler.stats)
 
     def run(self, host='0.0.0.0', port=8080):
         web.run_app(self._app, host=host, port=port)
@@ -29,19 +30,27 @@ class WebServer:
 
 class Handler:
 
-    def __init__(self, interval, loop, sensor):
+    def __init__(self, interval, loop, sensor, stats=None):
         self._interval = interval
         self._loop = loop
         self._sensor = sensor
+        self._stats = stats
         self._clients = []
+        self._data = None
 
-    def _create_data(self):
-        data = self._sensor.measure()
-        data['timestamp'] = time.time()
-        return data
+    async def _create_data(self):
+        # requests get the last published sample, a measurement of their own
+        # could overlap with the measurements of the application
+        if self._data is None:
+            raise web.HTTPServiceUnavailable(text='no sensor data yet')
+        return dict(self._data)
+
+    async def stats(self, request):
+        return web.json_response(self._stats.dump())
 
     async def broadcast(self, data):
         logger.debug('broadcast data to clients')
+        self._data = data
         for ws in self._clients:
             await ws.send_json(data)
     
@@ -60,7 +69,7 @@ class Handler:
 
         except web.HTTPException as e:
             logger.debug('cannot upgrade to websocket protocol')
-            data = self._create_data()
+            data = await self._create_data()
             if 'Accept' in request.headers:
                 if 'application/json' in request.headers['Accept']:
                     return web.json_response(data)
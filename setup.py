@@ -28,6 +28,11 @@ REQUIRED = [
     'click'
 ]
 
+# What packages are optional?
+EXTRAS = {
+    'numpy': ['numpy'],
+}
+
 # The rest you shouldn't have to touch too much :)
 # ------------------------------------------------
 # Except, perhaps the License and Trove Classifiers!
@@ -90,6 +95,7 @@ setup(
     url=URL,
     packages=find_packages(exclude=('tests',)),
     install_requires=REQUIRED,
+    extras_require=EXTRAS,
     include_package_data=True,
     entry_points={
         'console_scripts': [
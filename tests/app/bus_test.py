@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+from senlib.app import SenlibApp
+from senlib.core.sim import SimulatedBus, Environment, create_model
+from senlib.core.trace import RecordingBus
+from senlib.i2c.sensors.bmpx import BMP280
+from senlib.i2c.sensors.shtx import SHT31
+
+
+def record(path):
+    env = Environment(temperature=21.0, humidity=45.0, pressure=96000.0)
+    bus = SimulatedBus(devices={0x76: create_model('bmp280', env=env),
+        0x44: create_model('sht31', env=env)})
+    with RecordingBus(bus, str(path)) as recording:
+        for _ in range(2):
+            BMP280(recording, 0x76).measure()
+            SHT31(recording, 0x44).measure()
+
+def create_app(path, **kwargs):
+    config = {
+            'debug': False,
+            'mock': False,
+            'sensor': 'bmp280,sht31',
+            'address': 'i2c://1/0x76,i2c://1/0x44',
+            'replay': str(path),
+            'interval': 1.0,
+    }
+    config.update(kwargs)
+    return SenlibApp(config)
+
+def test_sensors_own_bus_references(tmpdir):
+    path = tmpdir.join('bus.trace')
+    record(path)
+    for pipeline, owner in ((False, '_registry'), (True, '_scheduler')):
+        app = create_app(path, pipeline=pipeline)
+        bmp280, sht31 = app._sensors
+        refcount = getattr(app, owner).refcount
+        assert refcount(1) == 2
+
+        # closing a sensor must not close the bus of the other one
+        bmp280.close()
+        assert refcount(1) == 1
+        assert 20 <= sht31.measure()['temperature'] <= 22
+        app.close_buses()
+        assert refcount(1) == 0
+
+def test_scheduler_is_opt_in(tmpdir):
+    path = tmpdir.join('bus.trace')
+    record(path)
+    app = create_app(path)
+    assert app._scheduler is None
+    assert not hasattr(app._sensor.bus, 'worker')
+    app.close_buses()
+
+    app = create_app(path, pipeline=True)
+    assert app._sensor.bus.worker.bus.name == 'i2c-1'
+    app.close_buses()
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
+import pytest
 from senlib.i2c.sensors.bhx import BH1750
 from senlib.core.i2c import MockBus
+from senlib.core.sim import SimulatedBus, Environment, create_model
 
 I2C_DATA_IN = [
     [0, 9],
@@ -39,3 +41,54 @@ def test_close_bh1750():
     sensor = test_create_bh1750()
     sensor_data = sensor.measure()
     sensor.close() 
+
+
+def create_simulated_bh1750(illuminance):
+    env = Environment(illuminance=illuminance)
+    bus = SimulatedBus(devices={0x23: create_model('bh1750', env=env)}, latency=0.0)
+    return BH1750(bus), env
+
+def test_modes_bh1750():
+    sensor, _ = create_simulated_bh1750(300.0)
+    for mode in (BH1750.MODE_HRES2, BH1750.MODE_LRES):
+        sensor.configure(mode=mode, mtreg=BH1750.MTREG_MIN)
+        assert 290 <= sensor.measure()['illuminance'] <= 310
+    assert sensor.measurement_time() == pytest.approx(0.024 * 31 / 69)
+    with pytest.raises(ValueError):
+        sensor.configure(mode=6)
+    with pytest.raises(ValueError):
+        sensor.configure(mtreg=255)
+
+def test_continuous_mode_bh1750():
+    sensor, _ = create_simulated_bh1750(300.0)
+    sensor.configure(mode=BH1750.MODE_LRES_C)
+    transactions = []
+    for _ in range(3):
+        start = sensor.bus.transactions
+        assert 290 <= sensor.measure()['illuminance'] <= 310
+        transactions.append(sensor.bus.transactions - start)
+    # the measurement is only started once, later just the result is read
+    assert transactions == [2, 1, 1]
+
+def test_continuous_mode_follows_illuminance_bh1750():
+    sensor, env = create_simulated_bh1750(100.0)
+    sensor.configure(mode=BH1750.MODE_HRES_C)
+    for illuminance in (100.0, 500.0, 900.0):
+        env.illuminance = illuminance
+        # the first result may still stem from the previous conversion
+        sensor.measure()
+        assert illuminance * 0.97 <= sensor.measure()['illuminance'] <= illuminance * 1.03
+
+def test_adaptive_bh1750():
+    sensor, env = create_simulated_bh1750(5000.0)
+    sensor.configure(mode=BH1750.MODE_HRES_C, adaptive=True)
+    assert 4900 <= sensor.measure()['illuminance'] <= 5100
+    assert sensor.measurement_time() == pytest.approx(BH1750.MAX_TIME_LRES)
+    env.illuminance = 60000.0
+    sensor.measure()
+    assert 59000 <= sensor.measure()['illuminance'] <= 61000
+    assert sensor.measurement_time() == pytest.approx(BH1750.MAX_TIME_LRES * 31 / 69)
+    # the hysteresis keeps the fast settings slightly below the level
+    env.illuminance = 38000.0
+    sensor.measure()
+    assert sensor.measurement_time() == pytest.approx(BH1750.MAX_TIME_LRES * 31 / 69)
@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
+import random
+import pytest
 from senlib.i2c.sensors.bmex import BME280
+from senlib.i2c.sensors import bosch
 from senlib.core.i2c import MockBus
 
 
@@ -7,9 +10,7 @@ BME280_I2C_DATA_IN = [
     [104, 110, 232, 100, 50, 0, 83, 143, 171, 213, 208, 11, 163, 34, 53, 0, 249, 
         255, 172, 38, 10, 216, 189, 16, 0, 75],
     [108, 1, 0, 19, 10, 0, 30],
-    [86, 133, 0],
-    [126, 87, 0],
-    [116, 223]
+    [86, 133, 0, 126, 87, 0, 116, 223]
 ]
 
 BME280_CALIB_DATA = {
@@ -37,7 +38,86 @@ def test_measure_bme280():
     assert sensor_data['temperature'] - 20.08 <= 0.1
     assert sensor_data['pressure'] - 93245.52 <= 0.1
 
+def test_transactions_bme280():
+    sensor = test_create_bme280()
+    transactions = sensor.bus.transactions
+    sensor.measure()
+    assert sensor.bus.transactions - transactions == 1
+
+def test_forced_mode_bme280():
+    sensor = test_create_bme280()
+    sensor.configure(power_mode=BME280.MODE_FORCED)
+    transactions = sensor.bus.transactions
+    sensor_data = sensor.measure()
+    assert sensor.bus.transactions - transactions == 2
+    assert sensor_data['temperature'] - 20.08 <= 0.1
+
+def test_measurement_time_bme280():
+    sensor = test_create_bme280()
+    assert sensor.measurement_time() == pytest.approx(0.0093)
+    sensor.configure(osrs_t=BME280.OSRS_X16, osrs_p=BME280.OSRS_X16, 
+            osrs_h=BME280.OSRS_X16, filter=BME280.FILTER_16)
+    assert sensor.measurement_time() == pytest.approx(0.1128)
+    sensor.configure(osrs_h=BME280.OSRS_SKIP)
+    assert sensor.measurement_time() == pytest.approx(0.075425)
+    with pytest.raises(ValueError):
+        sensor.configure(osrs_t=6)
+
 def test_close_bme280():
     sensor = test_create_bme280()
     sensor_data = sensor.measure()
     sensor.close() 
+
+def test_compensate_bme280():
+    np = pytest.importorskip('numpy')
+    sensor = test_create_bme280()
+    rng = np.random.RandomState(280)
+    adc_t = rng.randint(0, 1 << 20, 500)
+    adc_p = rng.randint(0, 1 << 20, 500)
+    adc_h = rng.randint(0, 1 << 16, 500)
+    data = BME280.compensate(sensor.calibration_data, adc_t, adc_p, adc_h)
+    for i, (t, p, h) in enumerate(zip(adc_t.tolist(), adc_p.tolist(), adc_h.tolist())):
+        assert data['temperature'][i] == sensor._compensate_temperature(t)
+        assert data['pressure'][i] == sensor._compensate_pressure(p)
+        assert data['humidity'][i] == sensor._compensate_humidity(h)
+
+def test_compensate_bme280_without_numpy(monkeypatch):
+    monkeypatch.setattr(bosch, 'have_numpy', lambda: False)
+    sensor = test_create_bme280()
+    sensor_data = sensor.measure()
+    adc_p = (86 << 12) | (133 << 4)
+    adc_t = (126 << 12) | (87 << 4)
+    adc_h = (116 << 8) | 223
+    data = BME280.compensate(sensor.calibration_data, [adc_t], [adc_p], [adc_h])
+    for key in ('temperature', 'pressure', 'humidity'):
+        assert data[key] == [sensor_data[key]]
+
+def test_integer_compensation_bme280():
+    # raw values of about -20..50 °C, 600..1100 hPa and 0..100 %RH, the results
+    # agree within the resolution of the datasheet formulas
+    sensor = test_create_bme280()
+    int_sensor = test_create_bme280()
+    int_sensor.compensation = BME280.COMPENSATION_INTEGER
+    rng = random.Random(280)
+    for _ in range(500):
+        values = (rng.randint(400000, 600000), rng.randint(250000, 450000),
+                rng.randint(20000, 40000))
+        data = sensor._compensate_raw(*values)
+        int_data = int_sensor._compensate_raw(*values)
+        assert int_data['temperature'] == pytest.approx(data['temperature'], abs=0.01)
+        assert int_data['pressure'] == pytest.approx(data['pressure'], abs=1.0)
+        assert int_data['humidity'] == pytest.approx(data['humidity'], abs=0.01)
+
+def test_compensation_bme280():
+    sensor = test_create_bme280()
+    values = sensor.measure_raw().values
+    sensor_data = sensor._compensate_raw(*values)
+    sensor.compensation = BME280.COMPENSATION_INTEGER
+    assert '_compensate_temperature' not in vars(sensor)
+    int_data = sensor._compensate_raw(*values)
+    assert int_data != sensor_data
+    assert int_data['temperature'] * 100 == pytest.approx(round(int_data['temperature'] * 100))
+    sensor.compensation = BME280.COMPENSATION_FLOAT
+    assert sensor._compensate_raw(*values) == sensor_data
+    with pytest.raises(ValueError):
+        sensor.compensation = 'fixed'
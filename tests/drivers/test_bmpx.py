@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
+import random
+import pytest
 from senlib.i2c.sensors.bmpx import BMP180
 from senlib.i2c.sensors.bmpx import BMP280
+from senlib.i2c.sensors import bosch
 from senlib.core.i2c import MockBus
 
 
@@ -24,8 +27,8 @@ BMP180_CALIB_DATA = {
 }
 BMP280_CALIB_DATA = {
     'T1': 27934, 'T2': 26465, 'T3': -1000, 'P1': 35987, 'P2': -10753, 
-    'P3': 3024, 'P4': 4000, 'P5': 139, 'P6': -7, 'P7': 6000, 'P8': -14600, 
-    'H1': 0
+    'P3': 3024, 'P4': 4000, 'P5': 139, 'P6': -7, 'P7': 15500, 'P8': -14600, 
+    'P9': 6000, 'H1': 0
 }
 
 def test_create_bmp180():
@@ -52,6 +55,51 @@ def test_close_bmp180():
     sensor_data = sensor.measure()
     sensor.close() 
 
+def test_temperature_interval_bmp180():
+    bus = MockBus(read_data=BMP180_I2C_DATA_IN[:2] + [[100, 11]] + [[145, 157, 128]] * 3 +
+        [[100, 11], [145, 157, 128]])
+    sensor = BMP180(bus=bus)
+    sensor.configure(temperature_interval=3)
+    transactions = []
+    for _ in range(4):
+        start = bus.transactions
+        sensor_data = sensor.measure()
+        transactions.append(bus.transactions - start)
+        assert sensor_data['temperature'] - 25.7 <= 0.1
+    assert transactions == [4, 2, 2, 4]
+
+def test_temperature_drift_bmp180():
+    bus = MockBus(read_data=BMP180_I2C_DATA_IN[:2] + [[100, 11], [145, 157, 128]] +
+        [[145, 157, 128]] * 2 + [[104, 11], [145, 157, 128]] * 2)
+    sensor = BMP180(bus=bus)
+    sensor.configure(temperature_interval=3, temperature_drift=0.5)
+    for _ in range(4):
+        sensor.measure()
+    start = bus.transactions
+    sensor.measure()
+    # the temperature rose by several degrees, hence it is converted again
+    assert bus.transactions - start == 4
+
+def test_configure_bmp180():
+    sensor = test_create_bmp180()
+    assert sensor.measurement_time() == pytest.approx(0.012)
+    sensor.configure(mode=BMP180.MODE_ULTRA_HIGH)
+    assert sensor.mode == BMP180.MODE_ULTRA_HIGH
+    assert sensor.measurement_time() == pytest.approx(0.03)
+    with pytest.raises(ValueError):
+        sensor.configure(mode=4)
+    with pytest.raises(ValueError):
+        sensor.configure(temperature_interval=0)
+
+def test_compensate_raw_bmp180():
+    sensor = test_create_bmp180()
+    adc_t, adc_p, mode = sensor.measure_raw().values
+    data = sensor._compensate_raw(adc_t, adc_p, mode)
+    # the mode of a sample must not change the configured one
+    ultra_data = sensor._compensate_raw(adc_t, adc_p << 2, BMP180.MODE_ULTRA_HIGH)
+    assert sensor.mode == mode
+    assert ultra_data['pressure'] == pytest.approx(data['pressure'], abs=2)
+
 def test_create_bmp280():
     bus = MockBus(read_data=BMP280_I2C_DATA_IN)
     sensor = BMP280(bus=bus)
@@ -75,3 +123,46 @@ def test_close_bmp280():
     sensor = test_create_bmp280()
     sensor_data = sensor.measure()
     sensor.close() 
+
+def test_compensate_bmp280():
+    np = pytest.importorskip('numpy')
+    sensor = test_create_bmp280()
+    rng = np.random.RandomState(280)
+    adc_t = rng.randint(0, 1 << 20, 500)
+    adc_p = rng.randint(0, 1 << 20, 500)
+    data = BMP280.compensate(sensor.calibration_data, adc_t, adc_p)
+    for i, (t, p) in enumerate(zip(adc_t.tolist(), adc_p.tolist())):
+        assert data['temperature'][i] == sensor._compensate_temperature(t)
+        assert data['pressure'][i] == sensor._compensate_pressure(p)
+
+def test_compensate_bmp280_without_numpy(monkeypatch):
+    monkeypatch.setattr(bosch, 'have_numpy', lambda: False)
+    sensor = test_create_bmp280()
+    sensor_data = sensor.measure()
+    adc_p = (108 << 12) | (153 << 4)
+    adc_t = (124 << 12) | (227 << 4)
+    data = BMP280.compensate(sensor.calibration_data, [adc_t], [adc_p])
+    assert data['temperature'] == [sensor_data['temperature']]
+    assert data['pressure'] == [sensor_data['pressure']]
+
+def test_integer_compensation_bmp280():
+    sensor = test_create_bmp280()
+    int_sensor = test_create_bmp280()
+    int_sensor.compensation = BMP280.COMPENSATION_INTEGER
+    rng = random.Random(280)
+    for _ in range(500):
+        values = (rng.randint(400000, 600000), rng.randint(250000, 450000))
+        data = sensor._compensate_raw(*values)
+        int_data = int_sensor._compensate_raw(*values)
+        assert int_data['temperature'] == pytest.approx(data['temperature'], abs=0.01)
+        assert int_data['pressure'] == pytest.approx(data['pressure'], abs=1.0)
+
+def test_compensation_bmp280():
+    sensor = test_create_bmp280()
+    values = sensor.measure_raw().values
+    sensor_data = sensor._compensate_raw(*values)
+    sensor.compensation = BMP280.COMPENSATION_INTEGER
+    assert '_compensate_temperature' not in vars(sensor)
+    assert sensor._compensate_raw(*values) != sensor_data
+    with pytest.raises(ValueError):
+        sensor.compensation = None
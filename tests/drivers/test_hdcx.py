@@ -1,11 +1,13 @@
 # -*- coding: utf-8 -*-
+import pytest
 from senlib.i2c.sensors.hdcx import HDC1008
 from senlib.core.i2c import MockBus
+from senlib.core.sim import SimulatedBus, Environment, create_model
 
 I2C_DATA_IN = [
-    95, 95, 145, 145,
-    96, 96, 149, 149,
-    96, 96, 161, 161
+    [95, 95, 145, 145],
+    [96, 96, 149, 149],
+    [96, 96, 161, 161]
 ]
 
 
@@ -36,3 +38,48 @@ def test_close_hdc1008():
     sensor = test_create_hdc1008()
     sensor_data = sensor.measure()
     sensor.close() 
+
+def create_simulated_hdc1008():
+    env = Environment(temperature=21.0, humidity=45.0)
+    model = create_model('hdc1008', env=env)
+    bus = SimulatedBus(devices={0x40: model}, latency=0.0)
+    return HDC1008(bus), model
+
+def test_transactions_hdc1008():
+    sensor = test_create_hdc1008()
+    transactions = sensor.bus.transactions
+    sensor.measure()
+    assert sensor.bus.transactions - transactions == 2
+
+def test_sequential_mode_hdc1008():
+    sensor, model = create_simulated_hdc1008()
+    # sequential mode, heater disabled, 14 bit resolutions
+    assert model.config == 0x1000
+    sensor_data = sensor.measure()
+    assert 20 <= sensor_data['temperature'] <= 22
+    assert 44 <= sensor_data['humidity'] <= 46
+
+def test_configure_hdc1008():
+    sensor, model = create_simulated_hdc1008()
+    assert sensor.measurement_time() == pytest.approx(0.01285)
+    sensor.configure(tres=HDC1008.TRES_11, hres=HDC1008.HRES_8)
+    assert model.config == 0x1600
+    assert sensor.measurement_time() == pytest.approx(0.00615)
+    sensor_data = sensor.measure()
+    assert 20 <= sensor_data['temperature'] <= 22
+    assert 44 <= sensor_data['humidity'] <= 46
+    with pytest.raises(ValueError):
+        sensor.configure(hres=3)
+
+def test_slow_conversion_hdc1008():
+    sensor, model = create_simulated_hdc1008()
+    # the conversion takes longer than typical, the read is not acknowledged
+    model.TEMPERATURE_CONVERSION_TIMES = {0: 0.013, 1: 0.007}
+    transactions = sensor.bus.transactions
+    sensor_data = sensor.measure()
+    assert sensor.bus.transactions - transactions > 2
+    assert 20 <= sensor_data['temperature'] <= 22
+
+    model.TEMPERATURE_CONVERSION_TIMES = {0: 0.1, 1: 0.1}
+    with pytest.raises(OSError):
+        sensor.measure()
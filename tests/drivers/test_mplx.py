@@ -1,27 +1,34 @@
 # -*- coding: utf-8 -*-
+import errno
+import time
+import pytest
 from senlib.i2c.sensors.mplx import MPL115A2
 from senlib.i2c.sensors.mplx import MPL3115A2
 from senlib.core.i2c import MockBus
+from senlib.core.sim import SimulatedBus, Environment, create_model
 
 
-MPL3115A2_I2C_DATA_IN = [238, 91, 25, 192, 20, 48] \
-    + [238, 91, 25, 224, 20, 32] \
-    + [238, 91, 32, 144, 19, 0]
+MPL3115A2_I2C_DATA_IN = [238, [91, 25, 192], [20, 48]] \
+    + [238, [91, 25, 224], [20, 32]] \
+    + [238, [91, 32, 144], [19, 0]]
 MPL115A2_I2C_DATA_IN = [[60, 149, 182, 174, 198, 209, 50, 8]] \
     + [
         [130, 64],
         [104, 64],
-        [130, 64],
-        [133, 64],
-        [103, 192],
-        [132, 192],
         [132, 192],
         [103, 192],
-        [133, 64]
+        [133, 64],
+        [103, 192]
 ]
 
+class NoDelayMockBus(MockBus):
+
+    conversion_delays = False
+
+
 def test_create_mpl3115a2():
-    bus = MockBus(read_data=MPL3115A2_I2C_DATA_IN)
+    # the sensor samples once a second, the data is ready at once
+    bus = NoDelayMockBus(read_data=MPL3115A2_I2C_DATA_IN)
     sensor = MPL3115A2(bus=bus)
     assert sensor
     return sensor
@@ -44,6 +51,13 @@ def test_measure_mpl3115a2():
     assert sensor_data['temperature'] == 19.0
     assert sensor_data['pressure'] == 93314.25
 
+def test_transactions_mpl3115a2():
+    sensor = test_create_mpl3115a2()
+    transactions = sensor.bus.transactions
+    sensor.measure()
+    # one status read and one combined data read
+    assert sensor.bus.transactions - transactions == 2
+
 def test_close_mpl3115a2():
     sensor = test_create_mpl3115a2()
     sensor_data = sensor.measure()
@@ -58,22 +72,110 @@ def test_create_mpl115a2():
 def test_measure_mpl115a2():
     sensor = test_create_mpl115a2()
     
-    sensor_data = sensor.measure()
-    assert sensor_data
-    assert sensor_data['temperature'] - 23.39 <= 0.1
-    assert sensor_data['pressure'] - 93433.76 <= 0.1
-
-    sensor_data = sensor.measure()
-    assert sensor_data
-    assert sensor_data['temperature'] - 21.68 <= 0.1
-    assert sensor_data['pressure'] - 93234.67 <= 0.1
-
-    sensor_data = sensor.measure()
-    assert sensor_data
-    assert sensor_data['temperature'] - 21.34 <= 0.1
-    assert sensor_data['pressure'] - 93307.95 <= 0.1
+    expected = [(23.39, 93433.76), (21.68, 93307.96), (21.34, 93234.67)]
+    for temperature, pressure in expected:
+        start = sensor.bus.transactions
+        sensor_data = sensor.measure()
+        assert sensor_data
+        assert sensor_data['temperature'] == pytest.approx(temperature, abs=0.01)
+        assert sensor_data['pressure'] == pytest.approx(pressure, abs=0.01)
+        # a single conversion gives both values
+        assert sensor.bus.transactions - start == 3
 
 def test_close_mpl115a2():
     sensor = test_create_mpl115a2()
     sensor_data = sensor.measure()
     sensor.close() 
+
+class Clock(object):
+
+    def __init__(self, step=0.0):
+        self.time = 0.0
+        self.step = step
+
+    def __call__(self):
+        self.time += self.step
+        return self.time
+
+
+class NoDelayBus(SimulatedBus):
+
+    conversion_delays = False
+
+
+def create_simulated_mpl3115a2(env=None, clock=None, bus_class=SimulatedBus):
+    model = create_model('mpl3115a2', env=env or Environment())
+    if clock is not None:
+        model.now = clock
+    bus = bus_class(devices={0x60: model}, latency=0.0)
+    return MPL3115A2(bus=bus), model
+
+def test_configure_mpl3115a2():
+    sensor = test_create_mpl3115a2()
+    assert sensor.measurement_time() == 1.0
+    sensor.configure(oversampling=MPL3115A2.OS_1, time_step=3)
+    assert sensor.measurement_time() == 8.0
+    sensor.configure(one_shot=True)
+    assert sensor.measurement_time() == pytest.approx(0.006)
+    for kwargs in ({'oversampling': 8}, {'time_step': 16}, {'fifo': 3}, 
+            {'watermark': 32}, {'fifo': MPL3115A2.FIFO_CIRCULAR}):
+        with pytest.raises(ValueError):
+            sensor.configure(**kwargs)
+    with pytest.raises(ValueError):
+        sensor.read_fifo()
+
+def test_one_shot_mpl3115a2():
+    env = Environment(temperature=-5.5, pressure=101325.0)
+    sensor, _ = create_simulated_mpl3115a2(env)
+    sensor.configure(oversampling=MPL3115A2.OS_1, one_shot=True)
+    start = time.monotonic()
+    for _ in range(5):
+        transactions = sensor.bus.transactions
+        sensor_data = sensor.measure()
+        # trigger, status read and data read
+        assert sensor.bus.transactions - transactions == 3
+        assert sensor_data['temperature'] == pytest.approx(-5.5, abs=0.2)
+        assert sensor_data['pressure'] == pytest.approx(101325.0, abs=20.0)
+    assert time.monotonic() - start < 0.5
+
+def test_data_ready_timeout_mpl3115a2():
+    sensor, _ = create_simulated_mpl3115a2(clock=Clock(), bus_class=NoDelayBus)
+    sensor.configure(oversampling=MPL3115A2.OS_1, one_shot=True)
+    with pytest.raises(OSError) as excinfo:
+        sensor.measure()
+    assert excinfo.value.errno == errno.ETIMEDOUT
+
+def test_fifo_mpl3115a2():
+    for fifo in (MPL3115A2.FIFO_CIRCULAR, MPL3115A2.FIFO_FILL):
+        env = Environment(pressure=96000.0)
+        clock = Clock()
+        sensor, model = create_simulated_mpl3115a2(env, clock)
+        sensor.configure(fifo=fifo, watermark=4)
+        clock.time += 10.0
+        samples = sensor.read_fifo()
+        assert len(samples) == 10
+        assert all(abs(sample['pressure'] - 96000.0) < 20.0 for sample in samples)
+        assert sensor.pressure() == samples[-1]['pressure']
+        assert sensor.read_fifo() == []
+
+        # overflow of the FIFO, the circular mode keeps the newest samples
+        clock.time += 32.0
+        assert sensor.bus.read_byte_data(0x60, MPL3115A2.REG_F_STATUS) == 0x60
+        env.pressure = 100000.0
+        clock.time += 10.0
+        samples = sensor.read_fifo()
+        assert len(samples) == MPL3115A2.FIFO_SIZE
+        newest = 100000.0 if fifo == MPL3115A2.FIFO_CIRCULAR else 96000.0
+        assert abs(samples[-1]['pressure'] - newest) < 20.0
+
+def test_trigger_fifo_mpl3115a2():
+    sensor, _ = create_simulated_mpl3115a2(clock=Clock(0.05), bus_class=NoDelayBus)
+    sensor.configure(oversampling=MPL3115A2.OS_1, fifo=MPL3115A2.FIFO_FILL, watermark=6)
+    transactions = sensor.bus.transactions
+    samples = sensor.trigger_fifo().wait()
+    assert len(samples) >= 6
+    # F_STATUS polls and one burst read of all samples
+    assert sensor.bus.transactions - transactions < 2 * 6 / 0.05
+
+    sensor_data = sensor.measure()
+    assert sensor_data == {'pressure': sensor.pressure(), 'temperature': sensor.temperature()}
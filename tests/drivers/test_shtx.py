@@ -1,6 +1,10 @@
 # -*- coding: utf-8 -*-
+import asyncio
+import errno
+import pytest
 from senlib.i2c.sensors.shtx import SHT31
 from senlib.core.i2c import MockBus
+from senlib.core.sim import SimulatedBus, Environment, create_model
 
 I2C_DATA_IN = [
     [98, 60, 181, 109, 223, 190],
@@ -36,3 +40,68 @@ def test_close_sht31():
     sensor = test_create_sht31()
     sensor_data = sensor.measure()
     sensor.close() 
+
+def test_measure_async_sht31():
+    sensor = test_create_sht31()
+    sensor_data = asyncio.run(sensor.measure_async())
+    assert sensor_data
+    assert sensor_data['temperature'] - 22.15 <= 0.1
+    assert sensor_data['humidity'] - 42.92 <= 0.1
+
+def create_simulated_sht31():
+    env = Environment(temperature=21.0, humidity=45.0)
+    bus = SimulatedBus(devices={0x44: create_model('sht31', env=env)}, latency=0.0)
+    return SHT31(bus)
+
+def test_crc8_sht31():
+    # example of the datasheet
+    assert SHT31._compute_crc8(bytearray([0xBE, 0xEF]), 0) == 0x92
+
+def test_crc_retry_sht31():
+    bus = MockBus(read_data=[[98, 60, 180, 109, 223, 190]] + I2C_DATA_IN)
+    sensor = SHT31(bus=bus)
+    sensor_data = sensor.measure()
+    assert sensor_data['temperature'] - 22.15 <= 0.1
+    assert bus.transactions == 5
+
+    bus = MockBus(read_data=[[98, 60, 181, 109, 223, 191]] * 4)
+    sensor = SHT31(bus=bus)
+    with pytest.raises(OSError) as e:
+        sensor.measure()
+    assert e.value.errno == errno.EBADMSG
+
+def test_periodic_mode_sht31():
+    sensor = create_simulated_sht31()
+    sensor.configure(mps=SHT31.MPS_10)
+    transactions = []
+    for _ in range(3):
+        start = sensor.bus.transactions
+        sensor_data = sensor.measure()
+        transactions.append(sensor.bus.transactions - start)
+        assert 20 <= sensor_data['temperature'] <= 22
+        assert 44 <= sensor_data['humidity'] <= 46
+    # the periodic measurements are started once, later the data is fetched
+    assert transactions == [3, 2, 2]
+
+    sensor.configure(mps=SHT31.MPS_SINGLE_SHOT, repeatability=SHT31.REP_LOW)
+    assert 20 <= sensor.measure()['temperature'] <= 22
+
+def test_art_mode_sht31():
+    sensor = create_simulated_sht31()
+    sensor.configure(art=True)
+    for _ in range(2):
+        assert 44 <= sensor.measure()['humidity'] <= 46
+    with pytest.raises(ValueError):
+        sensor.configure(mps=3)
+    with pytest.raises(ValueError):
+        sensor.configure(repeatability=SHT31.REP_HIGH_CS)
+
+def test_early_read_sht31():
+    sensor = create_simulated_sht31()
+    sensor.CONVERSION_TIMES = dict(SHT31.CONVERSION_TIMES)
+    sensor.CONVERSION_TIMES[sensor._repeatability] *= 0.7
+    # the read is not acknowledged before the conversion is done, the
+    # measurement is not triggered again
+    sensor_data = sensor.measure()
+    assert sensor.bus.errors > 0
+    assert 20 <= sensor_data['temperature'] <= 22
@@ -1,21 +1,19 @@
 # -*- coding: utf-8 -*-
+import time
+import pytest
 from senlib.i2c.sensors.six import SI7021
 from senlib.core.i2c import MockBus
+from senlib.core.sim import SimulatedBus, Environment, create_model
 
 
 SI7021_I2C_DATA_IN = [
-    124,
-    124,
-    97,
-    97,
-    157,
-    157,
-    98,
-    98,
-    146,
-    146,
-    97,
-    97
+    0x3A,
+    [124, 124],
+    [97, 97],
+    [157, 157],
+    [98, 98],
+    [146, 146],
+    [97, 97]
 ]
 
 def test_create_si7021():
@@ -46,3 +44,36 @@ def test_close_si7021():
     sensor = test_create_si7021()
     sensor_data = sensor.measure()
     sensor.close() 
+
+def create_simulated_si7021():
+    env = Environment(temperature=21.0, humidity=45.0)
+    model = create_model('si7021', env=env)
+    bus = SimulatedBus(devices={0x40: model}, latency=0.0)
+    return SI7021(bus), model
+
+def test_transactions_si7021():
+    sensor = test_create_si7021()
+    transactions = sensor.bus.transactions
+    sensor.measure()
+    # humidity trigger and read, last temperature read
+    assert sensor.bus.transactions - transactions == 3
+
+def test_polling_si7021():
+    sensor, _ = create_simulated_si7021()
+    start = time.monotonic()
+    sensor_data = sensor.measure()
+    assert time.monotonic() - start < 0.025
+    assert 20 <= sensor_data['temperature'] <= 22
+    assert 44 <= sensor_data['humidity'] <= 46
+    # the reads during the conversion are not acknowledged
+    assert sensor.bus.errors > 0
+
+def test_configure_si7021():
+    sensor, model = create_simulated_si7021()
+    assert sensor.measurement_time() == pytest.approx(0.0228)
+    sensor.configure(resolution=SI7021.RES_RH8_T12)
+    assert model.user_reg == 0x3B
+    assert sensor.measurement_time() == pytest.approx(0.0069)
+    assert 44 <= sensor.measure()['humidity'] <= 46
+    with pytest.raises(ValueError):
+        sensor.configure(resolution=0x02)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import json
+import pytest
+from senlib.core.sim import SimulatedBus, create_model
+from senlib.core.i2c import CALIBRATION_CACHE_FILE
+from senlib.i2c import get_sensor_driver
+
+
+class CachingBus(SimulatedBus):
+    calibration_cache = True
+
+
+@pytest.fixture
+def cache_dir(tmpdir, monkeypatch):
+    monkeypatch.setenv('SENLIB_CACHE_DIR', str(tmpdir))
+    return tmpdir
+
+def create_sensor(bus, name):
+    driver_class = get_sensor_driver(name)
+    return driver_class(bus, driver_class.default_addr())
+
+def create_bus(name):
+    addr = get_sensor_driver(name).default_addr()
+    return CachingBus(devices={addr: create_model(name)}, latency=0.0, realtime=False)
+
+def test_calibration_cache(cache_dir):
+    for name in ('bme280', 'bmp280', 'bmp180'):
+        bus = create_bus(name)
+        first = create_sensor(bus, name)
+        transactions = bus.transactions
+        second = create_sensor(bus, name)
+        assert second.calibration_data == first.calibration_data
+        assert second.calibration_id == first.calibration_id
+        assert bus.transactions - transactions < transactions
+        assert second.measure() == pytest.approx(first.measure(), rel=0.01)
+
+    entries = json.loads(cache_dir.join(CALIBRATION_CACHE_FILE).read())
+    assert sorted(entries) == ['bme280@i2c-1/0x77', 'bmp180@i2c-1/0x77',
+            'bmp280@i2c-1/0x77']
+    assert entries['bme280@i2c-1/0x77']['chip_id'] == 0x60
+
+def test_calibration_cache_chip_id_mismatch(cache_dir):
+    bus = create_bus('bme280')
+    sensor = create_sensor(bus, 'bme280')
+    path = cache_dir.join(CALIBRATION_CACHE_FILE)
+    entries = json.loads(path.read())
+    entries['bme280@i2c-1/0x77']['chip_id'] = 0x58
+    entries['bme280@i2c-1/0x77']['calibration']['T1'] = 0
+    path.write(json.dumps(entries))
+
+    assert create_sensor(bus, 'bme280').calibration_data == sensor.calibration_data
+    assert json.loads(path.read())['bme280@i2c-1/0x77']['chip_id'] == 0x60
+
+def test_refresh_calibration_data(cache_dir):
+    bus = create_bus('bmp280')
+    sensor = create_sensor(bus, 'bmp280')
+    transactions = bus.transactions
+    sensor.refresh_calibration_data()
+    assert bus.transactions - transactions == 2
+
+def test_no_calibration_cache(cache_dir):
+    bus = SimulatedBus(devices={0x77: create_model('bme280')}, latency=0.0, realtime=False)
+    create_sensor(bus, 'bme280')
+    assert not cache_dir.join(CALIBRATION_CACHE_FILE).check()
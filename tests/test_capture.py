@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import pytest
+from senlib.core.sim import SimulatedBus, Environment, create_model
+from senlib.core.capture import CaptureWriter, CaptureReader, CaptureError, compensate
+from senlib.i2c import get_sensor_driver
+
+RAW_DRIVERS = ('bme280', 'bmp280', 'bmp085', 'bmp180', 'mpl115a2', 'sht31', 'si7021')
+
+
+class NoNoise(object):
+
+    def gauss(self, mu, sigma):
+        return mu
+
+
+def create_sensor(name):
+    driver_class = get_sensor_driver(name)
+    addr = driver_class.default_addr()
+    env = Environment(rng=NoNoise())
+    bus = SimulatedBus(devices={addr: create_model(name, env=env)}, latency=0.0,
+            realtime=False)
+    return driver_class(bus, addr)
+
+def test_measure_raw():
+    for name in RAW_DRIVERS:
+        sensor = create_sensor(name)
+        data = sensor.measure()
+        sample = sensor.measure_raw()
+        assert sample.calibration_id == sensor.calibration_id
+        assert len(sample.values) == len(sensor.RAW_FIELDS)
+        compensated = type(sensor).compensate_raw(sensor.calibration_data,
+                [sample.values] * 3)
+        for key, value in data.items():
+            assert list(compensated[key]) == [value] * 3
+
+def test_calibration_id():
+    first, second = create_sensor('bme280'), create_sensor('bme280')
+    assert first.calibration_id == second.calibration_id
+    assert first.calibration_id != create_sensor('bmp280').calibration_id
+
+def test_capture_file(tmpdir):
+    path = str(tmpdir.join('capture.bin'))
+    sensors = [create_sensor('bme280'), create_sensor('sht31')]
+    samples = [[], []]
+    with CaptureWriter(path) as writer:
+        indices = [writer.add(sensor) for sensor in sensors]
+        for num in range(5):
+            for index, sensor in zip(indices, sensors):
+                sample = sensor.measure_raw()
+                writer.write(index, 1000.0 + num, sample.values)
+                samples[index].append(sample.values)
+        assert writer.frames == 10
+
+    reader = CaptureReader(path)
+    assert [record['driver'] for record in reader.records] == ['bme280', 'sht31']
+    assert reader.records[0]['id'] == sensors[0].calibration_id
+    assert reader.samples == samples
+    assert reader.timestamps[1] == [1000.0, 1001.0, 1002.0, 1003.0, 1004.0]
+
+    data = compensate(reader.records, reader.samples)
+    for sensor, sensor_samples, sensor_data in zip(sensors, samples, data):
+        expected = type(sensor).compensate_raw(sensor.calibration_data, sensor_samples)
+        for key, values in expected.items():
+            assert list(sensor_data[key]) == list(values)
+
+def test_truncated_capture_file(tmpdir):
+    path = tmpdir.join('capture.bin')
+    sensor = create_sensor('si7021')
+    with CaptureWriter(str(path)) as writer:
+        index = writer.add(sensor)
+        for num in range(3):
+            writer.write(index, float(num), sensor.measure_raw().values)
+    path.write_binary(path.read_binary()[:-5])
+    assert len(CaptureReader(str(path)).samples[0]) == 2
+
+    path.write_binary(b'SENTRACE')
+    with pytest.raises(CaptureError):
+        CaptureReader(str(path))
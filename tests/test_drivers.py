@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import sys
+import subprocess
+import pytest
+import senlib.i2c
+from senlib.i2c import get_sensor_driver, driver_names, DriverNotFound
+from senlib.core.i2c import Sensor
+
+
+class EntryPoint:
+
+    def __init__(self, name, driver_class):
+        self.name = name
+        self._driver_class = driver_class
+
+    def load(self):
+        return self._driver_class
+
+
+class XYZ123(Sensor):
+    DRIVER_NAME = 'xyz123'
+
+
+def test_get_sensor_driver():
+    driver_class = get_sensor_driver('BMP280')
+    assert driver_class.DRIVER_NAME == 'bmp280'
+    assert get_sensor_driver('bmp280') is driver_class
+    with pytest.raises(DriverNotFound):
+        get_sensor_driver('xyz999')
+
+def test_plugin_drivers(monkeypatch):
+    monkeypatch.setattr(senlib.i2c, '_plugins', None)
+    monkeypatch.setattr(senlib.i2c, '_drivers', {})
+    monkeypatch.setattr(senlib.i2c, '_entry_points', 
+            lambda: [EntryPoint('xyz123', XYZ123), EntryPoint('lm75', XYZ123)])
+    assert 'xyz123' in driver_names()
+    assert get_sensor_driver('xyz123') is XYZ123
+    # plugins cannot replace built-in drivers
+    assert get_sensor_driver('lm75') is not XYZ123
+
+def test_lazy_imports():
+    code = ('import sys, senlib.cli; '
+            'print(sorted(m for m in ("aiohttp", "hbmqtt", "dicttoxml", '
+            '"xml.dom.minidom", "senlib.i2c.sensors.bmpx", "senlib.i2c.scan", '
+            '"senlib.core.trace", "senlib.core.instrument", "senlib.core.capture") '
+            'if m in sys.modules))')
+    out = subprocess.check_output([sys.executable, '-c', code])
+    assert out.strip() == b'[]'
+
+def test_lazy_imports_of_drivers():
+    code = ('import sys, senlib.i2c.sensors.bmex; '
+            'print(sorted(m for m in ("asyncio", "heapq", "hashlib", "json") '
+            'if m in sys.modules))')
+    out = subprocess.check_output([sys.executable, '-c', code])
+    assert out.strip() == b'[]'
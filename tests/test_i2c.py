@@ -1,5 +1,11 @@
 # -*- coding: utf-8 -*-
+import errno
+import asyncio
+import time
+import pytest
 from senlib.core.i2c import AddressParser
+from senlib.core.i2c import I2CBus, SMBus, FakeI2CDev, MockBus, Sensor
+from senlib.core.i2c import trigger_pipelined
 
 def test_i2c_address_parser():
     parser = AddressParser()
@@ -11,3 +17,174 @@ def test_i2c_address_parser():
     i2c_bus, i2c_addr = addr_tuple
     assert addr_tuple[0] == i2c_bus
     assert addr_tuple[1] == i2c_addr 
+
+def create_i2c_bus():
+    regs = bytearray(range(256))
+    dev = FakeI2CDev(devices={0x77: regs})
+    return I2CBus(bus=1, dev=dev, ioctl=dev.ioctl), dev
+
+def test_i2c_bus_smbus_access():
+    bus, dev = create_i2c_bus()
+    assert bus.name == 'i2c-1'
+    assert bus.read_byte_data(0x77, 0xD0) == 0xD0
+    assert bus.read_word_data(0x77, 0x10) == 0x1110
+    bus.write_byte_data(0x77, 0xF4, 0x27)
+    assert bus.read_byte_data(0x77, 0xF4) == 0x27
+    bus.write_word_data(0x77, 0x20, 0xBEEF)
+    assert bus.read_word_data(0x77, 0x20) == 0xBEEF
+    bus.write_byte(0x77, 0x30)
+    assert bus.read_byte(0x77) == 0x30
+
+def test_i2c_bus_block_data():
+    bus, dev = create_i2c_bus()
+    assert bus.read_i2c_block_data(0x77, 0x88, 4) == [0x88, 0x89, 0x8A, 0x8B]
+    bus.write_i2c_block_data(0x77, 0x40, [1, 2, 3])
+    assert bus.read_i2c_block_data(0x77, 0x40, 3) == [1, 2, 3]
+    assert bus.write_read(0x77, [0xF7], 8) == list(range(0xF7, 0xFF))
+
+def test_i2c_bus_syscalls():
+    bus, dev = create_i2c_bus()
+    # a block read is a single combined transaction
+    bus.read_i2c_block_data(0x77, 0xF7, 8)
+    assert dev.ioctl_calls == 1
+    # the slave address is only set once
+    bus.read_byte_data(0x77, 0xD0)
+    bus.read_byte_data(0x77, 0xD0)
+    assert dev.ioctl_calls == 4
+
+def test_i2c_bus_no_device():
+    bus, dev = create_i2c_bus()
+    try:
+        bus.read_byte(0x40)
+        assert False
+    except OSError as e:
+        assert e.errno == errno.ENXIO
+
+def test_i2c_bus_close():
+    bus, dev = create_i2c_bus()
+    with bus:
+        pass
+    assert dev.closed
+
+def test_i2c_bus_read_registers():
+    bus, dev = create_i2c_bus()
+    data = bus.read_registers(0x77, [(0xF7, 3), (0xFA, 3), (0xFD, 2)])
+    assert data == [[0xF7, 0xF8, 0xF9], [0xFA, 0xFB, 0xFC], [0xFD, 0xFE]]
+    assert dev.ioctl_calls == 1
+
+def test_i2c_bus_read_registers_many():
+    bus, dev = create_i2c_bus()
+    regs = [(cmd, 1) for cmd in range(30)]
+    data = bus.read_registers(0x77, regs)
+    assert data == [[cmd] for cmd in range(30)]
+    # the kernel limits the number of messages per I2C_RDWR call
+    assert dev.ioctl_calls == 2
+
+def test_mock_bus_read_registers():
+    bus = MockBus(read_data=[[1, 2], [3]])
+    assert bus.read_registers(0x77, [(0x00, 2), (0x10, 1)]) == [[1, 2], [3]]
+    assert bus.transactions == 1
+
+def test_i2c_bus_read_into():
+    bus, dev = create_i2c_bus()
+    buf = bytearray(4)
+    assert bus.read_i2c_block_data_into(0x77, 0x10, buf) == 4
+    assert buf == bytearray([0x10, 0x11, 0x12, 0x13])
+    assert dev.ioctl_calls == 1
+    # the buffer is not exported anymore
+    buf.extend([0])
+
+def test_i2c_bus_read_into_memoryview():
+    bus, dev = create_i2c_bus()
+    buf = bytearray(6)
+    bus.read_i2c_block_data_into(0x77, 0x20, memoryview(buf)[2:])
+    assert buf == bytearray([0, 0, 0x20, 0x21, 0x22, 0x23])
+
+def test_mock_bus_read_into():
+    bus = MockBus(read_data=[[1, 2, 3]])
+    buf = bytearray(3)
+    assert bus.read_i2c_block_data_into(0x77, 0x00, buf) == 3
+    assert buf == bytearray([1, 2, 3])
+    assert bus.transactions == 1
+
+def test_i2c_bus_read_bytes_into():
+    bus, dev = create_i2c_bus()
+    bus.write_byte(0x77, 0x10)
+    calls = dev.ioctl_calls
+    buf = bytearray(3)
+    assert bus.read_bytes_into(0x77, buf) == 3
+    assert buf == bytearray([0x10, 0x11, 0x12])
+    assert dev.ioctl_calls - calls == 1
+    buf.extend([0])
+
+def test_smbus_read_bytes_into():
+    class FakeSMBus(object):
+
+        def __init__(self, bus):
+            pass
+
+    bus = SMBus(bus=1, SMBus=FakeSMBus)
+    with pytest.raises(OSError) as excinfo:
+        bus.read_bytes_into(0x40, bytearray(4))
+    assert excinfo.value.errno == errno.EOPNOTSUPP
+
+def test_mock_bus_read_bytes_into():
+    bus = MockBus(read_data=[[1, 2, 3, 4]])
+    buf = bytearray(4)
+    assert bus.read_bytes_into(0x40, buf) == 4
+    assert buf == bytearray([1, 2, 3, 4])
+    assert bus.transactions == 1
+
+class StepSensor(Sensor):
+
+    def __init__(self):
+        super(StepSensor, self).__init__(MockBus(read_data=[1, 2]), 0x40)
+
+    def _measure_steps(self):
+        first = self._bus.read_byte(self.addr)
+        yield 0.01
+        second = self._bus.read_byte(self.addr)
+        return {'first': first, 'second': second}
+
+def test_measurement_steps():
+    sensor = StepSensor()
+    measurement = sensor.trigger()
+    assert not measurement.done
+    assert sensor.bus.transactions == 1
+    assert 0.0 <= measurement.delay() <= 0.01
+    assert measurement.fetch()
+    assert measurement.result == {'first': 1, 'second': 2}
+
+def test_measurement_wait():
+    sensor = StepSensor()
+    assert sensor.trigger().wait() == {'first': 1, 'second': 2}
+
+def test_measure_async():
+    sensor = StepSensor()
+    data = asyncio.run(sensor.measure_async())
+    assert data == {'first': 1, 'second': 2}
+
+class SlowSensor(Sensor):
+
+    def __init__(self, value, delay):
+        super(SlowSensor, self).__init__(MockBus(), 0x40)
+        self._value = value
+        self._delay = delay
+
+    def _measure_steps(self):
+        yield self._delay
+        return {'value': self._value}
+
+def test_trigger_pipelined():
+    sensors = [SlowSensor(1, 0.03), SlowSensor(2, 0.01), SlowSensor(3, 0.02)]
+    start = time.monotonic()
+    data = trigger_pipelined(sensors).wait()
+    elapsed = time.monotonic() - start
+    assert data == [{'value': 1}, {'value': 2}, {'value': 3}]
+    # the conversions overlap
+    assert elapsed < 0.055
+
+def test_trigger_pipelined_async():
+    sensors = [SlowSensor(1, 0.01), StepSensor()]
+    data = asyncio.run(trigger_pipelined(sensors).wait_async())
+    assert data == [{'value': 1}, {'first': 1, 'second': 2}]
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+import pytest
+from senlib.core.i2c import MockBus
+from senlib.core.sim import SimulatedBus, create_model
+from senlib.core.instrument import InstrumentedBus, BusStats, instrument
+
+
+def test_instrument_without_instruments():
+    bus = MockBus()
+    assert instrument(bus) is bus
+
+def test_bus_stats():
+    stats = BusStats()
+    bus = instrument(MockBus(read_data=[[1, 2, 3], 0x58]), stats)
+    assert isinstance(bus, InstrumentedBus)
+    assert bus.read_i2c_block_data(0x77, 0xF7, 3) == [1, 2, 3]
+    assert bus.read_byte_data(0x77, 0xD0) == 0x58
+    bus.write_byte_data(0x76, 0xF4, 0x2E)
+
+    dump = stats.dump()
+    device = dump['i2c-1']['0x77']
+    assert device['read_i2c_block_data']['count'] == 1
+    assert device['read_i2c_block_data']['bytes'] == 3
+    assert sum(device['read_byte_data']['histogram']) == 1
+    assert dump['i2c-1']['0x76']['write_byte_data']['errors'] == 0
+    assert 'read_byte_data' in stats.format()
+
+    stats.reset()
+    assert stats.dump() == {}
+
+def test_bus_stats_errors():
+    stats = BusStats()
+    bus = instrument(SimulatedBus(devices={0x77: create_model('bme280')}), stats)
+    with pytest.raises(OSError):
+        bus.read_byte(0x40)
+    assert stats.dump()['i2c-1']['0x40']['read_byte']['errors'] == 1
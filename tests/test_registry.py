@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+from senlib.core.i2c import I2CBus, FakeI2CDev
+from senlib.core.registry import BusRegistry
+from senlib.core.scheduler import BusScheduler
+from senlib.i2c.sensors.bmpx import BMP280
+
+
+def create_registry(devs):
+    def bus_factory(bus):
+        dev = FakeI2CDev(devices={0x76: bytearray(256), 0x77: bytearray(256)})
+        devs.append(dev)
+        return I2CBus(bus=bus, dev=dev, ioctl=dev.ioctl)
+    return BusRegistry(bus_factory=bus_factory)
+
+def test_shared_handle():
+    devs = []
+    registry = create_registry(devs)
+    bus1 = registry.acquire(1)
+    bus2 = registry.acquire(1)
+    assert bus1.handle is bus2.handle
+    assert registry.refcount(1) == 2 and registry.opened == 1
+
+    bus1.close()
+    bus1.close()
+    assert registry.refcount(1) == 1
+    assert not devs[0].closed
+    bus2.read_byte_data(0x77, 0xD0)
+
+    bus2.close()
+    assert registry.refcount(1) == 0
+    assert devs[0].closed
+    assert registry.buses() == []
+
+    registry.acquire(1).close()
+    assert registry.opened == 2
+
+def test_scheduled_buses_share_handle():
+    devs = []
+    registry = create_registry(devs)
+    scheduler = BusScheduler(bus_factory=registry.acquire)
+    sensor1 = BMP280(scheduler.bus(1), 0x76)
+    sensor2 = BMP280(scheduler.bus(1), 0x77)
+    assert len(devs) == 1
+    assert scheduler.refcount(1) == 2
+
+    # closing a sensor must not close the bus of the other one
+    sensor1.close()
+    assert not devs[0].closed
+    sensor2.measure()
+
+    sensor2.close()
+    assert devs[0].closed
+    assert registry.refcount(1) == 0
+    scheduler.close()
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import json
+import pytest
+from senlib.core.scheduler import BusScheduler
+from senlib.core.sim import SimulatedBus, create_model
+from senlib.i2c.scan import scan, scan_bus, detect
+
+
+def create_bus(*names, **kwargs):
+    devices = {}
+    for name in names:
+        model = create_model(name)
+        devices[kwargs.get(name, model.ADDR)] = model
+    return SimulatedBus(devices=devices, latency=0.0, realtime=False)
+
+@pytest.fixture
+def cache_dir(tmpdir, monkeypatch):
+    monkeypatch.setenv('SENLIB_CACHE_DIR', str(tmpdir))
+    return tmpdir
+
+def test_scan_bus_chip_ids():
+    bus = create_bus('bmp280', 'bme280', 'mcp9808', bmp280=0x76)
+    assert scan_bus(bus) == {0x76: 'bmp280', 0x77: 'bme280', 0x18: 'mcp9808'}
+    bus = create_bus('bmp180')
+    assert scan_bus(bus) == {0x77: 'bmp085'}
+
+def test_scan_bus_collisions():
+    assert scan_bus(create_bus('hdc1008')) == {0x40: 'hdc1008'}
+    assert scan_bus(create_bus('si7021')) == {0x40: 'si7021'}
+    assert scan_bus(create_bus('mpl3115a2')) == {0x60: 'mpl3115a2'}
+    assert scan_bus(create_bus('mpl115a2')) == {0x60: 'mpl115a2'}
+    assert scan_bus(create_bus('am2315')) == {0x5c: 'am2315'}
+    assert scan_bus(create_bus('bh1750', bh1750=0x5c)) == {0x5c: 'bh1750'}
+
+def test_scan_unknown_device():
+    bus = create_bus('lm75', lm75=0x50)
+    assert scan_bus(bus) == {0x50: None}
+
+def test_scan_buses():
+    buses = {1: create_bus('sht31'), 2: create_bus('bh1750', 'lm75')}
+    scheduler = BusScheduler(bus_factory=lambda bus: buses[bus])
+    try:
+        assert scan([1, 2], scheduler) == {1: {0x44: 'sht31'},
+                2: {0x23: 'bh1750', 0x48: 'lm75'}}
+        # the workers of buses without users do not outlive the scan
+        assert scheduler.stats() == {}
+        with scheduler.bus(2):
+            scan([1, 2], scheduler)
+            assert list(scheduler.stats()) == [buses[2].name]
+            assert scheduler.refcount(2) == 1
+    finally:
+        scheduler.close()
+
+def test_detect_cache(cache_dir):
+    bus = create_bus('sht31', 'bme280')
+    scheduler = BusScheduler(bus_factory=lambda _: bus)
+    try:
+        assert detect([1], scheduler) == [('sht31', 1, 0x44), ('bme280', 1, 0x77)]
+        assert json.load(cache_dir.join('scan.json').open()) == \
+                {'1': {'0x44': 'sht31', '0x77': 'bme280'}}
+
+        transactions = bus.transactions
+        assert detect([1], scheduler) == [('sht31', 1, 0x44), ('bme280', 1, 0x77)]
+        assert bus.transactions - transactions < 5
+
+        bus.devices.pop(0x44)
+        assert detect([1], scheduler) == [('bme280', 1, 0x77)]
+    finally:
+        scheduler.close()
+
+def test_detect_empty_bus(cache_dir):
+    bus = create_bus()
+    scheduler = BusScheduler(bus_factory=lambda _: bus)
+    try:
+        assert detect([1], scheduler) == []
+        assert json.load(cache_dir.join('scan.json').open()) == {}
+        bus.add_device(0x77, create_model('bme280'))
+        assert detect([1], scheduler) == [('bme280', 1, 0x77)]
+    finally:
+        scheduler.close()
+
+def test_scan_eeprom_addresses():
+    quick_writes = []
+
+    class QuickWriteBus(SimulatedBus):
+
+        def write_quick(self, addr):
+            quick_writes.append(addr)
+            return super(QuickWriteBus, self).write_quick(addr)
+
+    bus = QuickWriteBus(devices={0x50: create_model('lm75')}, latency=0.0, realtime=False)
+    assert scan_bus(bus) == {0x50: None}
+    assert not [addr for addr in quick_writes if 0x30 <= addr < 0x38 or 0x50 <= addr < 0x60]
+    assert 0x48 in quick_writes
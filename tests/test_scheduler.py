@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+import errno
+import threading
+from senlib.core.i2c import MockBus
+from senlib.core.scheduler import BusScheduler
+
+
+def create_scheduler():
+    return BusScheduler(bus_factory=lambda bus: MockBus(bus=bus, 
+        read_data=list(range(100))))
+
+def test_scheduled_bus():
+    scheduler = create_scheduler()
+    bus = scheduler.bus(1)
+    assert bus.name == 'i2c-1'
+    assert bus.read_byte_data(0x77, 0xD0) == 0
+    assert bus.read_byte(0x77) == 1
+    bus.write_byte_data(0x77, 0xF4, 0x27)
+    assert bus.worker.bus.transactions == 3
+    scheduler.close()
+
+def test_same_bus_runs_on_one_thread():
+    scheduler = create_scheduler()
+    threads = set()
+    futures = [scheduler.submit(1, lambda bus: threads.add(threading.get_ident())) 
+            for _ in range(10)]
+    for future in futures:
+        future.result()
+    assert len(threads) == 1
+    assert threading.get_ident() not in threads
+    scheduler.close()
+
+def test_buses_run_in_parallel():
+    scheduler = create_scheduler()
+    barrier = threading.Barrier(2, timeout=5)
+    # both functions can only pass the barrier if they run at the same time
+    f1 = scheduler.submit(1, lambda bus: barrier.wait())
+    f2 = scheduler.submit(2, lambda bus: barrier.wait())
+    f1.result()
+    f2.result()
+    scheduler.close()
+
+def test_submit_from_worker():
+    scheduler = create_scheduler()
+    bus = scheduler.bus(1)
+    # calls on the worker thread itself must not deadlock
+    future = bus.submit(lambda _: [bus.read_byte(0x77), bus.read_byte(0x77)])
+    assert future.result(timeout=5) == [0, 1]
+    scheduler.close()
+
+def test_exceptions_are_propagated():
+    scheduler = create_scheduler()
+    future = scheduler.submit(1, lambda bus: 1 / 0)
+    try:
+        future.result()
+        assert False
+    except ZeroDivisionError:
+        pass
+    scheduler.close()
+
+def test_stats():
+    scheduler = create_scheduler()
+    bus = scheduler.bus(1)
+    for _ in range(5):
+        bus.read_byte(0x77)
+    stats = scheduler.stats()['i2c-1']
+    assert stats['submitted'] == 5
+    assert stats['completed'] == 5
+    assert stats['queue_depth'] == 0
+    assert stats['max_queue_depth'] >= 1
+    assert stats['wait_time_max'] >= stats['wait_time_mean'] >= 0.0
+    scheduler.close()
+
+def test_closed_worker():
+    scheduler = create_scheduler()
+    bus = scheduler.bus(1)
+    worker = bus.worker
+    started, release = threading.Event(), threading.Event()
+    running = worker.submit(lambda _: started.set() or release.wait(5))
+    started.wait(5)
+    queued = worker.submit(lambda _: 1)
+    closer = threading.Thread(target=worker.close)
+    closer.start()
+    # the queued work fails at once, the running work completes
+    try:
+        queued.result(timeout=5)
+        assert False
+    except OSError as e:
+        assert e.errno == errno.EBADF
+    release.set()
+    closer.join(5)
+    assert running.result(timeout=5)
+    try:
+        bus.read_byte(0x77)
+        assert False
+    except OSError as e:
+        assert e.errno == errno.EBADF
+    scheduler.close()
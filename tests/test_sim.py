@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import errno
+from senlib.core.sim import SimulatedBus, Environment, create_model
+from senlib.i2c import get_sensor_driver
+
+
+def create_sensor(name, **kwargs):
+    driver_class = get_sensor_driver(name)
+    addr = driver_class.default_addr()
+    env = Environment(temperature=21.0, humidity=45.0, pressure=96000.0,
+            illuminance=300.0)
+    bus = SimulatedBus(devices={addr: create_model(name, env=env)}, **kwargs)
+    return driver_class(bus, addr)
+
+def check_measurements(name, ranges):
+    sensor = create_sensor(name)
+    for _ in range(2):
+        data = sensor.measure()
+        for key, (low, high) in ranges.items():
+            assert low <= data[key] <= high, (name, key, data[key])
+
+def test_simulated_bosch_sensors():
+    check_measurements('bme280', {'temperature': (18, 23), 
+        'pressure': (90000, 96000), 'humidity': (50, 60)})
+    check_measurements('bmp280', {'temperature': (15, 30),
+        'pressure': (85000, 105000)})
+    check_measurements('bmp180', {'temperature': (20, 30),
+        'pressure': (85000, 100000)})
+
+def test_simulated_humidity_sensors():
+    ranges = {'temperature': (20, 22), 'humidity': (44, 46)}
+    for name in ('sht31', 'si7021', 'hdc1008', 'am2315'):
+        check_measurements(name, ranges)
+
+def test_simulated_temperature_sensors():
+    for name in ('lm75', 'mcp9808'):
+        check_measurements(name, {'temperature': (20, 22)})
+
+def test_simulated_other_sensors():
+    check_measurements('bh1750', {'illuminance': (290, 310)})
+    check_measurements('mpl115a2', {'temperature': (15, 30), 
+        'pressure': (85000, 105000)})
+    check_measurements('mpl3115a2', {'temperature': (20, 22), 
+        'pressure': (95900, 96100)})
+
+def test_simulated_bus_timing():
+    bus = SimulatedBus(devices={0x77: create_model('bme280')}, latency=0.0,
+            speed=SimulatedBus.SPEED_FAST, realtime=False)
+    bus.read_byte_data(0x77, 0xD0)
+    # two address bytes, one command byte and one data byte
+    assert abs(bus.busy_time - (4 * 9 + 2) / 400000.0) < 1e-9
+    assert bus.transactions == 1
+
+def test_simulated_bus_errors():
+    bus = SimulatedBus(devices={0x77: create_model('bme280')}, error_rate=1.0, 
+            realtime=False)
+    for addr in (0x77, 0x40):
+        try:
+            bus.read_byte_data(addr, 0xD0)
+            assert False
+        except OSError as e:
+            assert e.errno == errno.EREMOTEIO
+    assert bus.errors == 2
+
+def test_simulated_conversion_not_ready():
+    sensor = create_sensor('sht31')
+    sensor._trigger_measurement()
+    try:
+        sensor.bus.read_i2c_block_data(sensor.addr, 0x00, 6)
+        assert False
+    except OSError as e:
+        assert e.errno == errno.EREMOTEIO
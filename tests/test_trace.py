@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import errno
+import time
+import pytest
+from senlib.core.i2c import MockBus
+from senlib.core.sim import SimulatedBus, Environment, create_model
+from senlib.core.trace import RecordingBus, ReplayBus, TraceError, TraceMismatch
+from senlib.i2c import get_sensor_driver
+
+
+def record(path, name, samples):
+    driver_class = get_sensor_driver(name)
+    addr = driver_class.default_addr()
+    env = Environment(temperature=21.0, humidity=45.0, pressure=96000.0)
+    bus = SimulatedBus(devices={addr: create_model(name, env=env)})
+    with RecordingBus(bus, str(path)) as recording:
+        sensor = driver_class(recording, addr)
+        return [sensor.measure() for _ in range(samples)]
+
+def replay(path, name, samples, **kwargs):
+    driver_class = get_sensor_driver(name)
+    with ReplayBus(str(path), **kwargs) as bus:
+        sensor = driver_class(bus, driver_class.default_addr())
+        return [sensor.measure() for _ in range(samples)]
+
+def test_record_and_replay(tmpdir):
+    for name in ('bme280', 'bmp180', 'sht31', 'si7021', 'hdc1008', 'mpl3115a2'):
+        path = tmpdir.join(name + '.trace')
+        data = record(path, name, 3)
+        assert replay(path, name, 3) == data
+
+def test_replay_skips_conversion_delays(tmpdir):
+    path = tmpdir.join('si7021.trace')
+    record(path, 'si7021', 1)
+    start = time.monotonic()
+    replay(path, 'si7021', 1)
+    assert time.monotonic() - start < 0.05
+
+def test_replay_loop(tmpdir):
+    path = tmpdir.join('bme280.trace')
+    data = record(path, 'bme280', 2)
+    with pytest.raises(TraceError):
+        replay(path, 'bme280', 3)
+    assert replay(path, 'bme280', 5, loop=True) == data + data + data[:1]
+
+def test_replay_mismatch(tmpdir):
+    path = tmpdir.join('bus.trace')
+    with RecordingBus(MockBus(read_data=[0x58]), str(path)) as bus:
+        bus.read_byte_data(0x77, 0xD0)
+    with ReplayBus(str(path)) as bus:
+        with pytest.raises(TraceMismatch):
+            bus.read_byte_data(0x77, 0xD1)
+
+def test_replay_errors(tmpdir):
+    path = tmpdir.join('bus.trace')
+    with RecordingBus(SimulatedBus(), str(path)) as bus:
+        with pytest.raises(OSError):
+            bus.read_byte(0x40)
+    with ReplayBus(str(path)) as bus:
+        with pytest.raises(OSError) as e:
+            bus.read_byte(0x40)
+        assert e.value.errno == errno.EREMOTEIO
+
+def test_replay_read_into(tmpdir):
+    path = tmpdir.join('bus.trace')
+    with RecordingBus(MockBus(read_data=[[1, 2, 3]]), str(path)) as bus:
+        bus.read_i2c_block_data(0x77, 0xF7, 3)
+    buf = bytearray(3)
+    with ReplayBus(str(path)) as bus:
+        assert bus.read_i2c_block_data_into(0x77, 0xF7, buf) == 3
+    assert buf == bytearray([1, 2, 3])
+
+def test_no_trace_file(tmpdir):
+    path = tmpdir.join('empty.trace')
+    path.write('')
+    with pytest.raises(TraceError):
+        ReplayBus(str(path))